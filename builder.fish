@@ -1,5 +1,6 @@
 #!/usr/bin/env fish
 cd builder
 go build -o ../phis-builder main.go
+GOOS=windows GOARCH=amd64 go build -o ../resources/phis-unpack.exe ./tools/unpack
 cd ..
 ./phis-builder $argv
@@ -2,15 +2,21 @@ package cmd
 
 import (
 	"fmt"
-	"io"
 	"net/http"
 	"os"
 	"path/filepath"
+	"sort"
+	"strings"
+	"time"
 
 	"builder/internal/config"
+	"builder/internal/trace"
+	"builder/internal/utils"
 	"github.com/spf13/cobra"
 )
 
+var resourceJobs int
+
 var downloadResourcesCmd = &cobra.Command{
 	Use:   "download-resources",
 	Short: "Download static resources (Python, VC Redist)",
@@ -25,45 +31,83 @@ var downloadResourcesCmd = &cobra.Command{
 				"VC_redist2015-2022.x64.exe":    "https://aka.ms/vs/17/release/vc_redist.x64.exe",
 			}
 		}
+		hashes := config.GetStaticResourceHashes()
 
-		for filename, url := range resources {
-			destPath := filepath.Join(resDir, filename)
-			if _, err := os.Stat(destPath); err == nil {
-				fmt.Printf("Resource %s already exists. Skipping.\n", filename)
-				continue
-			}
+		filenames := make([]string, 0, len(resources))
+		for filename := range resources {
+			filenames = append(filenames, filename)
+		}
+		sort.Strings(filenames)
+
+		client := &http.Client{Timeout: 30 * time.Minute}
+		errs := make([]error, len(filenames))
+		utils.ForEachParallel(len(filenames), resourceJobs, func(i int) error {
+			filename := filenames[i]
+			errs[i] = downloadResource(client, filename, resources[filename], filepath.Join(resDir, filename), hashes[strings.ToLower(filename)])
+			return errs[i]
+		})
 
-			fmt.Printf("Downloading %s from %s...\n", filename, url)
-			if err := downloadFile(destPath, url); err != nil {
-				fmt.Printf("Error downloading %s: %v\n", filename, err)
-				os.Exit(1)
+		failed := false
+		for i, err := range errs {
+			if err != nil {
+				fmt.Printf("Error downloading %s: %v\n", filenames[i], err)
+				failed = true
 			}
-			fmt.Println("Download complete.")
+		}
+		if failed {
+			exit(1)
 		}
 	},
 }
 
 func init() {
+	downloadResourcesCmd.Flags().IntVar(&resourceJobs, "jobs", 4, "Number of resources downloaded concurrently")
 	rootCmd.AddCommand(downloadResourcesCmd)
 }
 
-func downloadFile(filepath string, url string) error {
-	resp, err := http.Get(url)
+// downloadResource downloads one static resource unless it is already
+// present. A present file is only trusted when it matches its sha256 pin, if
+// there is one; otherwise it is downloaded again.
+func downloadResource(client *http.Client, filename, url, destPath, sha256 string) error {
+	if _, err := os.Stat(destPath); err == nil {
+		if sha256 == "" {
+			fmt.Printf("Resource %s already exists. Skipping.\n", filename)
+			return nil
+		}
+		got, err := utils.FileSHA256(destPath)
+		if err != nil {
+			return err
+		}
+		if strings.EqualFold(got, sha256) {
+			fmt.Printf("Resource %s already exists and matches its sha256. Skipping.\n", filename)
+			return nil
+		}
+		fmt.Printf("Resource %s does not match its sha256, downloading it again.\n", filename)
+		if err := os.Remove(destPath); err != nil {
+			return err
+		}
+	}
+
+	span := trace.Start("download resource")
+	span.SetAttr("file", filename)
+	defer span.End()
+
+	fmt.Printf("Downloading %s from %s...\n", filename, url)
+	n, err := utils.DownloadFile(client, url, destPath, sha256)
+	span.AddBytes(n)
 	if err != nil {
 		return err
 	}
-	defer resp.Body.Close()
-
-	if resp.StatusCode != http.StatusOK {
-		return fmt.Errorf("bad status: %s", resp.Status)
+	span.AddFiles(1)
+	if sha256 != "" {
+		fmt.Printf("Downloaded %s (%.1f MB), sha256 verified\n", filename, float64(n)/(1<<20))
+		return nil
 	}
-
-	out, err := os.Create(filepath)
+	sum, err := utils.FileSHA256(destPath)
 	if err != nil {
 		return err
 	}
-	defer out.Close()
-
-	_, err = io.Copy(out, resp.Body)
-	return err
+	fmt.Printf("Downloaded %s (%.1f MB). To pin it, add under [static_resources_sha256]:\n  \"%s\" = \"%s\"\n",
+		filename, float64(n)/(1<<20), filename, sum)
+	return nil
 }
@@ -4,25 +4,40 @@ import (
 	"fmt"
 	"os"
 	"path/filepath"
+	"runtime"
+	"time"
 
+	"builder/internal/archive"
 	"builder/internal/config"
 	"builder/internal/deps"
 	"builder/internal/nsis"
+	"builder/internal/payload"
+	"builder/internal/trace"
 	"builder/internal/utils"
 	"github.com/spf13/cobra"
 	"github.com/spf13/viper"
 )
 
 var cleanBuild bool
+var buildPayload bool
+var compilePyc bool
+var buildArchive bool
+
+// clientPythonDir is where the embedded Python lives under the installer's
+// default InstallDir; compiled payload modules report their sources there.
+const clientPythonDir = "C:/wu-xian-shi-xun/python38-embed"
 
 var installerCmd = &cobra.Command{
 	Use:   "build-installer",
 	Short: "Build full installer",
 	Run: func(cmd *cobra.Command, args []string) {
+		span := trace.Start("build-installer")
+		defer span.End()
+
 		version := config.GetVersion()
 		if err := utils.ValidateVersion(version); err != nil {
 			fmt.Println("Error invalid version in config:", err)
-			os.Exit(1)
+			exit(1)
 		}
 
 		productName := viper.GetString("product_name")
@@ -39,7 +54,7 @@ var installerCmd = &cobra.Command{
 		buildDir := "build"
 		if err := os.MkdirAll(buildDir, 0755); err != nil {
 			fmt.Println("Error creating build dir:", err)
-			os.Exit(1)
+			exit(1)
 		}
 
 		// Download all dependencies
@@ -55,7 +70,7 @@ var installerCmd = &cobra.Command{
 		sourceFile := ""
 		pyProject := config.GetPyProjectFile()
 		if pyProject != "" {
-			// Resolve relative path to config file if needed? 
+			// Resolve relative path to config file if needed?
 			// For now assume relative to CWD or absolute
 			sourceFile = pyProject
 			fmt.Printf("Using pyproject file: %s\n", sourceFile)
@@ -64,18 +79,32 @@ var installerCmd = &cobra.Command{
 			fmt.Printf("Using requirements file: %s\n", sourceFile)
 		}
 
+		stage := span.Child("dependencies")
 		resolvedReq, err := deps.DownloadReqFile(sourceFile, packagesDir)
 		if err != nil {
 			fmt.Println("Error downloading deps:", err)
-			os.Exit(1)
+			exit(1)
+		}
+		stage.End()
+
+		// Fail before preparing anything else when a requirement cannot be expanded
+		var payloadWheels []string
+		if buildPayload {
+			payloadWheels, err = deps.ReqFileWheels(resolvedReq, packagesDir)
+			if err != nil {
+				fmt.Println("Error checking requirements for --payload:", err)
+				exit(1)
+			}
 		}
 
 		// Also download pip tools (pip, setuptools, wheel)
 		fmt.Println("Downloading pip tools...")
+		stage = span.Child("pip tools")
 		if err := deps.DownloadDeps([]string{"pip", "setuptools", "wheel"}, pipToolsDir); err != nil {
 			fmt.Println("Error downloading pip tools:", err)
-			os.Exit(1)
+			exit(1)
 		}
+		stage.End()
 
 		// Compile NSIS
 		// Locate script in resources
@@ -83,38 +112,73 @@ var installerCmd = &cobra.Command{
 		absResDir, err := filepath.Abs(resDir)
 		if err != nil {
 			fmt.Println("Error getting absolute path for resources:", err)
-			os.Exit(1)
+			exit(1)
 		}
 
 		scriptPath := filepath.Join(resDir, nsisScript)
 		absResolvedReq, err := filepath.Abs(resolvedReq)
 		if err != nil {
 			fmt.Println("Error getting absolute path for requirements:", err)
-			os.Exit(1)
+			exit(1)
 		}
 
 		absBuildDir, err := filepath.Abs(buildDir)
 		if err != nil {
 			fmt.Println("Error getting absolute path for build dir:", err)
-			os.Exit(1)
+			exit(1)
 		}
 		installerOutput := filepath.Join(absBuildDir, fmt.Sprintf("%sv%s.exe", productName, version))
 
 		defines := map[string]string{
-			"PRODUCT_VERSION":  version,
-			"PRODUCT_NAME":     productName,
-			"OLD_PRODUCT_NAME": oldProductName,
-			"COMPANY_NAME":     companyName,
-			"INSTALLER_OUTPUT": installerOutput,
-			"PACKAGES_DIR":     filepath.Join(absBuildDir, "packages"),
-			"PIP_WHEELS_DIR":   filepath.Join(absBuildDir, "pip_wheels"),
+			"PRODUCT_VERSION":   version,
+			"PRODUCT_NAME":      productName,
+			"OLD_PRODUCT_NAME":  oldProductName,
+			"COMPANY_NAME":      companyName,
+			"INSTALLER_OUTPUT":  installerOutput,
+			"PACKAGES_DIR":      filepath.Join(absBuildDir, "packages"),
 			"REQUIREMENTS_FILE": absResolvedReq,
-			"RESOURCES_DIR":    absResDir,
+			"RESOURCES_DIR":     absResDir,
+		}
+		if config.GetClientWheelCache() {
+			defines["CLIENT_WHEEL_CACHE"] = "1"
+		}
+
+		embedDir := filepath.Join(absBuildDir, "python38-embed")
+		if err := buildPythonEmbed(span, absResDir, pipToolsDir, embedDir); err != nil {
+			fmt.Println("Error preparing embedded Python:", err)
+			exit(1)
+		}
+		defines["PYTHON_EMBED_DIR"] = embedDir
+
+		payloadDir := ""
+		if buildPayload {
+			payloadDir = filepath.Join(absBuildDir, "site_payload")
+			if err := buildSitePayload(span, payloadWheels, pipToolsDir, payloadDir); err != nil {
+				fmt.Println("Error building site-packages payload:", err)
+				exit(1)
+			}
+			defines["SITE_PAYLOAD_DIR"] = payloadDir
+		}
+
+		if buildArchive {
+			unpackExe := filepath.Join(absResDir, "phis-unpack.exe")
+			if _, err := os.Stat(unpackExe); err != nil {
+				fmt.Println("Error: --archive needs resources/phis-unpack.exe; build it with:")
+				fmt.Println("  cd builder && GOOS=windows GOARCH=amd64 go build -o ../resources/phis-unpack.exe ./tools/unpack")
+				exit(1)
+			}
+			archivePath := filepath.Join(absBuildDir, "python38-embed.pak")
+			if err := buildPythonArchive(span, embedDir, payloadDir, archivePath); err != nil {
+				fmt.Println("Error building Python archive:", err)
+				exit(1)
+			}
+			defines["PYTHON_ARCHIVE"] = archivePath
+			defines["UNPACK_EXE"] = unpackExe
 		}
 
 		if err := nsis.CompileNSIS(scriptPath, defines); err != nil {
 			fmt.Println("Error compiling NSIS:", err)
-			os.Exit(1)
+			exit(1)
 		}
 
 		fmt.Println("Installer build complete. Output:", installerOutput)
@@ -123,5 +187,162 @@ var installerCmd = &cobra.Command{
 
 func init() {
 	installerCmd.Flags().BoolVar(&cleanBuild, "clean", true, "Clean up packages directory before downloading")
+	installerCmd.Flags().BoolVar(&buildPayload, "payload", false, "Ship a pre-expanded site-packages tree instead of running pip on the client")
+	installerCmd.Flags().BoolVar(&compilePyc, "pyc", true, "Precompile the payload to Python 3.8 bytecode (with --payload)")
+	installerCmd.Flags().BoolVar(&buildArchive, "archive", false, "Pack the embedded Python (and --payload) into one archive extracted on all cores")
 	rootCmd.AddCommand(installerCmd)
 }
+
+// pipToolWheels returns the newest wheel of each pip tool in pipToolsDir,
+// leaving out the names in skip.
+func pipToolWheels(pipToolsDir string, skip map[string]bool) ([]string, error) {
+	tools, err := filepath.Glob(filepath.Join(pipToolsDir, "*.whl"))
+	if err != nil {
+		return nil, err
+	}
+	newest := make(map[string]deps.WheelInfo)
+	for _, tool := range tools {
+		info, err := deps.ParseWheelFilename(filepath.Base(tool))
+		if err != nil || skip[info.Name] {
+			continue
+		}
+		if prev, ok := newest[info.Name]; !ok || deps.CompareVersionStrings(info.Version, prev.Version) > 0 {
+			newest[info.Name] = info
+		}
+	}
+	var wheels []string
+	for _, info := range newest {
+		wheels = append(wheels, filepath.Join(pipToolsDir, info.Filename))
+	}
+	return wheels, nil
+}
+
+// buildPythonEmbed prepares the embedded Python exactly as the installer used
+// to leave it: the embeddable distribution, the patched ._pth file, and pip,
+// setuptools and wheel expanded into Lib/site-packages. The installer then
+// extracts it without running the interpreter.
+func buildPythonEmbed(parent *trace.Span, resDir, pipToolsDir, embedDir string) error {
+	span := parent.Child("python embed")
+	defer span.End()
+
+	if err := os.RemoveAll(embedDir); err != nil {
+		return err
+	}
+	if err := payload.ExtractZip(filepath.Join(resDir, "python-3.8.10-embed-amd64.zip"), embedDir); err != nil {
+		return err
+	}
+	pth, err := os.ReadFile(filepath.Join(resDir, "python38._pth"))
+	if err != nil {
+		return err
+	}
+	if err := os.WriteFile(filepath.Join(embedDir, "python38._pth"), pth, 0644); err != nil {
+		return err
+	}
+	tools, err := pipToolWheels(pipToolsDir, nil)
+	if err != nil {
+		return err
+	}
+	dists, err := payload.Build(tools, embedDir, runtime.NumCPU())
+	if err != nil {
+		return err
+	}
+	countPayload(span, dists)
+	fmt.Printf("Prepared embedded Python with %d pip tools in %s\n", len(tools), embedDir)
+	return nil
+}
+
+// buildPythonArchive packs embedDir, overlaid with payloadDir when set, into a
+// multi-frame archive laid out like $INSTDIR\python38-embed.
+func buildPythonArchive(parent *trace.Span, embedDir, payloadDir, archivePath string) error {
+	span := parent.Child("python archive")
+	defer span.End()
+
+	start := time.Now()
+	w, err := archive.Create(archivePath, archive.DefaultFrameSize, runtime.NumCPU())
+	if err != nil {
+		return err
+	}
+	var skip func(rel string) bool
+	if payloadDir != "" {
+		// The payload replaces site-packages and Scripts, as it does when
+		// the installer extracts it separately
+		skip = func(rel string) bool {
+			return rel == payload.SitePackages || rel == payload.ScriptsDir
+		}
+	}
+	if err := w.AddTree(embedDir, skip); err != nil {
+		w.Close()
+		return err
+	}
+	if payloadDir != "" {
+		if err := w.AddTree(payloadDir, nil); err != nil {
+			w.Close()
+			return err
+		}
+	}
+	if err := w.Close(); err != nil {
+		return err
+	}
+	if fi, err := os.Stat(archivePath); err == nil {
+		span.AddFiles(1)
+		span.AddBytes(fi.Size())
+		fmt.Printf("Packed %s (%.1f MB) in %s\n", archivePath, float64(fi.Size())/(1<<20), time.Since(start).Round(time.Millisecond))
+	}
+	return nil
+}
+
+// buildSitePayload expands the resolved wheels, plus pip, setuptools and
+// wheel, into payloadDir, laid out like the embedded Python on the client.
+func buildSitePayload(parent *trace.Span, wheels []string, pipToolsDir, payloadDir string) error {
+	have := make(map[string]bool)
+	for _, w := range wheels {
+		if info, err := deps.ParseWheelFilename(filepath.Base(w)); err == nil {
+			have[info.Name] = true
+		}
+	}
+	tools, err := pipToolWheels(pipToolsDir, have)
+	if err != nil {
+		return err
+	}
+	wheels = append(wheels, tools...)
+
+	if err := os.RemoveAll(payloadDir); err != nil {
+		return err
+	}
+	start := time.Now()
+	span := parent.Child("payload expand")
+	dists, err := payload.Expand(wheels, payloadDir, runtime.NumCPU())
+	if err != nil {
+		return err
+	}
+	countPayload(span, dists)
+	span.End()
+	fmt.Printf("Expanded %d wheels into %s in %s\n", len(dists), payloadDir, time.Since(start).Round(time.Millisecond))
+
+	if compilePyc {
+		python, err := payload.FindPython38(config.GetPython38())
+		if err != nil {
+			return err
+		}
+		start = time.Now()
+		span := parent.Child("payload pyc")
+		n, err := payload.CompileBytecode(python, dists, payloadDir, clientPythonDir, runtime.NumCPU())
+		if err != nil {
+			return fmt.Errorf("compiling bytecode: %w", err)
+		}
+		span.AddFiles(n)
+		span.End()
+		fmt.Printf("Compiled %d modules with %s in %s\n", n, python, time.Since(start).Round(time.Millisecond))
+	}
+	return payload.WriteRecords(dists, payloadDir)
+}
+
+// countPayload records the files and bytes of the expanded dists on span.
+func countPayload(span *trace.Span, dists []*payload.Dist) {
+	for _, d := range dists {
+		span.AddFiles(len(d.Files))
+		for _, f := range d.Files {
+			span.AddBytes(f.Size)
+		}
+	}
+}
@@ -0,0 +1,51 @@
+package cmd
+
+import (
+	"fmt"
+	"strings"
+
+	"builder/internal/deps"
+	"builder/internal/trace"
+	"github.com/spf13/cobra"
+)
+
+var queryCmd = &cobra.Command{
+	Use:   "snapshot-query <package> [version]",
+	Short: "Show which snapshots ship a package",
+	Long: `Lists every version of a package found in the snapshots under versions/,
+with the snapshots that ship it. A version argument such as "47" restricts
+the output to that release series.`,
+	Args: cobra.RangeArgs(1, 2),
+	Run: func(cmd *cobra.Command, args []string) {
+		span := trace.Start("snapshot-query")
+		defer span.End()
+
+		version := ""
+		if len(args) > 1 {
+			version = args[1]
+		}
+
+		index, err := deps.OpenSnapshotIndex()
+		if err != nil {
+			fmt.Println("Error reading snapshots:", err)
+			exit(1)
+		}
+		found := index.Which(args[0], version)
+		if len(found) == 0 {
+			fmt.Printf("No snapshot ships %s %s\n", args[0], version)
+			return
+		}
+		for _, occ := range found {
+			label := occ.Name + " " + occ.Version
+			if occ.Version == "" {
+				// Unpinned requirement
+				label = occ.Line
+			}
+			fmt.Printf("%s: introduced in %s, shipped by %s\n", label, occ.Versions[0], strings.Join(occ.Versions, ", "))
+		}
+	},
+}
+
+func init() {
+	rootCmd.AddCommand(queryCmd)
+}
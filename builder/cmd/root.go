@@ -4,29 +4,60 @@ import (
 	"fmt"
 	"os"
 
+	"builder/internal/trace"
 	"github.com/spf13/cobra"
 	"github.com/spf13/viper"
 )
 
 var cfgFile string
+var traceJSON string
+var traceChrome string
 
 // rootCmd represents the base command when called without any subcommands
 var rootCmd = &cobra.Command{
 	Use:   "builder",
 	Short: "Installer builder tool",
 	Long:  `Tool for managing dependencies, versions, and building NSIS installers.`,
+	PersistentPostRun: func(cmd *cobra.Command, args []string) {
+		writeTraces()
+	},
 }
 
 func Execute() {
 	if err := rootCmd.Execute(); err != nil {
 		fmt.Println(err)
-		os.Exit(1)
+		exit(1)
+	}
+}
+
+// exit writes the requested trace files before exiting, so failed runs can
+// be profiled too. Within a serve job it ends the job instead.
+func exit(code int) {
+	writeTraces()
+	if inJob {
+		panic(jobExit(code))
+	}
+	os.Exit(code)
+}
+
+func writeTraces() {
+	if traceJSON != "" {
+		if err := trace.WriteJSONLines(traceJSON); err != nil {
+			fmt.Println("Error writing trace:", err)
+		}
+	}
+	if traceChrome != "" {
+		if err := trace.WriteChrome(traceChrome); err != nil {
+			fmt.Println("Error writing Chrome trace:", err)
+		}
 	}
 }
 
 func init() {
 	cobra.OnInitialize(initConfig)
 	rootCmd.PersistentFlags().StringVar(&cfgFile, "config", "", "config file (default is resources/config.toml)")
+	rootCmd.PersistentFlags().StringVar(&traceJSON, "trace-json", "", "write per-stage timing spans to this file as JSON lines")
+	rootCmd.PersistentFlags().StringVar(&traceChrome, "trace-chrome", "", "write per-stage timing spans to this file as a Chrome trace")
 }
 
 func initConfig() {
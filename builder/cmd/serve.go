@@ -0,0 +1,229 @@
+package cmd
+
+import (
+	"context"
+	"encoding/json"
+	"errors"
+	"fmt"
+	"io"
+	"net"
+	"net/http"
+	"os"
+	"os/signal"
+	"runtime/debug"
+	"strings"
+	"syscall"
+
+	"builder/internal/jobs"
+	"builder/internal/trace"
+	"github.com/spf13/cobra"
+	"github.com/spf13/pflag"
+	"github.com/spf13/viper"
+)
+
+var serveListen string
+var serveSocket string
+var serveQueue int
+
+// inJob is set while serve runs a command, so that exit ends the job
+// instead of the process.
+var inJob bool
+
+// jobExit is the exit code of a command run by serve.
+type jobExit int
+
+var serveCmd = &cobra.Command{
+	Use:   "serve",
+	Short: "Run builder commands submitted over a local HTTP API",
+	Long: `Keeps the wheel cache index, the snapshot index and the resolution cache
+in memory and runs builder commands submitted over HTTP, on a TCP address
+or a unix socket. Identical commands submitted while one is queued or
+running share that job. Jobs run one at a time, since commands share the
+build directory; each command still parallelizes its own work.
+
+  POST /jobs            {"args": ["build-upgrade", "--from-ver", "all"]}
+  GET  /jobs            list jobs
+  GET  /jobs/<id>       job status; ?wait=1 blocks until it finishes
+  GET  /jobs/<id>/log   command output`,
+	Args: cobra.NoArgs,
+	Run: func(cmd *cobra.Command, args []string) {
+		network, addr := "tcp", serveListen
+		if serveSocket != "" {
+			network, addr = "unix", serveSocket
+			// A socket left behind by an earlier run refuses to bind
+			os.Remove(serveSocket)
+		}
+		listener, err := net.Listen(network, addr)
+		if err != nil {
+			fmt.Println("Error listening:", err)
+			exit(1)
+		}
+
+		queue := jobs.NewQueue(1, serveQueue, runJob)
+		srv := &http.Server{Handler: jobsHandler(queue)}
+
+		ctx, stop := signal.NotifyContext(context.Background(), os.Interrupt, syscall.SIGTERM)
+		defer stop()
+		go func() {
+			<-ctx.Done()
+			srv.Shutdown(context.Background())
+		}()
+
+		fmt.Printf("Serving builder jobs on %s %s\n", network, listener.Addr())
+		if err := srv.Serve(listener); err != nil && !errors.Is(err, http.ErrServerClosed) {
+			fmt.Println("Error serving:", err)
+			exit(1)
+		}
+		fmt.Println("Waiting for queued jobs to finish...")
+		queue.Close()
+	},
+}
+
+func init() {
+	serveCmd.Flags().StringVar(&serveListen, "listen", "127.0.0.1:8765", "TCP address to serve the API on")
+	serveCmd.Flags().StringVar(&serveSocket, "socket", "", "Serve the API on this unix socket instead of --listen")
+	serveCmd.Flags().IntVar(&serveQueue, "queue", 16, "Number of jobs that may wait to run; more are rejected")
+	rootCmd.AddCommand(serveCmd)
+}
+
+// runJob runs a builder command line in this process, capturing its output
+// and that of the tools it starts into the job log.
+func runJob(job *jobs.Job) (err error) {
+	r, w, err := os.Pipe()
+	if err != nil {
+		return err
+	}
+	stdout, stderr := os.Stdout, os.Stderr
+	os.Stdout, os.Stderr = w, w
+	copied := make(chan struct{})
+	go func() {
+		io.Copy(io.MultiWriter(job, stdout), r)
+		close(copied)
+	}()
+	defer func() {
+		os.Stdout, os.Stderr = stdout, stderr
+		w.Close()
+		<-copied
+		r.Close()
+	}()
+
+	defer func() {
+		if p := recover(); p != nil {
+			if code, ok := p.(jobExit); ok {
+				err = fmt.Errorf("exit status %d", code)
+				return
+			}
+			err = fmt.Errorf("panic: %v\n%s", p, debug.Stack())
+		}
+	}()
+	inJob = true
+	defer func() { inJob = false }()
+
+	// Flags keep their values between executions of the same command tree,
+	// and viper keeps the config file and search paths of the previous job
+	resetFlags(rootCmd)
+	viper.Reset()
+	trace.Reset()
+	rootCmd.SetArgs(job.Args)
+	return rootCmd.Execute()
+}
+
+func resetFlags(cmd *cobra.Command) {
+	reset := func(f *pflag.Flag) {
+		if f.Changed {
+			f.Value.Set(f.DefValue)
+			f.Changed = false
+		}
+	}
+	cmd.PersistentFlags().VisitAll(reset)
+	cmd.Flags().VisitAll(reset)
+	for _, c := range cmd.Commands() {
+		resetFlags(c)
+	}
+}
+
+// jobsHandler serves the job API described in serveCmd.
+func jobsHandler(queue *jobs.Queue) http.Handler {
+	commands := make(map[string]bool)
+	for _, c := range rootCmd.Commands() {
+		if c.Name() != "serve" {
+			commands[c.Name()] = true
+		}
+	}
+
+	writeJSON := func(w http.ResponseWriter, code int, v interface{}) {
+		w.Header().Set("Content-Type", "application/json")
+		w.WriteHeader(code)
+		json.NewEncoder(w).Encode(v)
+	}
+	wait := func(r *http.Request, job *jobs.Job) {
+		if r.URL.Query().Get("wait") == "" {
+			return
+		}
+		select {
+		case <-job.Done():
+		case <-r.Context().Done():
+		}
+	}
+
+	mux := http.NewServeMux()
+	mux.HandleFunc("/jobs", func(w http.ResponseWriter, r *http.Request) {
+		switch r.Method {
+		case http.MethodGet:
+			list := queue.List()
+			statuses := make([]jobs.Status, len(list))
+			for i, job := range list {
+				statuses[i] = job.Status()
+			}
+			writeJSON(w, http.StatusOK, statuses)
+		case http.MethodPost:
+			var req struct {
+				Args []string `json:"args"`
+			}
+			if err := json.NewDecoder(r.Body).Decode(&req); err != nil {
+				http.Error(w, "invalid job: "+err.Error(), http.StatusBadRequest)
+				return
+			}
+			if len(req.Args) == 0 || !commands[req.Args[0]] {
+				http.Error(w, "args must start with a builder command", http.StatusBadRequest)
+				return
+			}
+			job, existing, err := queue.Submit(req.Args)
+			if err != nil {
+				http.Error(w, err.Error(), http.StatusServiceUnavailable)
+				return
+			}
+			wait(r, job)
+			code := http.StatusAccepted
+			if existing {
+				code = http.StatusOK
+			}
+			writeJSON(w, code, job.Status())
+		default:
+			http.Error(w, "method not allowed", http.StatusMethodNotAllowed)
+		}
+	})
+	mux.HandleFunc("/jobs/", func(w http.ResponseWriter, r *http.Request) {
+		if r.Method != http.MethodGet {
+			http.Error(w, "method not allowed", http.StatusMethodNotAllowed)
+			return
+		}
+		id, rest, _ := strings.Cut(strings.TrimPrefix(r.URL.Path, "/jobs/"), "/")
+		job, ok := queue.Get(id)
+		if !ok {
+			http.NotFound(w, r)
+			return
+		}
+		switch rest {
+		case "":
+			wait(r, job)
+			writeJSON(w, http.StatusOK, job.Status())
+		case "log":
+			w.Header().Set("Content-Type", "text/plain; charset=utf-8")
+			w.Write(job.Output())
+		default:
+			http.NotFound(w, r)
+		}
+	})
+	return mux
+}
@@ -0,0 +1,58 @@
+package cmd
+
+import (
+	"os"
+	"path/filepath"
+	"testing"
+
+	"builder/internal/jobs"
+	"github.com/spf13/cobra"
+	"github.com/spf13/viper"
+)
+
+func TestRunJobResetsConfig(t *testing.T) {
+	dir := t.TempDir()
+	if err := os.MkdirAll(filepath.Join(dir, "resources"), 0755); err != nil {
+		t.Fatal(err)
+	}
+	if err := os.WriteFile(filepath.Join(dir, "resources", "config.toml"), []byte("product_name = \"Default\"\n"), 0644); err != nil {
+		t.Fatal(err)
+	}
+	other := filepath.Join(dir, "other.toml")
+	if err := os.WriteFile(other, []byte("product_name = \"Other\"\n"), 0644); err != nil {
+		t.Fatal(err)
+	}
+	wd, err := os.Getwd()
+	if err != nil {
+		t.Fatal(err)
+	}
+	if err := os.Chdir(dir); err != nil {
+		t.Fatal(err)
+	}
+	defer os.Chdir(wd)
+
+	var used, product string
+	probe := &cobra.Command{
+		Use: "probe",
+		Run: func(cmd *cobra.Command, args []string) {
+			used = viper.ConfigFileUsed()
+			product = viper.GetString("product_name")
+		},
+	}
+	rootCmd.AddCommand(probe)
+	defer rootCmd.RemoveCommand(probe)
+
+	if err := runJob(&jobs.Job{Args: []string{"probe", "--config", other}}); err != nil {
+		t.Fatal(err)
+	}
+	if used != other || product != "Other" {
+		t.Fatalf("job with --config used %q (product %q)", used, product)
+	}
+
+	if err := runJob(&jobs.Job{Args: []string{"probe"}}); err != nil {
+		t.Fatal(err)
+	}
+	if used == other || filepath.Base(used) != "config.toml" || product != "Default" {
+		t.Errorf("job without --config used %q (product %q), expected resources/config.toml", used, product)
+	}
+}
@@ -9,6 +9,7 @@ import (
 	"github.com/spf13/cobra"
 	"builder/internal/config"
 	"builder/internal/deps"
+	"builder/internal/trace"
 	"builder/internal/utils"
 )
 
@@ -16,18 +17,21 @@ var snapshotCmd = &cobra.Command{
 	Use:   "snapshot-version",
 	Short: "Snapshot current requirements",
 	Run: func(cmd *cobra.Command, args []string) {
+		span := trace.Start("snapshot-version")
+		defer span.End()
+
 		version, _ := cmd.Flags().GetString("version")
 		if version == "" {
 			version = config.GetVersion()
 		}
 		if version == "" {
 			fmt.Println("No version specified and no current version in config.")
-			os.Exit(1)
+			exit(1)
 		}
 
 		if err := utils.ValidateVersion(version); err != nil {
 			fmt.Println("Error:", err)
-			os.Exit(1)
+			exit(1)
 		}
 
 		resourcesDir := config.GetResourcesDir()
@@ -44,12 +48,12 @@ var snapshotCmd = &cobra.Command{
 
 		if _, err := os.Stat(sourceFile); os.IsNotExist(err) {
 			fmt.Printf("Source file not found: %s\n", sourceFile)
-			os.Exit(1)
+			exit(1)
 		}
 
 		if err := os.MkdirAll(versionsDir, 0755); err != nil {
 			fmt.Println("Error creating versions directory:", err)
-			os.Exit(1)
+			exit(1)
 		}
 
 		if pyProject != "" {
@@ -58,19 +62,19 @@ var snapshotCmd = &cobra.Command{
 			resolved, err := deps.ResolveReqFile(sourceFile, versionsDir)
 			if err != nil {
 				fmt.Println("Error resolving dependencies:", err)
-				os.Exit(1)
+				exit(1)
 			}
 			// Rename resolved file to destFile if it's different
 			if resolved != destFile {
 				if resolved == sourceFile {
 					if err := copyFile(resolved, destFile); err != nil {
 						fmt.Println("Error copying file:", err)
-						os.Exit(1)
+						exit(1)
 					}
 				} else {
 					if err := os.Rename(resolved, destFile); err != nil {
 						fmt.Println("Error moving resolved file:", err)
-						os.Exit(1)
+						exit(1)
 					}
 				}
 			}
@@ -78,14 +82,19 @@ var snapshotCmd = &cobra.Command{
 			fmt.Printf("Snapshotting %s to %s\n", sourceFile, destFile)
 			if err := copyFile(sourceFile, destFile); err != nil {
 				fmt.Println("Error copying file:", err)
-				os.Exit(1)
+				exit(1)
 			}
 		}
 
 		// Convert absolute paths to package spec names inside the snapshot file
 		if err := deps.ConvertPathsToSpecs(destFile); err != nil {
 			fmt.Println("Error converting paths in snapshot:", err)
-			os.Exit(1)
+			exit(1)
+		}
+
+		// Index the new snapshot for diffs and snapshot-query
+		if _, err := deps.OpenSnapshotIndex(); err != nil {
+			fmt.Println("Warning: failed to update snapshot index:", err)
 		}
 
 		fmt.Println("Snapshot created.")
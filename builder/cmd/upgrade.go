@@ -1,134 +1,667 @@
 package cmd
 
 import (
+	"bytes"
+	"encoding/json"
 	"fmt"
 	"os"
 	"path/filepath"
+	"runtime"
+	"strings"
 
 	"builder/internal/config"
+	"builder/internal/delta"
 	"builder/internal/deps"
 	"builder/internal/nsis"
+	"builder/internal/trace"
 	"builder/internal/utils"
 	"github.com/spf13/cobra"
 	"github.com/spf13/viper"
 )
 
 var cleanUpgrade bool
+var upgradeJobs int
+var upgradeDeltas bool
+var planUpgrades bool
+var cumulativeUpgrade bool
+
+// maxDeltaRatio is the largest delta, relative to the full wheel, worth shipping
+const maxDeltaRatio = 0.5
+
+// upgradeHopOverhead is the fixed cost charged per upgrade package when
+// planning chains: the NSIS stub, scripts and requirement files, plus one
+// more download and install for the site. It keeps the planner from
+// chaining through a release to save a few bytes.
+const upgradeHopOverhead = 256 << 10
+
+// upgradePlan describes one from -> to upgrade package.
+type upgradePlan struct {
+	fromVer  string
+	toVer    string
+	diff     *deps.SnapshotDiff
+	diffPkgs []string
+	dlDir    string
+	reqFile  string
+	// removed lists packages the upgrade uninstalls, written to removedFile
+	removed     []string
+	removedFile string
+	// deltaDir holds binary deltas replacing wheels removed from dlDir
+	deltaDir   string
+	deltaCount int
+}
 
 var upgradeCmd = &cobra.Command{
 	Use:   "build-upgrade",
 	Short: "Build upgrade package",
 	Run: func(cmd *cobra.Command, args []string) {
-		fromVer, _ := cmd.Flags().GetString("from-ver")
+		span := trace.Start("build-upgrade")
+		defer span.End()
+
+		fromArg, _ := cmd.Flags().GetString("from-ver")
 		toVer, _ := cmd.Flags().GetString("to-ver")
 
 		if toVer == "" {
 			toVer = config.GetVersion()
 		}
 
-		if fromVer == "" {
+		if fromArg == "" {
 			fmt.Println("Error: --from-ver is required")
-			os.Exit(1)
-		}
-
-		if err := utils.ValidateVersion(fromVer); err != nil {
-			fmt.Println("Error invalid from-ver:", err)
-			os.Exit(1)
+			exit(1)
 		}
 		if err := utils.ValidateVersion(toVer); err != nil {
 			fmt.Println("Error invalid to-ver:", err)
-			os.Exit(1)
+			exit(1)
 		}
 
-		fmt.Printf("Building upgrade from %s to %s\n", fromVer, toVer)
-
-		// 1. Calculate Diff
-		diffPkgs, err := deps.GetDiffPackages(fromVer, toVer)
+		fromVers, err := parseFromVersions(fromArg, toVer)
 		if err != nil {
-			fmt.Println("Error calculating diff:", err)
-			os.Exit(1)
+			fmt.Println("Error:", err)
+			exit(1)
 		}
 
 		// Create build dir
 		buildDir := "build" // Relative to CWD
 		if err := os.MkdirAll(buildDir, 0755); err != nil {
 			fmt.Println("Error creating build dir:", err)
-			os.Exit(1)
+			exit(1)
 		}
 
-		dlDir := filepath.Join(buildDir, fmt.Sprintf("packages_upgrade_%s_to_%s", fromVer, toVer))
-		reqFile := filepath.Join(buildDir, fmt.Sprintf("requirements_upgrade_%s_to_%s.txt", fromVer, toVer))
+		if planUpgrades && cumulativeUpgrade {
+			fmt.Println("Error: --plan and --cumulative cannot be combined")
+			exit(1)
+		}
 
-		if cleanUpgrade {
-			fmt.Println("Cleaning up old upgrade packages...")
-			os.RemoveAll(dlDir)
+		steps := make([]deps.UpgradeStep, 0, len(fromVers))
+		if planUpgrades {
+			if steps, err = planUpgradeChains(span, fromVers, toVer, buildDir); err != nil {
+				fmt.Println("Error planning upgrade paths:", err)
+				exit(1)
+			}
+		} else {
+			for _, fromVer := range fromVers {
+				steps = append(steps, deps.UpgradeStep{From: fromVer, To: toVer})
+			}
 		}
 
-		// Write requirements file
-		f, err := os.Create(reqFile)
-		if err != nil {
-			fmt.Println("Error creating requirements file:", err)
-			os.Exit(1)
+		if len(steps) == 1 && !cumulativeUpgrade {
+			fromVer, toVer := steps[0].From, steps[0].To
+			fmt.Printf("Building upgrade from %s to %s\n", fromVer, toVer)
+
+			// 1. Calculate Diff
+			plan, err := planUpgrade(span, fromVer, toVer, buildDir)
+			if err != nil {
+				fmt.Println("Error:", err)
+				exit(1)
+			}
+
+			if len(plan.diffPkgs) > 0 {
+				fmt.Printf("Found %d new packages. Downloading...\n", len(plan.diffPkgs))
+				stage := span.Child("download")
+				if err := deps.DownloadDeps(plan.diffPkgs, plan.dlDir); err != nil {
+					fmt.Println("Error downloading deps:", err)
+					exit(1)
+				}
+				stage.End()
+			} else {
+				fmt.Println("No new packages. Creating empty upgrade.")
+			}
+			if upgradeDeltas {
+				if err := buildDeltas(span, plan); err != nil {
+					fmt.Println("Error building wheel deltas:", err)
+					exit(1)
+				}
+			}
+
+			// 2. Generate and compile the NSIS script
+			installerOutput, err := compileUpgrade(span, plan, buildDir)
+			if err != nil {
+				fmt.Println("Error:", err)
+				exit(1)
+			}
+			fmt.Println("Upgrade build complete. Output:", installerOutput)
+			return
 		}
-		defer f.Close()
 
-		for _, pkg := range diffPkgs {
-			if _, err := f.WriteString(pkg + "\n"); err != nil {
-				fmt.Println("Error writing to requirements file:", err)
-				os.Exit(1)
+		if planUpgrades {
+			fmt.Printf("Building %d upgrade packages\n", len(steps))
+		} else {
+			fmt.Printf("Building upgrades from %s to %s\n", strings.Join(fromVers, ", "), toVer)
+		}
+
+		// 1. Calculate every diff up front. Upgrades to the same version share
+		// one download; different target versions may pin the same package
+		// differently, so they are downloaded separately.
+		var plans []*upgradePlan
+		var targets []string
+		unions := make(map[string][]string)
+		seen := make(map[string]struct{})
+		for _, step := range steps {
+			plan, err := planUpgrade(span, step.From, step.To, buildDir)
+			if err != nil {
+				fmt.Println("Error:", err)
+				exit(1)
+			}
+			fmt.Printf("%s -> %s: %d new packages\n", step.From, step.To, len(plan.diffPkgs))
+			plans = append(plans, plan)
+			if _, ok := unions[step.To]; !ok {
+				targets = append(targets, step.To)
+				unions[step.To] = []string{}
+			}
+			for _, pkg := range plan.diffPkgs {
+				key := step.To + "\x00" + pkg
+				if _, ok := seen[key]; !ok {
+					seen[key] = struct{}{}
+					unions[step.To] = append(unions[step.To], pkg)
+				}
 			}
 		}
 
-		if len(diffPkgs) > 0 {
-			fmt.Printf("Found %d new packages. Downloading...\n", len(diffPkgs))
-			if err := deps.DownloadDeps(diffPkgs, dlDir); err != nil {
+		// 2. Download the union of all needed wheels once per target version,
+		// then hand each upgrade the subset it needs
+		sharedDirs := make(map[string]string, len(targets))
+		for _, to := range targets {
+			sharedDir := filepath.Join(buildDir, fmt.Sprintf("packages_upgrade_shared_to_%s", to))
+			sharedDirs[to] = sharedDir
+			if cleanUpgrade {
+				os.RemoveAll(sharedDir)
+			}
+			union := unions[to]
+			if len(union) == 0 {
+				continue
+			}
+			fmt.Printf("Downloading %d packages needed by upgrades to %s...\n", len(union), to)
+			stage := span.Child("download")
+			stage.SetAttr("to", to)
+			if err := deps.DownloadDeps(union, sharedDir); err != nil {
 				fmt.Println("Error downloading deps:", err)
-				os.Exit(1)
+				exit(1)
+			}
+			stage.End()
+		}
+		for _, plan := range plans {
+			stage := span.Child("link wheels")
+			stage.SetAttr("upgrade", plan.fromVer+" -> "+plan.toVer)
+			if err := deps.LinkWheels(plan.diffPkgs, sharedDirs[plan.toVer], plan.dlDir); err != nil {
+				fmt.Printf("Error preparing packages for %s -> %s: %v\n", plan.fromVer, plan.toVer, err)
+				exit(1)
+			}
+			stage.End()
+			if upgradeDeltas {
+				if err := buildDeltas(span, plan); err != nil {
+					fmt.Printf("Error building wheel deltas for %s -> %s: %v\n", plan.fromVer, plan.toVer, err)
+					exit(1)
+				}
 			}
-		} else {
-			fmt.Println("No new packages. Creating empty upgrade.")
-			os.MkdirAll(dlDir, 0755)
 		}
 
-		// 2. Generate NSIS Script
-		nsiPath, err := nsis.GenerateUpgradeScript(fromVer, toVer, buildDir)
+		if cumulativeUpgrade {
+			installerOutput, err := compileCumulativeUpgrade(span, plans, toVer, buildDir)
+			if err != nil {
+				fmt.Println("Error:", err)
+				exit(1)
+			}
+			fmt.Println("Cumulative upgrade build complete. Output:", installerOutput)
+			return
+		}
+
+		// 3. Compile the installers concurrently
+		outputs := make([]string, len(plans))
+		errs := make([]error, len(plans))
+		utils.ForEachParallel(len(plans), upgradeJobs, func(i int) error {
+			outputs[i], errs[i] = compileUpgrade(span, plans[i], buildDir)
+			return errs[i]
+		})
+
+		failed := false
+		for i, plan := range plans {
+			if errs[i] != nil {
+				fmt.Printf("Upgrade %s -> %s failed: %v\n", plan.fromVer, plan.toVer, errs[i])
+				failed = true
+				continue
+			}
+			fmt.Printf("Upgrade %s -> %s complete. Output: %s\n", plan.fromVer, plan.toVer, outputs[i])
+		}
+		if failed {
+			exit(1)
+		}
+	},
+}
+
+func init() {
+	upgradeCmd.Flags().BoolVar(&cleanUpgrade, "clean", true, "Clean up upgrade packages directory before downloading")
+	upgradeCmd.Flags().IntVar(&upgradeJobs, "jobs", runtime.NumCPU(), "Number of upgrade installers compiled concurrently")
+	upgradeCmd.Flags().BoolVar(&upgradeDeltas, "delta", false, "Ship binary deltas against the client wheel cache for upgraded packages")
+	upgradeCmd.Flags().BoolVar(&cumulativeUpgrade, "cumulative", false, "Build one installer that upgrades any of the from-versions")
+	upgradeCmd.Flags().BoolVar(&planUpgrades, "plan", false, "Chain upgrades through intermediate snapshots when that ships fewer bytes")
+	rootCmd.AddCommand(upgradeCmd)
+	upgradeCmd.Flags().String("from-ver", "", "Upgrade from version; a comma-separated list, or \"all\" for every older snapshot")
+	upgradeCmd.Flags().String("to-ver", "", "Upgrade to version (default: current)")
+}
+
+// parseFromVersions expands the --from-ver argument into a list of versions.
+func parseFromVersions(arg, toVer string) ([]string, error) {
+	var versions []string
+	if arg == "all" {
+		snapshots, err := deps.ListSnapshotVersions()
 		if err != nil {
-			fmt.Println("Error generating NSIS script:", err)
-			os.Exit(1)
+			return nil, fmt.Errorf("failed to list snapshots: %w", err)
 		}
+		for _, v := range snapshots {
+			if utils.CompareVersions(v, toVer) < 0 {
+				versions = append(versions, v)
+			}
+		}
+		if len(versions) == 0 {
+			return nil, fmt.Errorf("no snapshots older than %s found", toVer)
+		}
+		return versions, nil
+	}
+
+	for _, v := range strings.Split(arg, ",") {
+		v = strings.TrimSpace(v)
+		if v == "" {
+			continue
+		}
+		if err := utils.ValidateVersion(v); err != nil {
+			return nil, fmt.Errorf("invalid from-ver: %w", err)
+		}
+		versions = append(versions, v)
+	}
+	if len(versions) == 0 {
+		return nil, fmt.Errorf("--from-ver is required")
+	}
+	return versions, nil
+}
 
-		// 3. Compile
-		productName := viper.GetString("product_name")
-		companyName := viper.GetString("company_name")
-		oldProductName := viper.GetString("old_product_name")
+// planUpgradeChains finds the cheapest upgrade path from each of fromVers
+// to toVer through the available snapshots, by estimated payload bytes, and
+// returns the distinct upgrade packages the paths need. The paths are
+// written to build/upgrade_paths_to_<ver>.json.
+func planUpgradeChains(parent *trace.Span, fromVers []string, toVer, buildDir string) ([]deps.UpgradeStep, error) {
+	span := parent.Child("plan")
+	defer span.End()
 
-		// Use absolute path for output to avoid confusion if cwd changes (though it shouldn't here)
-		absBuildDir, err := filepath.Abs(buildDir)
+	versions, err := deps.ListSnapshotVersions()
+	if err != nil {
+		return nil, fmt.Errorf("failed to list snapshots: %w", err)
+	}
+	estimator := deps.NewPayloadEstimator(upgradeDeltas)
+	all, err := deps.ShortestUpgradePaths(versions, toVer, func(from, to string) (int64, error) {
+		diff, err := deps.DiffSnapshots(from, to)
 		if err != nil {
-			fmt.Println("Error getting absolute path for build dir:", err)
-			os.Exit(1)
+			return 0, err
 		}
-		installerOutput := filepath.Join(absBuildDir, fmt.Sprintf("%s_升级包_%s_至_%s.exe", productName, fromVer, toVer))
+		n, err := estimator.Estimate(diff)
+		return n + upgradeHopOverhead, err
+	})
+	if err != nil {
+		return nil, err
+	}
 
-		defines := map[string]string{
-			"PRODUCT_NAME":     productName,
-			"COMPANY_NAME":     companyName,
-			"OLD_PRODUCT_NAME": oldProductName,
-			"INSTALLER_OUTPUT": installerOutput,
+	var paths []deps.UpgradePath
+	var steps []deps.UpgradeStep
+	seen := make(map[deps.UpgradeStep]bool)
+	for _, fromVer := range fromVers {
+		path, ok := all[fromVer]
+		if !ok {
+			return nil, fmt.Errorf("no snapshot for version %s older than %s", fromVer, toVer)
 		}
+		paths = append(paths, path)
+		hops := []string{fromVer}
+		for _, step := range path.Steps {
+			hops = append(hops, step.To)
+			if !seen[step] {
+				seen[step] = true
+				steps = append(steps, step)
+			}
+		}
+		fmt.Printf("%s: %s (%.1f MB)\n", fromVer, strings.Join(hops, " -> "), float64(path.Bytes)/(1<<20))
+	}
+
+	pathsJSON, err := json.MarshalIndent(paths, "", "  ")
+	if err != nil {
+		return nil, err
+	}
+	pathsFile := filepath.Join(buildDir, fmt.Sprintf("upgrade_paths_to_%s.json", toVer))
+	if err := os.WriteFile(pathsFile, pathsJSON, 0644); err != nil {
+		return nil, fmt.Errorf("writing upgrade paths: %w", err)
+	}
+	return steps, nil
+}
+
+// planUpgrade calculates the diff between two versions and writes the
+// requirements file that the upgrade installer feeds to pip.
+func planUpgrade(parent *trace.Span, fromVer, toVer, buildDir string) (*upgradePlan, error) {
+	span := parent.Child("diff")
+	span.SetAttr("upgrade", fromVer+" -> "+toVer)
+	defer span.End()
+
+	diff, err := deps.DiffSnapshots(fromVer, toVer)
+	if err != nil {
+		return nil, fmt.Errorf("calculating diff: %w", err)
+	}
+	printDiff(diff)
+	diffPkgs := diff.InstallLines()
+
+	plan := &upgradePlan{
+		fromVer:  fromVer,
+		toVer:    toVer,
+		diff:     diff,
+		diffPkgs: diffPkgs,
+		dlDir:    filepath.Join(buildDir, fmt.Sprintf("packages_upgrade_%s_to_%s", fromVer, toVer)),
+		reqFile:  filepath.Join(buildDir, fmt.Sprintf("requirements_upgrade_%s_to_%s.txt", fromVer, toVer)),
+
+		removed:     diff.UninstallNames(),
+		removedFile: filepath.Join(buildDir, fmt.Sprintf("uninstall_upgrade_%s_to_%s.txt", fromVer, toVer)),
+		deltaDir:    filepath.Join(buildDir, fmt.Sprintf("deltas_upgrade_%s_to_%s", fromVer, toVer)),
+	}
 
-		if err := nsis.CompileNSIS(nsiPath, defines); err != nil {
-			fmt.Println("Error compiling NSIS:", err)
-			os.Exit(1)
+	if cleanUpgrade {
+		fmt.Println("Cleaning up old upgrade packages...")
+		os.RemoveAll(plan.dlDir)
+	}
+
+	// Write requirements file
+	var content strings.Builder
+	for _, pkg := range diffPkgs {
+		content.WriteString(pkg + "\n")
+	}
+	if err := os.WriteFile(plan.reqFile, []byte(content.String()), 0644); err != nil {
+		return nil, fmt.Errorf("writing requirements file: %w", err)
+	}
+	// Packages dropped since fromVer are uninstalled in one batch by the installer
+	var removed strings.Builder
+	for _, name := range plan.removed {
+		removed.WriteString(name + "\n")
+	}
+	if err := os.WriteFile(plan.removedFile, []byte(removed.String()), 0644); err != nil {
+		return nil, fmt.Errorf("writing uninstall list: %w", err)
+	}
+
+	if err := os.MkdirAll(plan.dlDir, 0755); err != nil {
+		return nil, err
+	}
+
+	// Keep the structured diff next to the requirements file for review
+	diffJSON, err := json.MarshalIndent(diff, "", "  ")
+	if err != nil {
+		return nil, err
+	}
+	diffFile := filepath.Join(buildDir, fmt.Sprintf("upgrade_diff_%s_to_%s.json", fromVer, toVer))
+	if err := os.WriteFile(diffFile, diffJSON, 0644); err != nil {
+		return nil, fmt.Errorf("writing diff file: %w", err)
+	}
+	return plan, nil
+}
+
+// buildDeltas replaces the wheels of upgraded and downgraded packages in
+// plan.dlDir with binary deltas against the wheels of the old version, which
+// the client keeps in $INSTDIR\wheels. A delta is only kept when it is
+// substantially smaller than the wheel it replaces.
+func buildDeltas(parent *trace.Span, plan *upgradePlan) error {
+	span := parent.Child("deltas")
+	span.SetAttr("upgrade", plan.fromVer+" -> "+plan.toVer)
+	defer span.End()
+
+	if err := os.RemoveAll(plan.deltaDir); err != nil {
+		return err
+	}
+	if err := os.MkdirAll(plan.deltaDir, 0755); err != nil {
+		return err
+	}
+
+	var changes []deps.PackageChange
+	for _, c := range append(append([]deps.PackageChange{}, plan.diff.Upgraded...), plan.diff.Downgraded...) {
+		if c.FromVersion != "" && c.ToVersion != "" {
+			changes = append(changes, c)
 		}
+	}
 
-		fmt.Println("Upgrade build complete. Output:", installerOutput)
-	},
+	saved := make([]int64, len(changes))
+	err := utils.ForEachParallel(len(changes), upgradeJobs, func(i int) error {
+		c := changes[i]
+		newPath, err := deps.FindWheel(plan.dlDir, c.Name, c.ToVersion)
+		if err != nil {
+			// Local packages and sdists are always shipped whole
+			return nil
+		}
+		old, err := deps.FetchWheel(c.Name, c.FromVersion)
+		if err != nil {
+			fmt.Printf("Warning: shipping %s whole, old wheel unavailable: %v\n", c.Name, err)
+			return nil
+		}
+
+		oldData, err := os.ReadFile(old.Path)
+		if err != nil {
+			return err
+		}
+		newData, err := os.ReadFile(newPath)
+		if err != nil {
+			return err
+		}
+		var buf bytes.Buffer
+		if err := delta.Encode(&buf, old.Filename, oldData, filepath.Base(newPath), newData); err != nil {
+			return fmt.Errorf("encoding delta for %s: %w", c.Name, err)
+		}
+		if float64(buf.Len()) > float64(len(newData))*maxDeltaRatio {
+			return nil
+		}
+
+		deltaPath := filepath.Join(plan.deltaDir, filepath.Base(newPath)+".delta")
+		if err := os.WriteFile(deltaPath, buf.Bytes(), 0644); err != nil {
+			return err
+		}
+		span.AddFiles(1)
+		span.AddBytes(int64(buf.Len()))
+		saved[i] = int64(len(newData) - buf.Len())
+		return os.Remove(newPath)
+	})
+	if err != nil {
+		return err
+	}
+
+	plan.deltaCount = 0
+	var total int64
+	for _, n := range saved {
+		if n > 0 {
+			plan.deltaCount++
+			total += n
+		}
+	}
+	fmt.Printf("%s -> %s: %d of %d changed wheels shipped as deltas, saving %.1f MB\n",
+		plan.fromVer, plan.toVer, plan.deltaCount, len(changes), float64(total)/(1<<20))
+	return nil
 }
 
-func init() {
-	upgradeCmd.Flags().BoolVar(&cleanUpgrade, "clean", true, "Clean up upgrade packages directory before downloading")
-	rootCmd.AddCommand(upgradeCmd)
-	upgradeCmd.Flags().String("from-ver", "", "Upgrade from version")
-	upgradeCmd.Flags().String("to-ver", "", "Upgrade to version (default: current)")
+func printDiff(diff *deps.SnapshotDiff) {
+	for _, c := range diff.Added {
+		fmt.Printf("  + %s %s\n", c.Name, c.ToVersion)
+	}
+	for _, c := range diff.Upgraded {
+		fmt.Printf("  ^ %s %s -> %s\n", c.Name, c.FromVersion, c.ToVersion)
+	}
+	for _, c := range diff.Downgraded {
+		fmt.Printf("  v %s %s -> %s\n", c.Name, c.FromVersion, c.ToVersion)
+	}
+	for _, c := range diff.Removed {
+		fmt.Printf("  - %s %s\n", c.Name, c.FromVersion)
+	}
+	fmt.Printf("%d added, %d upgraded, %d downgraded, %d removed\n",
+		len(diff.Added), len(diff.Upgraded), len(diff.Downgraded), len(diff.Removed))
+}
+
+// compileUpgrade generates the NSIS script for a plan and compiles it,
+// returning the path of the installer.
+func compileUpgrade(parent *trace.Span, plan *upgradePlan, buildDir string) (string, error) {
+	span := parent.Child("compile")
+	span.SetAttr("upgrade", plan.fromVer+" -> "+plan.toVer)
+	defer span.End()
+
+	nsiPath, err := nsis.GenerateUpgradeScript(plan.fromVer, plan.toVer, plan.diff.StaleWheelPatterns(), buildDir)
+	if err != nil {
+		return "", fmt.Errorf("generating NSIS script: %w", err)
+	}
+
+	productName := viper.GetString("product_name")
+	companyName := viper.GetString("company_name")
+	oldProductName := viper.GetString("old_product_name")
+
+	// Use absolute path for output to avoid confusion if cwd changes (though it shouldn't here)
+	absBuildDir, err := filepath.Abs(buildDir)
+	if err != nil {
+		return "", fmt.Errorf("getting absolute path for build dir: %w", err)
+	}
+	installerOutput := filepath.Join(absBuildDir, fmt.Sprintf("%s_升级包_%s_至_%s.exe", productName, plan.fromVer, plan.toVer))
+
+	defines := map[string]string{
+		"PRODUCT_NAME":     productName,
+		"COMPANY_NAME":     companyName,
+		"OLD_PRODUCT_NAME": oldProductName,
+		"INSTALLER_OUTPUT": installerOutput,
+	}
+	if len(plan.removed) > 0 {
+		defines["HAS_REMOVED_PACKAGES"] = "1"
+	}
+	if plan.deltaCount > 0 {
+		absResDir, err := filepath.Abs(config.GetResourcesDir())
+		if err != nil {
+			return "", fmt.Errorf("getting absolute path for resources: %w", err)
+		}
+		defines["HAS_WHEEL_DELTAS"] = "1"
+		defines["RESOURCES_DIR"] = absResDir
+	}
+
+	if err := nsis.CompileNSIS(nsiPath, defines); err != nil {
+		return "", fmt.Errorf("compiling NSIS: %w", err)
+	}
+	return installerOutput, nil
+}
+
+// compileCumulativeUpgrade builds a single installer for all plans, which
+// must share the same target version. Each plan's packages and deltas are
+// already prepared in its build directories; wheels needed by several
+// versions are packed once. The per-version contents are written to
+// build/cumulative_manifest_to_<ver>.json.
+func compileCumulativeUpgrade(parent *trace.Span, plans []*upgradePlan, toVer, buildDir string) (string, error) {
+	span := parent.Child("compile")
+	span.SetAttr("upgrade", "cumulative -> "+toVer)
+	defer span.End()
+
+	rel := func(dir string, names ...string) ([]string, error) {
+		paths := make([]string, 0, len(names))
+		for _, name := range names {
+			p, err := filepath.Rel(buildDir, filepath.Join(dir, name))
+			if err != nil {
+				return nil, err
+			}
+			paths = append(paths, p)
+		}
+		return paths, nil
+	}
+	listDir := func(dir string) ([]string, error) {
+		entries, err := os.ReadDir(dir)
+		if err != nil && !os.IsNotExist(err) {
+			return nil, err
+		}
+		var names []string
+		for _, e := range entries {
+			if e.Type().IsRegular() {
+				names = append(names, e.Name())
+			}
+		}
+		return names, nil
+	}
+
+	upgrades := make([]nsis.CumulativeUpgrade, 0, len(plans))
+	hasDeltas := false
+	for _, plan := range plans {
+		u := nsis.CumulativeUpgrade{FromVersion: plan.fromVer, StaleWheels: plan.diff.StaleWheelPatterns()}
+		names, err := listDir(plan.dlDir)
+		if err != nil {
+			return "", err
+		}
+		if u.Wheels, err = rel(plan.dlDir, names...); err != nil {
+			return "", err
+		}
+		if u.RequirementsFile, err = filepath.Rel(buildDir, plan.reqFile); err != nil {
+			return "", err
+		}
+		if len(plan.removed) > 0 {
+			if u.UninstallFile, err = filepath.Rel(buildDir, plan.removedFile); err != nil {
+				return "", err
+			}
+		}
+		if plan.deltaCount > 0 {
+			names, err := listDir(plan.deltaDir)
+			if err != nil {
+				return "", err
+			}
+			if u.Deltas, err = rel(plan.deltaDir, names...); err != nil {
+				return "", err
+			}
+			hasDeltas = true
+		}
+		upgrades = append(upgrades, u)
+	}
+
+	manifestJSON, err := json.MarshalIndent(upgrades, "", "  ")
+	if err != nil {
+		return "", err
+	}
+	manifestFile := filepath.Join(buildDir, fmt.Sprintf("cumulative_manifest_to_%s.json", toVer))
+	if err := os.WriteFile(manifestFile, manifestJSON, 0644); err != nil {
+		return "", fmt.Errorf("writing cumulative manifest: %w", err)
+	}
+
+	nsiPath, err := nsis.GenerateCumulativeScript(toVer, upgrades, buildDir)
+	if err != nil {
+		return "", fmt.Errorf("generating NSIS script: %w", err)
+	}
+
+	productName := viper.GetString("product_name")
+	absBuildDir, err := filepath.Abs(buildDir)
+	if err != nil {
+		return "", fmt.Errorf("getting absolute path for build dir: %w", err)
+	}
+	installerOutput := filepath.Join(absBuildDir, fmt.Sprintf("%s_累积升级包_至_%s.exe", productName, toVer))
+
+	defines := map[string]string{
+		"PRODUCT_NAME":     productName,
+		"COMPANY_NAME":     viper.GetString("company_name"),
+		"OLD_PRODUCT_NAME": viper.GetString("old_product_name"),
+		"INSTALLER_OUTPUT": installerOutput,
+	}
+	if hasDeltas {
+		absResDir, err := filepath.Abs(config.GetResourcesDir())
+		if err != nil {
+			return "", fmt.Errorf("getting absolute path for resources: %w", err)
+		}
+		defines["HAS_WHEEL_DELTAS"] = "1"
+		defines["RESOURCES_DIR"] = absResDir
+	}
+
+	if err := nsis.CompileNSIS(nsiPath, defines); err != nil {
+		return "", fmt.Errorf("compiling NSIS: %w", err)
+	}
+	return installerOutput, nil
 }
@@ -0,0 +1,292 @@
+// Package archive implements a multi-frame archive of a directory tree whose
+// frames decompress independently, so the client can extract on all cores.
+//
+// The contents of all files are concatenated into one logical stream, which
+// is cut into frames of a fixed uncompressed size and deflated separately.
+// Layout:
+//
+//	"PHISPAK1" | frame... | deflated JSON index | index offset (uint64 LE) | "PHISPAK1"
+package archive
+
+import (
+	"bytes"
+	"compress/flate"
+	"encoding/binary"
+	"encoding/json"
+	"fmt"
+	"hash/crc32"
+	"io"
+	"os"
+	"path/filepath"
+	"sort"
+	"strings"
+)
+
+const magic = "PHISPAK1"
+
+// DefaultFrameSize balances compression ratio against parallelism.
+const DefaultFrameSize = 4 << 20
+
+// Entry is a file in the archive. Offset is its position in the logical stream.
+type Entry struct {
+	Path   string `json:"path"`
+	Offset int64  `json:"offset"`
+	Size   int64  `json:"size"`
+}
+
+// Frame is one independently compressed slice of the logical stream.
+type Frame struct {
+	Offset  int64  `json:"offset"`  // position of the compressed data in the archive
+	CSize   int64  `json:"csize"`   // compressed size
+	UOffset int64  `json:"uoffset"` // position in the logical stream
+	USize   int64  `json:"usize"`   // uncompressed size
+	CRC32   uint32 `json:"crc32"`   // of the uncompressed data
+}
+
+// Index describes the files and frames of an archive.
+type Index struct {
+	Files  []Entry `json:"files"`
+	Frames []Frame `json:"frames"`
+}
+
+type frameResult struct {
+	data []byte
+	crc  uint32
+	size int
+	err  error
+}
+
+// Writer builds an archive. Frames are compressed concurrently and written in
+// order.
+type Writer struct {
+	f         *os.File
+	frameSize int
+	buf       []byte
+	index     Index
+	uoffset   int64
+	offset    int64
+
+	pending chan chan frameResult
+	slots   chan struct{}
+	done    chan error
+}
+
+// Create starts a new archive at path compressing on up to workers goroutines.
+func Create(path string, frameSize, workers int) (*Writer, error) {
+	if workers < 1 {
+		workers = 1
+	}
+	f, err := os.Create(path)
+	if err != nil {
+		return nil, err
+	}
+	if _, err := f.WriteString(magic); err != nil {
+		f.Close()
+		return nil, err
+	}
+	w := &Writer{
+		f:         f,
+		frameSize: frameSize,
+		buf:       make([]byte, 0, frameSize),
+		offset:    int64(len(magic)),
+		pending:   make(chan chan frameResult, workers),
+		slots:     make(chan struct{}, workers),
+		done:      make(chan error, 1),
+	}
+	go w.writeFrames()
+	return w, nil
+}
+
+// writeFrames writes compressed frames to the file in submission order.
+func (w *Writer) writeFrames() {
+	var firstErr error
+	for ch := range w.pending {
+		r := <-ch
+		<-w.slots
+		if firstErr != nil {
+			continue
+		}
+		if r.err != nil {
+			firstErr = r.err
+			continue
+		}
+		if _, err := w.f.Write(r.data); err != nil {
+			firstErr = err
+			continue
+		}
+		w.index.Frames = append(w.index.Frames, Frame{
+			Offset:  w.offset,
+			CSize:   int64(len(r.data)),
+			UOffset: w.uoffset,
+			USize:   int64(r.size),
+			CRC32:   r.crc,
+		})
+		w.offset += int64(len(r.data))
+		w.uoffset += int64(r.size)
+	}
+	w.done <- firstErr
+}
+
+func (w *Writer) flushFrame() {
+	if len(w.buf) == 0 {
+		return
+	}
+	data := w.buf
+	w.buf = make([]byte, 0, w.frameSize)
+
+	w.slots <- struct{}{}
+	ch := make(chan frameResult, 1)
+	w.pending <- ch
+	go func() {
+		var out bytes.Buffer
+		zw, err := flate.NewWriter(&out, flate.BestCompression)
+		if err == nil {
+			_, err = zw.Write(data)
+		}
+		if err == nil {
+			err = zw.Close()
+		}
+		ch <- frameResult{data: out.Bytes(), crc: crc32.ChecksumIEEE(data), size: len(data), err: err}
+	}()
+}
+
+// Add appends a file read from r under the archive path name.
+func (w *Writer) Add(name string, r io.Reader) error {
+	entry := Entry{Path: filepath.ToSlash(name)}
+	if n := len(w.index.Files); n > 0 {
+		prev := w.index.Files[n-1]
+		entry.Offset = prev.Offset + prev.Size
+	}
+	for {
+		if len(w.buf) == cap(w.buf) {
+			w.flushFrame()
+		}
+		n, err := r.Read(w.buf[len(w.buf):cap(w.buf)])
+		w.buf = w.buf[:len(w.buf)+n]
+		entry.Size += int64(n)
+		if err == io.EOF {
+			break
+		}
+		if err != nil {
+			return err
+		}
+	}
+	w.index.Files = append(w.index.Files, entry)
+	return nil
+}
+
+// AddTree adds every regular file under root, in lexical order, unless skip
+// returns true for its slash-separated path relative to root.
+func (w *Writer) AddTree(root string, skip func(rel string) bool) error {
+	return filepath.Walk(root, func(p string, info os.FileInfo, err error) error {
+		if err != nil {
+			return err
+		}
+		rel, err := filepath.Rel(root, p)
+		if err != nil {
+			return err
+		}
+		rel = filepath.ToSlash(rel)
+		if rel != "." && skip != nil && skip(rel) {
+			if info.IsDir() {
+				return filepath.SkipDir
+			}
+			return nil
+		}
+		if !info.Mode().IsRegular() {
+			return nil
+		}
+		f, err := os.Open(p)
+		if err != nil {
+			return err
+		}
+		defer f.Close()
+		return w.Add(rel, f)
+	})
+}
+
+// Close flushes the last frame and writes the index.
+func (w *Writer) Close() error {
+	w.flushFrame()
+	close(w.pending)
+	if err := <-w.done; err != nil {
+		w.f.Close()
+		return err
+	}
+
+	indexJSON, err := json.Marshal(w.index)
+	if err != nil {
+		w.f.Close()
+		return err
+	}
+	var index bytes.Buffer
+	zw, _ := flate.NewWriter(&index, flate.BestCompression)
+	zw.Write(indexJSON)
+	zw.Close()
+
+	var footer [8]byte
+	binary.LittleEndian.PutUint64(footer[:], uint64(w.offset))
+	for _, b := range [][]byte{index.Bytes(), footer[:], []byte(magic)} {
+		if _, err := w.f.Write(b); err != nil {
+			w.f.Close()
+			return err
+		}
+	}
+	return w.f.Close()
+}
+
+// ReadIndex reads the index of the archive open in f.
+func ReadIndex(f *os.File) (*Index, error) {
+	fi, err := f.Stat()
+	if err != nil {
+		return nil, err
+	}
+	trailer := int64(8 + len(magic))
+	if fi.Size() < int64(len(magic))+trailer {
+		return nil, fmt.Errorf("not an archive")
+	}
+	buf := make([]byte, trailer)
+	if _, err := f.ReadAt(buf, fi.Size()-trailer); err != nil {
+		return nil, err
+	}
+	if string(buf[8:]) != magic {
+		return nil, fmt.Errorf("not an archive")
+	}
+	indexOffset := int64(binary.LittleEndian.Uint64(buf[:8]))
+	if indexOffset < int64(len(magic)) || indexOffset > fi.Size()-trailer {
+		return nil, fmt.Errorf("corrupt archive index offset")
+	}
+
+	zr := flate.NewReader(io.NewSectionReader(f, indexOffset, fi.Size()-trailer-indexOffset))
+	defer zr.Close()
+	var index Index
+	if err := json.NewDecoder(zr).Decode(&index); err != nil {
+		return nil, fmt.Errorf("reading archive index: %w", err)
+	}
+	for _, e := range index.Files {
+		if !safePath(e.Path) {
+			return nil, fmt.Errorf("unsafe path in archive: %s", e.Path)
+		}
+	}
+	return &index, nil
+}
+
+func safePath(p string) bool {
+	if p == "" || strings.HasPrefix(p, "/") || strings.Contains(p, ":") || strings.Contains(p, "\\") {
+		return false
+	}
+	for _, part := range strings.Split(p, "/") {
+		if part == ".." {
+			return false
+		}
+	}
+	return true
+}
+
+// filesIn returns the index range of files overlapping [start, end) of the
+// logical stream. Files are stored in offset order.
+func filesIn(files []Entry, start, end int64) (int, int) {
+	lo := sort.Search(len(files), func(i int) bool { return files[i].Offset+files[i].Size > start })
+	hi := sort.Search(len(files), func(i int) bool { return files[i].Offset >= end })
+	return lo, hi
+}
@@ -0,0 +1,73 @@
+package archive
+
+import (
+	"bytes"
+	"math/rand"
+	"os"
+	"path/filepath"
+	"testing"
+)
+
+func TestRoundTrip(t *testing.T) {
+	rng := rand.New(rand.NewSource(1))
+	src := t.TempDir()
+	files := map[string][]byte{
+		"python.exe":                      make([]byte, 5000),
+		"Lib/site-packages/a/__init__.py": []byte("A = 1\n"),
+		"Lib/site-packages/a/empty.py":    {},
+		"Lib/site-packages/b/big.bin":     make([]byte, 12345),
+		"Scripts/tool.cmd":                []byte("@echo off\r\n"),
+		"skipped/file.txt":                []byte("not archived"),
+	}
+	for name, data := range files {
+		rng.Read(data)
+		p := filepath.Join(src, filepath.FromSlash(name))
+		os.MkdirAll(filepath.Dir(p), 0755)
+		if err := os.WriteFile(p, data, 0644); err != nil {
+			t.Fatal(err)
+		}
+	}
+
+	pak := filepath.Join(t.TempDir(), "test.pak")
+	w, err := Create(pak, 1000, 3)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if err := w.AddTree(src, func(rel string) bool { return rel == "skipped" }); err != nil {
+		t.Fatal(err)
+	}
+	if err := w.Close(); err != nil {
+		t.Fatal(err)
+	}
+
+	dest := t.TempDir()
+	// A stale, longer file must be cut to the archived size
+	os.WriteFile(filepath.Join(dest, "python.exe"), make([]byte, 9000), 0644)
+
+	index, err := Extract(pak, dest, 4)
+	if err != nil {
+		t.Fatalf("Extract returned error: %v", err)
+	}
+	if len(index.Files) != 5 || len(index.Frames) < 18 {
+		t.Errorf("unexpected index: %d files, %d frames", len(index.Files), len(index.Frames))
+	}
+	for name, data := range files {
+		got, err := os.ReadFile(filepath.Join(dest, filepath.FromSlash(name)))
+		if name == "skipped/file.txt" {
+			if err == nil {
+				t.Errorf("skipped file was extracted")
+			}
+			continue
+		}
+		if err != nil || !bytes.Equal(got, data) {
+			t.Errorf("%s was not extracted correctly (%v)", name, err)
+		}
+	}
+
+	raw, _ := os.ReadFile(pak)
+	raw[len(magic)+10] ^= 0xff
+	os.WriteFile(pak, raw, 0644)
+	if _, err := Extract(pak, t.TempDir(), 2); err == nil {
+		t.Errorf("Extract accepted a corrupt frame")
+	}
+}
@@ -0,0 +1,155 @@
+package archive
+
+import (
+	"compress/flate"
+	"fmt"
+	"hash/crc32"
+	"io"
+	"os"
+	"path/filepath"
+	"sync"
+)
+
+// Extract unpacks the archive at path into dest, decompressing frames on up
+// to workers goroutines. Each frame writes its slice of every file it
+// overlaps directly at the right offset, so no frame waits for another.
+func Extract(path, dest string, workers int) (*Index, error) {
+	f, err := os.Open(path)
+	if err != nil {
+		return nil, err
+	}
+	defer f.Close()
+
+	index, err := ReadIndex(f)
+	if err != nil {
+		return nil, err
+	}
+
+	dirs := &dirSet{made: make(map[string]bool)}
+	if workers < 1 {
+		workers = 1
+	}
+	jobs := make(chan Frame)
+	errs := make(chan error, workers)
+	var wg sync.WaitGroup
+	for w := 0; w < workers; w++ {
+		wg.Add(1)
+		go func() {
+			defer wg.Done()
+			var firstErr error
+			for frame := range jobs {
+				if firstErr == nil {
+					firstErr = extractFrame(f, index.Files, frame, dest, dirs)
+				}
+			}
+			errs <- firstErr
+		}()
+	}
+	for _, frame := range index.Frames {
+		jobs <- frame
+	}
+	close(jobs)
+	wg.Wait()
+	close(errs)
+	for err := range errs {
+		if err != nil {
+			return nil, err
+		}
+	}
+
+	// Empty files belong to no frame
+	for _, e := range index.Files {
+		if e.Size != 0 {
+			continue
+		}
+		target := filepath.Join(dest, filepath.FromSlash(e.Path))
+		if err := dirs.ensure(filepath.Dir(target)); err != nil {
+			return nil, err
+		}
+		if err := os.WriteFile(target, nil, 0644); err != nil {
+			return nil, err
+		}
+	}
+	return index, nil
+}
+
+func extractFrame(f *os.File, files []Entry, frame Frame, dest string, dirs *dirSet) error {
+	zr := flate.NewReader(io.NewSectionReader(f, frame.Offset, frame.CSize))
+	defer zr.Close()
+	data := make([]byte, frame.USize)
+	if _, err := io.ReadFull(zr, data); err != nil {
+		return fmt.Errorf("decompressing frame at %d: %w", frame.Offset, err)
+	}
+	if crc32.ChecksumIEEE(data) != frame.CRC32 {
+		return fmt.Errorf("frame at %d is corrupt", frame.Offset)
+	}
+
+	start, end := frame.UOffset, frame.UOffset+frame.USize
+	lo, hi := filesIn(files, start, end)
+	for _, e := range files[lo:hi] {
+		if e.Size == 0 {
+			continue
+		}
+		// Part of the file that lies inside this frame
+		from, to := max64(e.Offset, start), min64(e.Offset+e.Size, end)
+		target := filepath.Join(dest, filepath.FromSlash(e.Path))
+		if err := dirs.ensure(filepath.Dir(target)); err != nil {
+			return err
+		}
+		out, err := os.OpenFile(target, os.O_WRONLY|os.O_CREATE, 0644)
+		if err != nil {
+			return err
+		}
+		// The frame holding the start of the file also fixes its size, in
+		// case dest already contained a longer file
+		if from == e.Offset {
+			err = out.Truncate(e.Size)
+		}
+		if err == nil {
+			_, err = out.WriteAt(data[from-start:to-start], from-e.Offset)
+		}
+		if cerr := out.Close(); err == nil {
+			err = cerr
+		}
+		if err != nil {
+			return fmt.Errorf("writing %s: %w", e.Path, err)
+		}
+	}
+	return nil
+}
+
+// dirSet creates each directory once across workers.
+type dirSet struct {
+	mu   sync.Mutex
+	made map[string]bool
+}
+
+func (d *dirSet) ensure(dir string) error {
+	d.mu.Lock()
+	done := d.made[dir]
+	d.mu.Unlock()
+	if done {
+		return nil
+	}
+	if err := os.MkdirAll(dir, 0755); err != nil {
+		return err
+	}
+	d.mu.Lock()
+	d.made[dir] = true
+	d.mu.Unlock()
+	return nil
+}
+
+func max64(a, b int64) int64 {
+	if a > b {
+		return a
+	}
+	return b
+}
+
+func min64(a, b int64) int64 {
+	if a < b {
+		return a
+	}
+	return b
+}
@@ -2,6 +2,9 @@ package config
 
 import (
 	"path/filepath"
+	"runtime"
+	"strings"
+	"time"
 
 	"github.com/spf13/viper"
 )
@@ -23,6 +26,16 @@ func GetStaticResources() map[string]string {
 	return viper.GetStringMapString("static_resources")
 }
 
+// GetStaticResourceHashes returns the sha256 pins of static resources by
+// lowercased filename (viper lowercases the keys of the table).
+func GetStaticResourceHashes() map[string]string {
+	hashes := make(map[string]string)
+	for name, sum := range viper.GetStringMapString("static_resources_sha256") {
+		hashes[strings.ToLower(name)] = strings.TrimSpace(sum)
+	}
+	return hashes
+}
+
 func GetIndexURL() string {
 	idx := viper.GetString("index_url")
 	if idx == "" {
@@ -31,6 +44,123 @@ func GetIndexURL() string {
 	return idx
 }
 
+// GetIndexURLs returns the simple index mirrors from `index_urls`, in the
+// configured order, falling back to the single `index_url`.
+func GetIndexURLs() []string {
+	var urls []string
+	for _, u := range viper.GetStringSlice("index_urls") {
+		if u = strings.TrimSuffix(strings.TrimSpace(u), "/"); u != "" {
+			urls = append(urls, u)
+		}
+	}
+	if len(urls) == 0 {
+		return []string{strings.TrimSuffix(GetIndexURL(), "/")}
+	}
+	return urls
+}
+
+// GetIndexHedgeDelay returns how long an index page request may go without
+// response headers before the same request is also sent to the next mirror.
+// Zero (the default) disables hedged requests.
+func GetIndexHedgeDelay() time.Duration {
+	return viper.GetDuration("index_hedge_delay")
+}
+
+// GetDownloader returns how wheels are fetched: "native" (built-in simple
+// index client, the default) or "pip" (`pip download` subprocesses).
+func GetDownloader() string {
+	d := viper.GetString("downloader")
+	if d == "" {
+		return "native"
+	}
+	return d
+}
+
+// GetDownloadWorkers returns how many wheel downloads may run concurrently.
+func GetDownloadWorkers() int {
+	n := viper.GetInt("download_workers")
+	if n <= 0 {
+		n = runtime.NumCPU()
+		if n > 8 {
+			n = 8
+		}
+	}
+	return n
+}
+
+// GetLocalBuildWorkers returns how many local path dependencies may be built
+// into wheels concurrently.
+func GetLocalBuildWorkers() int {
+	n := viper.GetInt("local_build_workers")
+	if n <= 0 {
+		n = runtime.NumCPU()
+		if n > 4 {
+			n = 4
+		}
+	}
+	return n
+}
+
+// GetCacheDir returns the directory holding persistent build caches. It is
+// kept outside the package directories so `--clean` does not wipe it.
+func GetCacheDir() string {
+	dir := viper.GetString("cache_dir")
+	if dir == "" {
+		return filepath.Join("build", "cache")
+	}
+	return dir
+}
+
+// GetResolveCacheTTL returns how long a cached `uv pip compile` result may be
+// reused for unchanged inputs. Zero disables the resolution cache.
+func GetResolveCacheTTL() time.Duration {
+	if !viper.IsSet("resolve_cache_ttl") {
+		return 24 * time.Hour
+	}
+	return viper.GetDuration("resolve_cache_ttl")
+}
+
+// GetGenerateHashes reports whether resolved requirements and snapshots pin
+// the sha256 of every package (`uv pip compile --generate-hashes`). On by
+// default.
+func GetGenerateHashes() bool {
+	if !viper.IsSet("generate_hashes") {
+		return true
+	}
+	return viper.GetBool("generate_hashes")
+}
+
+// GetNSISCache reports whether compiled installers are cached under
+// <cache_dir>/nsis and reused when nothing they are built from has changed.
+func GetNSISCache() bool {
+	if !viper.IsSet("nsis_cache") {
+		return true
+	}
+	return viper.GetBool("nsis_cache")
+}
+
+// GetLocalWheelCache reports whether wheels built from local path
+// dependencies are cached under <cache_dir>/local-wheels, keyed by a hash of
+// their source files, and reused while the sources are unchanged.
+func GetLocalWheelCache() bool {
+	if !viper.IsSet("local_wheel_cache") {
+		return true
+	}
+	return viper.GetBool("local_wheel_cache")
+}
+
+// GetClientWheelCache reports whether full installers keep their wheels on
+// the client ($INSTDIR\wheels) so later upgrades can ship binary deltas.
+func GetClientWheelCache() bool {
+	return viper.GetBool("client_wheel_cache")
+}
+
+// GetPython38 returns the configured Python 3.8 interpreter used to compile
+// bytecode for the payload, or "" to search PATH and uv.
+func GetPython38() string {
+	return viper.GetString("python38")
+}
+
 func GetResourcesDir() string {
     // If config file is found, assume resources is its dir
     configFile := viper.ConfigFileUsed()
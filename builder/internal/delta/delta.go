@@ -0,0 +1,261 @@
+// Package delta creates and applies binary deltas between two versions of a
+// file, used to ship small patches instead of whole wheels in upgrades.
+//
+// File format (all integers are unsigned varints):
+//
+//	"PHISDLT1" | header length | JSON header | zlib stream of operations
+//
+// Operations: 'C' offset length (copy from the old file), 'I' length bytes
+// (insert literal bytes), 'E' (end). resources/apply_wheel_deltas.py
+// implements the same format on the client.
+package delta
+
+import (
+	"bufio"
+	"bytes"
+	"compress/zlib"
+	"crypto/sha256"
+	"encoding/binary"
+	"encoding/hex"
+	"encoding/json"
+	"fmt"
+	"io"
+)
+
+const magic = "PHISDLT1"
+
+// blockSize is the granularity of matches against the old file. Unchanged
+// members of a wheel are stored as identical deflate streams, so matches are
+// usually long; small blocks mostly help realign after changed members.
+const blockSize = 64
+
+const (
+	opCopy   = 'C'
+	opInsert = 'I'
+	opEnd    = 'E'
+)
+
+// Header identifies the files a delta converts between.
+type Header struct {
+	OldFilename string `json:"old_filename"`
+	OldSHA256   string `json:"old_sha256"`
+	NewFilename string `json:"new_filename"`
+	NewSHA256   string `json:"new_sha256"`
+	NewSize     int64  `json:"new_size"`
+}
+
+// Encode writes a delta that rebuilds newData from oldData.
+func Encode(w io.Writer, oldName string, oldData []byte, newName string, newData []byte) error {
+	header := Header{
+		OldFilename: oldName,
+		OldSHA256:   sum(oldData),
+		NewFilename: newName,
+		NewSHA256:   sum(newData),
+		NewSize:     int64(len(newData)),
+	}
+	headerJSON, err := json.Marshal(header)
+	if err != nil {
+		return err
+	}
+
+	bw := bufio.NewWriter(w)
+	bw.WriteString(magic)
+	writeUvarint(bw, uint64(len(headerJSON)))
+	bw.Write(headerJSON)
+
+	zw, err := zlib.NewWriterLevel(bw, zlib.BestCompression)
+	if err != nil {
+		return err
+	}
+	ops := bufio.NewWriter(zw)
+	emitOps(ops, oldData, newData)
+	ops.WriteByte(opEnd)
+	if err := ops.Flush(); err != nil {
+		return err
+	}
+	if err := zw.Close(); err != nil {
+		return err
+	}
+	return bw.Flush()
+}
+
+// emitOps finds blocks of newData that also occur in oldData using a rolling
+// hash (rsync style), extends each match as far as possible, and writes copy
+// operations for matches and insert operations for everything else.
+func emitOps(w *bufio.Writer, oldData, newData []byte) {
+	index := make(map[uint32][]int)
+	for i := 0; i+blockSize <= len(oldData); i += blockSize {
+		h := hashBlock(oldData[i : i+blockSize])
+		if len(index[h]) < 8 {
+			index[h] = append(index[h], i)
+		}
+	}
+
+	literalStart := 0
+	i := 0
+	var h uint32
+	if len(newData) >= blockSize {
+		h = hashBlock(newData[:blockSize])
+	}
+	for i+blockSize <= len(newData) {
+		matchOff, matchLen := -1, 0
+		for _, off := range index[h] {
+			if !bytes.Equal(oldData[off:off+blockSize], newData[i:i+blockSize]) {
+				continue
+			}
+			n := blockSize
+			for off+n < len(oldData) && i+n < len(newData) && oldData[off+n] == newData[i+n] {
+				n++
+			}
+			if n > matchLen {
+				matchOff, matchLen = off, n
+			}
+		}
+
+		if matchOff < 0 {
+			if i+blockSize < len(newData) {
+				h = rollHash(h, newData[i], newData[i+blockSize])
+			}
+			i++
+			continue
+		}
+
+		// Grow the match backwards into the pending literal run
+		start := i
+		for start > literalStart && matchOff > 0 && oldData[matchOff-1] == newData[start-1] {
+			start--
+			matchOff--
+			matchLen++
+		}
+		writeInsert(w, newData[literalStart:start])
+		w.WriteByte(opCopy)
+		writeUvarint(w, uint64(matchOff))
+		writeUvarint(w, uint64(matchLen))
+
+		i = start + matchLen
+		literalStart = i
+		if i+blockSize <= len(newData) {
+			h = hashBlock(newData[i : i+blockSize])
+		}
+	}
+	writeInsert(w, newData[literalStart:])
+}
+
+func writeInsert(w *bufio.Writer, data []byte) {
+	if len(data) == 0 {
+		return
+	}
+	w.WriteByte(opInsert)
+	writeUvarint(w, uint64(len(data)))
+	w.Write(data)
+}
+
+// Polynomial rolling hash over blockSize bytes, modulo 2^32.
+const hashBase = 16777619
+
+var hashBasePow = func() uint32 {
+	p := uint32(1)
+	for i := 0; i < blockSize-1; i++ {
+		p *= hashBase
+	}
+	return p
+}()
+
+func hashBlock(b []byte) uint32 {
+	var h uint32
+	for _, c := range b {
+		h = h*hashBase + uint32(c)
+	}
+	return h
+}
+
+func rollHash(h uint32, out, in byte) uint32 {
+	return (h-uint32(out)*hashBasePow)*hashBase + uint32(in)
+}
+
+func writeUvarint(w *bufio.Writer, v uint64) {
+	var buf [binary.MaxVarintLen64]byte
+	n := binary.PutUvarint(buf[:], v)
+	w.Write(buf[:n])
+}
+
+func sum(data []byte) string {
+	s := sha256.Sum256(data)
+	return hex.EncodeToString(s[:])
+}
+
+// ReadHeader reads the header of a delta without decoding the operations.
+func ReadHeader(r *bufio.Reader) (Header, error) {
+	var header Header
+	prefix := make([]byte, len(magic))
+	if _, err := io.ReadFull(r, prefix); err != nil {
+		return header, err
+	}
+	if string(prefix) != magic {
+		return header, fmt.Errorf("not a delta file")
+	}
+	n, err := binary.ReadUvarint(r)
+	if err != nil {
+		return header, err
+	}
+	headerJSON := make([]byte, n)
+	if _, err := io.ReadFull(r, headerJSON); err != nil {
+		return header, err
+	}
+	err = json.Unmarshal(headerJSON, &header)
+	return header, err
+}
+
+// Apply rebuilds the new file from oldData and the delta in r, verifying the
+// sha256 of both the old input and the result.
+func Apply(r io.Reader, oldData []byte) ([]byte, Header, error) {
+	br := bufio.NewReader(r)
+	header, err := ReadHeader(br)
+	if err != nil {
+		return nil, header, err
+	}
+	if got := sum(oldData); got != header.OldSHA256 {
+		return nil, header, fmt.Errorf("old file %s does not match delta (sha256 %s)", header.OldFilename, got)
+	}
+
+	zr, err := zlib.NewReader(br)
+	if err != nil {
+		return nil, header, err
+	}
+	defer zr.Close()
+	ops := bufio.NewReader(zr)
+
+	out := make([]byte, 0, header.NewSize)
+	for {
+		op, err := ops.ReadByte()
+		if err != nil {
+			return nil, header, fmt.Errorf("truncated delta: %w", err)
+		}
+		switch op {
+		case opCopy:
+			off, err1 := binary.ReadUvarint(ops)
+			n, err2 := binary.ReadUvarint(ops)
+			if err1 != nil || err2 != nil || off+n > uint64(len(oldData)) {
+				return nil, header, fmt.Errorf("invalid copy operation")
+			}
+			out = append(out, oldData[off:off+n]...)
+		case opInsert:
+			n, err := binary.ReadUvarint(ops)
+			if err != nil {
+				return nil, header, fmt.Errorf("invalid insert operation")
+			}
+			start := len(out)
+			out = append(out, make([]byte, n)...)
+			if _, err := io.ReadFull(ops, out[start:]); err != nil {
+				return nil, header, fmt.Errorf("truncated insert: %w", err)
+			}
+		case opEnd:
+			if got := sum(out); got != header.NewSHA256 {
+				return nil, header, fmt.Errorf("rebuilt %s has sha256 %s, expected %s", header.NewFilename, got, header.NewSHA256)
+			}
+			return out, header, nil
+		default:
+			return nil, header, fmt.Errorf("unknown operation %q", op)
+		}
+	}
+}
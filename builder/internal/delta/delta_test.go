@@ -0,0 +1,101 @@
+package delta
+
+import (
+	"archive/zip"
+	"bytes"
+	"math/rand"
+	"testing"
+)
+
+func buildZip(t *testing.T, files map[string][]byte, order []string) []byte {
+	t.Helper()
+	var buf bytes.Buffer
+	zw := zip.NewWriter(&buf)
+	for _, name := range order {
+		w, err := zw.Create(name)
+		if err != nil {
+			t.Fatal(err)
+		}
+		w.Write(files[name])
+	}
+	if err := zw.Close(); err != nil {
+		t.Fatal(err)
+	}
+	return buf.Bytes()
+}
+
+func TestRoundTrip(t *testing.T) {
+	rng := rand.New(rand.NewSource(1))
+	random := func(n int) []byte {
+		b := make([]byte, n)
+		rng.Read(b)
+		return b
+	}
+
+	base := random(200000)
+	edited := append(append(append([]byte{}, base[:50000]...), random(3000)...), base[60000:]...)
+
+	tests := []struct {
+		name     string
+		old, new []byte
+	}{
+		{"identical", base, base},
+		{"edited", base, edited},
+		{"empty old", nil, base[:1000]},
+		{"empty new", base, nil},
+		{"short", []byte("abc"), []byte("abd")},
+	}
+
+	for _, tt := range tests {
+		var buf bytes.Buffer
+		if err := Encode(&buf, "old.whl", tt.old, "new.whl", tt.new); err != nil {
+			t.Fatalf("%s: Encode returned error: %v", tt.name, err)
+		}
+		out, header, err := Apply(bytes.NewReader(buf.Bytes()), tt.old)
+		if err != nil {
+			t.Fatalf("%s: Apply returned error: %v", tt.name, err)
+		}
+		if !bytes.Equal(out, tt.new) {
+			t.Errorf("%s: Apply did not reproduce the new file", tt.name)
+		}
+		if header.NewFilename != "new.whl" || header.NewSize != int64(len(tt.new)) {
+			t.Errorf("%s: unexpected header %+v", tt.name, header)
+		}
+	}
+
+	var buf bytes.Buffer
+	Encode(&buf, "old.whl", base, "new.whl", edited)
+	if buf.Len() > 10000 {
+		t.Errorf("delta for a 3000 byte edit is %d bytes", buf.Len())
+	}
+	if _, _, err := Apply(bytes.NewReader(buf.Bytes()), edited); err == nil {
+		t.Errorf("Apply accepted the wrong old file")
+	}
+}
+
+func TestWheelDelta(t *testing.T) {
+	rng := rand.New(rand.NewSource(2))
+	files := make(map[string][]byte)
+	var order []string
+	for _, name := range []string{"pkg/a.py", "pkg/b.py", "pkg/_native.pyd", "pkg/c.py"} {
+		b := make([]byte, 100000)
+		rng.Read(b)
+		files[name] = b
+		order = append(order, name)
+	}
+	oldWheel := buildZip(t, files, order)
+	files["pkg/b.py"] = append(files["pkg/b.py"][:5000:5000], []byte("changed")...)
+	newWheel := buildZip(t, files, order)
+
+	var buf bytes.Buffer
+	if err := Encode(&buf, "pkg-1.0-py3-none-any.whl", oldWheel, "pkg-1.1-py3-none-any.whl", newWheel); err != nil {
+		t.Fatal(err)
+	}
+	if buf.Len() > len(newWheel)/20 {
+		t.Errorf("delta is %d bytes for a %d byte wheel with one changed member", buf.Len(), len(newWheel))
+	}
+	out, _, err := Apply(bytes.NewReader(buf.Bytes()), oldWheel)
+	if err != nil || !bytes.Equal(out, newWheel) {
+		t.Errorf("Apply failed: %v", err)
+	}
+}
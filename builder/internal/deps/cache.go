@@ -0,0 +1,403 @@
+package deps
+
+import (
+	"crypto/sha256"
+	"encoding/hex"
+	"errors"
+	"fmt"
+	"io"
+	"os"
+	"path/filepath"
+	"runtime"
+	"sort"
+	"strings"
+	"sync"
+
+	"builder/internal/config"
+	"builder/internal/trace"
+	"builder/internal/utils"
+)
+
+// CachedWheel is a wheel stored in the local wheel cache.
+type CachedWheel struct {
+	WheelInfo
+	SHA256 string
+	Size   int64
+	Path   string
+}
+
+// WheelCache is a persistent, content-addressed store of downloaded wheels.
+// Wheels live at <dir>/wheels/<sha256>/<filename>, so the directory layout is
+// the index and concurrent builder processes never have to agree on a manifest.
+type WheelCache struct {
+	dir string
+
+	mu      sync.Mutex
+	entries map[string][]CachedWheel // keyed by "name==version"
+}
+
+var (
+	wheelCachesMu sync.Mutex
+	wheelCaches   = make(map[string]*WheelCache)
+)
+
+// OpenWheelCache returns the wheel cache under config.GetCacheDir(). The
+// index is scanned once per process and kept up to date as wheels are added.
+func OpenWheelCache() (*WheelCache, error) {
+	dir, err := filepath.Abs(filepath.Join(config.GetCacheDir(), "wheels"))
+	if err != nil {
+		return nil, err
+	}
+
+	wheelCachesMu.Lock()
+	defer wheelCachesMu.Unlock()
+	if c, ok := wheelCaches[dir]; ok {
+		return c, nil
+	}
+
+	if err := os.MkdirAll(dir, 0755); err != nil {
+		return nil, err
+	}
+	c := &WheelCache{dir: dir, entries: make(map[string][]CachedWheel)}
+	if err := c.scan(); err != nil {
+		return nil, err
+	}
+	wheelCaches[dir] = c
+	return c, nil
+}
+
+func (c *WheelCache) scan() error {
+	hashDirs, err := os.ReadDir(c.dir)
+	if err != nil {
+		return err
+	}
+	for _, hashDir := range hashDirs {
+		if !hashDir.IsDir() {
+			continue
+		}
+		files, err := os.ReadDir(filepath.Join(c.dir, hashDir.Name()))
+		if err != nil {
+			return err
+		}
+		for _, file := range files {
+			info, err := ParseWheelFilename(file.Name())
+			if err != nil {
+				continue
+			}
+			fi, err := file.Info()
+			if err != nil {
+				continue
+			}
+			c.insert(CachedWheel{
+				WheelInfo: info,
+				SHA256:    hashDir.Name(),
+				Size:      fi.Size(),
+				Path:      filepath.Join(c.dir, hashDir.Name(), file.Name()),
+			})
+		}
+	}
+	return nil
+}
+
+func (c *WheelCache) insert(w CachedWheel) {
+	key := w.Name + "==" + strings.ToLower(w.Version)
+	for _, existing := range c.entries[key] {
+		if existing.SHA256 == w.SHA256 && existing.Filename == w.Filename {
+			return
+		}
+	}
+	c.entries[key] = append(c.entries[key], w)
+}
+
+// Lookup returns the cached wheel for the exact pin name==version that best
+// matches the target platform and interpreter, as selectWheel ranks them.
+// Wheels for other platforms, e.g. put in the cache by a pip run on the
+// build host, are ignored.
+func (c *WheelCache) Lookup(name, version string) (CachedWheel, bool) {
+	return c.lookupPinned(name, version, nil)
+}
+
+// lookupPinned is Lookup restricted to wheels whose sha256 is in pinned; an
+// empty pinned accepts any wheel.
+func (c *WheelCache) lookupPinned(name, version string, pinned []string) (CachedWheel, bool) {
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	var best CachedWheel
+	bestScore := -1
+	for _, w := range c.entries[pinKey(name, version)] {
+		if len(pinned) > 0 && !hashPinned(pinned, w.SHA256) {
+			continue
+		}
+		if score := wheelPriority(w.WheelInfo); score > bestScore {
+			best, bestScore = w, score
+		}
+	}
+	return best, bestScore >= 0
+}
+
+// Add stores the wheel at path in the cache (hardlinking when possible) and
+// returns its cache entry.
+func (c *WheelCache) Add(path string) (CachedWheel, error) {
+	info, err := ParseWheelFilename(filepath.Base(path))
+	if err != nil {
+		return CachedWheel{}, err
+	}
+	sum, size, err := hashFile(path)
+	if err != nil {
+		return CachedWheel{}, err
+	}
+	return c.addHashed(path, info, sum, size)
+}
+
+func (c *WheelCache) addHashed(path string, info WheelInfo, sum string, size int64) (CachedWheel, error) {
+	w := CachedWheel{
+		WheelInfo: info,
+		SHA256:    sum,
+		Size:      size,
+		Path:      filepath.Join(c.dir, sum, info.Filename),
+	}
+	if _, err := os.Stat(w.Path); os.IsNotExist(err) {
+		if err := os.MkdirAll(filepath.Dir(w.Path), 0755); err != nil {
+			return CachedWheel{}, err
+		}
+		if err := utils.LinkOrCopy(path, w.Path); err != nil {
+			return CachedWheel{}, fmt.Errorf("failed to cache %s: %w", info.Filename, err)
+		}
+	}
+
+	c.mu.Lock()
+	c.insert(w)
+	c.mu.Unlock()
+	return w, nil
+}
+
+// Verify re-hashes the cached wheel, so a file damaged after it was cached is
+// not shipped.
+func (c *WheelCache) Verify(w CachedWheel) error {
+	sum, _, err := hashFile(w.Path)
+	if err != nil {
+		return err
+	}
+	if sum != w.SHA256 {
+		return fmt.Errorf("content hashes to %s", sum)
+	}
+	return nil
+}
+
+// Remove drops w from the cache, e.g. after it failed verification.
+func (c *WheelCache) Remove(w CachedWheel) error {
+	c.mu.Lock()
+	key := w.Name + "==" + strings.ToLower(w.Version)
+	wheels := c.entries[key][:0]
+	for _, existing := range c.entries[key] {
+		if existing.Path != w.Path {
+			wheels = append(wheels, existing)
+		}
+	}
+	c.entries[key] = wheels
+	c.mu.Unlock()
+	return os.RemoveAll(filepath.Dir(w.Path))
+}
+
+// LinkInto places the cached wheel in targetDir without copying its content.
+func (c *WheelCache) LinkInto(w CachedWheel, targetDir string) error {
+	dst := filepath.Join(targetDir, w.Filename)
+	if _, err := os.Stat(dst); err == nil {
+		if err := os.Remove(dst); err != nil {
+			return err
+		}
+	}
+	return utils.LinkOrCopy(w.Path, dst)
+}
+
+// FetchWheel returns the cached wheel for name==version, downloading it from
+// the index into the cache first when needed.
+func FetchWheel(name, version string) (CachedWheel, error) {
+	cache, err := OpenWheelCache()
+	if err != nil {
+		return CachedWheel{}, err
+	}
+	if w, ok := cache.Lookup(name, version); ok {
+		return w, nil
+	}
+
+	// Download next to the cache so Add can hardlink instead of copying
+	tmpDir, err := os.MkdirTemp(cache.dir, ".fetch-")
+	if err != nil {
+		return CachedWheel{}, err
+	}
+	defer os.RemoveAll(tmpDir)
+
+	client := NewIndexClient(IndexMirrors(), 1)
+	f, err := client.SelectWheel(name, version)
+	if err != nil {
+		return CachedWheel{}, err
+	}
+	if err := client.Download(f, tmpDir); err != nil {
+		return CachedWheel{}, err
+	}
+	return cache.Add(filepath.Join(tmpDir, f.Filename))
+}
+
+// errWheelNotFound is wrapped by FindWheel when dir holds no matching wheel.
+var errWheelNotFound = errors.New("no wheel")
+
+// FindWheel returns the path of the wheel for name==version in dir.
+func FindWheel(dir, name, version string) (string, error) {
+	entries, err := os.ReadDir(dir)
+	if err != nil {
+		return "", err
+	}
+	for _, entry := range entries {
+		info, err := ParseWheelFilename(entry.Name())
+		if err == nil && info.Name == NormalizeName(name) && strings.EqualFold(info.Version, version) {
+			return filepath.Join(dir, entry.Name()), nil
+		}
+	}
+	return "", fmt.Errorf("%w for %s==%s in %s", errWheelNotFound, name, version, dir)
+}
+
+// fillFromCache links every pinned requirement of reqFile that is already
+// cached into targetDir, and writes the remaining requirements (plus option
+// lines) to missingReq. It returns the number of requirements still missing.
+// Cached wheels are checked against pins (see reqHashes) and re-hashed in
+// parallel with the lookups; a damaged wheel is evicted and downloaded again.
+func fillFromCache(cache *WheelCache, reqFile, targetDir, missingReq string, pins map[string][]string) (int, error) {
+	span := trace.Start("wheel cache")
+	defer span.End()
+
+	options, reqs, err := splitReqFile(reqFile)
+	if err != nil {
+		return 0, err
+	}
+
+	hit := make([]bool, len(reqs))
+	err = utils.ForEachParallel(len(reqs), runtime.NumCPU(), func(i int) error {
+		name, version, ok := pinnedSpec(reqs[i])
+		if !ok {
+			return nil
+		}
+		w, found := cache.lookupPinned(name, version, pins[pinKey(name, version)])
+		if !found {
+			return nil
+		}
+		if err := cache.Verify(w); err != nil {
+			fmt.Printf("Discarding cached %s: %v\n", w.Filename, err)
+			return cache.Remove(w)
+		}
+		if err := cache.LinkInto(w, targetDir); err != nil {
+			return err
+		}
+		hit[i] = true
+		span.AddFiles(1)
+		span.AddBytes(w.Size)
+		return nil
+	})
+	if err != nil {
+		return 0, err
+	}
+
+	missing := append([]string{}, options...)
+	hits := 0
+	for i, line := range reqs {
+		if hit[i] {
+			hits++
+		} else {
+			missing = append(missing, line)
+		}
+	}
+
+	span.SetAttr("hits", fmt.Sprint(hits))
+	span.SetAttr("misses", fmt.Sprint(len(reqs)-hits))
+	fmt.Printf("Wheel cache: %d hits, %d to download\n", hits, len(reqs)-hits)
+	if err := os.WriteFile(missingReq, []byte(strings.Join(missing, "\n")+"\n"), 0644); err != nil {
+		return 0, err
+	}
+	return len(reqs) - hits, nil
+}
+
+// wheelSet returns the names of the wheels currently present in dir.
+func wheelSet(dir string) (map[string]struct{}, error) {
+	set := make(map[string]struct{})
+	entries, err := os.ReadDir(dir)
+	if err != nil {
+		return nil, err
+	}
+	for _, entry := range entries {
+		if !entry.IsDir() && strings.HasSuffix(entry.Name(), ".whl") {
+			set[entry.Name()] = struct{}{}
+		}
+	}
+	return set, nil
+}
+
+// ingestNewWheels adds every wheel in dir that is not listed in before to the
+// cache, hashing them in parallel. A wheel whose pin in pins (see reqHashes)
+// does not list its sha256 is deleted and reported instead of being cached.
+func ingestNewWheels(cache *WheelCache, dir string, before map[string]struct{}, pins map[string][]string) error {
+	span := trace.Start("cache ingest")
+	defer span.End()
+
+	after, err := wheelSet(dir)
+	if err != nil {
+		return err
+	}
+	var names []string
+	for name := range after {
+		if _, existed := before[name]; !existed {
+			names = append(names, name)
+		}
+	}
+	sort.Strings(names)
+
+	var mismatched []string
+	var mu sync.Mutex
+	err = utils.ForEachParallel(len(names), runtime.NumCPU(), func(i int) error {
+		path := filepath.Join(dir, names[i])
+		info, err := ParseWheelFilename(names[i])
+		if err != nil {
+			return err
+		}
+		sum, size, err := hashFile(path)
+		if err != nil {
+			return err
+		}
+		if pinned := pins[pinKey(info.Name, info.Version)]; len(pinned) > 0 && !hashPinned(pinned, sum) {
+			os.Remove(path)
+			mu.Lock()
+			mismatched = append(mismatched, names[i])
+			mu.Unlock()
+			return nil
+		}
+		w, err := cache.addHashed(path, info, sum, size)
+		if err != nil {
+			return err
+		}
+		span.AddFiles(1)
+		span.AddBytes(w.Size)
+		return nil
+	})
+	if err != nil {
+		return err
+	}
+	if len(mismatched) > 0 {
+		sort.Strings(mismatched)
+		return fmt.Errorf("downloaded wheels do not match their pinned sha256: %s", strings.Join(mismatched, ", "))
+	}
+	return nil
+}
+
+func hashFile(path string) (string, int64, error) {
+	f, err := os.Open(path)
+	if err != nil {
+		return "", 0, err
+	}
+	defer f.Close()
+
+	h := sha256.New()
+	n, err := io.Copy(h, f)
+	if err != nil {
+		return "", 0, err
+	}
+	return hex.EncodeToString(h.Sum(nil)), n, nil
+}
@@ -0,0 +1,126 @@
+package deps
+
+import (
+	"os"
+	"path/filepath"
+	"strings"
+	"testing"
+)
+
+func TestFillFromCacheVerifies(t *testing.T) {
+	src := t.TempDir()
+	cache := &WheelCache{dir: t.TempDir(), entries: make(map[string][]CachedWheel)}
+	var cached []CachedWheel
+	for _, name := range []string{"good-1.0-py3-none-any.whl", "corrupt-1.0-py3-none-any.whl", "unpinned-1.0-py3-none-any.whl"} {
+		path := filepath.Join(src, name)
+		if err := os.WriteFile(path, []byte(name), 0644); err != nil {
+			t.Fatal(err)
+		}
+		w, err := cache.Add(path)
+		if err != nil {
+			t.Fatal(err)
+		}
+		cached = append(cached, w)
+	}
+	// Damage the cached copy after it was added
+	if err := os.Remove(cached[1].Path); err != nil {
+		t.Fatal(err)
+	}
+	if err := os.WriteFile(cached[1].Path, []byte("truncated"), 0644); err != nil {
+		t.Fatal(err)
+	}
+
+	reqFile := filepath.Join(src, "requirements.txt")
+	content := "good==1.0 --hash=sha256:" + cached[0].SHA256 + "\n" +
+		"corrupt==1.0 --hash=sha256:" + cached[1].SHA256 + "\n" +
+		"unpinned==1.0 --hash=sha256:0000\n"
+	if err := os.WriteFile(reqFile, []byte(content), 0644); err != nil {
+		t.Fatal(err)
+	}
+	pins, err := reqHashes(reqFile)
+	if err != nil {
+		t.Fatal(err)
+	}
+
+	target := t.TempDir()
+	missing, err := fillFromCache(cache, reqFile, target, filepath.Join(src, "missing.txt"), pins)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if missing != 2 {
+		t.Errorf("fillFromCache missing = %d, expected 2", missing)
+	}
+	if _, err := os.Stat(filepath.Join(target, "good-1.0-py3-none-any.whl")); err != nil {
+		t.Error(err)
+	}
+	if _, found := cache.Lookup("corrupt", "1.0"); found {
+		t.Error("damaged wheel still cached after failing verification")
+	}
+	if _, found := cache.Lookup("unpinned", "1.0"); !found {
+		t.Error("intact wheel with a different hash was evicted")
+	}
+	data, _ := os.ReadFile(filepath.Join(src, "missing.txt"))
+	if string(data) != "corrupt==1.0\nunpinned==1.0\n" {
+		t.Errorf("missing requirements = %q", data)
+	}
+}
+
+func TestLookupMatchesTarget(t *testing.T) {
+	cache := &WheelCache{dir: t.TempDir(), entries: make(map[string][]CachedWheel)}
+	for _, name := range []string{
+		"native-1.0-cp38-cp38-manylinux_2_17_x86_64.whl",
+		"native-1.0-cp38-cp38-win_amd64.whl",
+		"native-1.0-cp312-cp312-win_amd64.whl",
+		"linuxonly-1.0-cp38-cp38-manylinux_2_17_x86_64.whl",
+	} {
+		info, err := ParseWheelFilename(name)
+		if err != nil {
+			t.Fatal(err)
+		}
+		cache.insert(CachedWheel{WheelInfo: info, SHA256: name})
+	}
+	if w, found := cache.Lookup("native", "1.0"); !found || w.Filename != "native-1.0-cp38-cp38-win_amd64.whl" {
+		t.Errorf("Lookup(native) = %s, %v", w.Filename, found)
+	}
+	if w, found := cache.Lookup("linuxonly", "1.0"); found {
+		t.Errorf("Lookup(linuxonly) = %s, expected no match", w.Filename)
+	}
+}
+
+func TestReqFileWheelsReportsAllMissing(t *testing.T) {
+	dir := t.TempDir()
+	if err := os.WriteFile(filepath.Join(dir, "good-1.0-py3-none-any.whl"), []byte("good"), 0644); err != nil {
+		t.Fatal(err)
+	}
+	if err := os.WriteFile(filepath.Join(dir, "sdist-2.0.tar.gz"), []byte("sdist"), 0644); err != nil {
+		t.Fatal(err)
+	}
+	reqFile := filepath.Join(dir, "requirements.txt")
+	if err := os.WriteFile(reqFile, []byte("good==1.0\nsdist==2.0\nloose>=3\n"), 0644); err != nil {
+		t.Fatal(err)
+	}
+
+	_, err := ReqFileWheels(reqFile, dir)
+	if err == nil {
+		t.Fatal("ReqFileWheels succeeded without wheels for every requirement")
+	}
+	for _, want := range []string{"2 requirement(s)", "sdist==2.0", "loose>=3"} {
+		if !strings.Contains(err.Error(), want) {
+			t.Errorf("error %q does not mention %q", err, want)
+		}
+	}
+	if strings.Contains(err.Error(), "good==1.0") {
+		t.Errorf("error %q reports a requirement that has a wheel", err)
+	}
+
+	if err := os.WriteFile(reqFile, []byte("good==1.0\n"), 0644); err != nil {
+		t.Fatal(err)
+	}
+	wheels, err := ReqFileWheels(reqFile, dir)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if len(wheels) != 1 || filepath.Base(wheels[0]) != "good-1.0-py3-none-any.whl" {
+		t.Errorf("ReqFileWheels = %v", wheels)
+	}
+}
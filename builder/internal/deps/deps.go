@@ -2,6 +2,8 @@ package deps
 
 import (
 	"bufio"
+	"bytes"
+	"errors"
 	"fmt"
 	"io"
 	"os"
@@ -12,30 +14,24 @@ import (
 	"strings"
 
 	"builder/internal/config"
+	"builder/internal/trace"
 	"builder/internal/utils"
 )
 
-// ParseReqFile parses a requirements file into a map for fast lookup
-func ParseReqFile(path string) (map[string]struct{}, error) {
-	pkgs := make(map[string]struct{})
-	f, err := os.Open(path)
+// GetDiffPackages returns the requirement lines an upgrade from fromVer to
+// toVer has to install (added, upgraded and downgraded packages).
+func GetDiffPackages(fromVer, toVer string) ([]string, error) {
+	diff, err := DiffSnapshots(fromVer, toVer)
 	if err != nil {
 		return nil, err
 	}
-	defer f.Close()
-
-	scanner := bufio.NewScanner(f)
-	for scanner.Scan() {
-		line := strings.TrimSpace(scanner.Text())
-		if line == "" || strings.HasPrefix(line, "#") {
-			continue
-		}
-		pkgs[line] = struct{}{}
-	}
-	return pkgs, scanner.Err()
+	return diff.InstallLines(), nil
 }
 
-func GetDiffPackages(fromVer, toVer string) ([]string, error) {
+// DiffSnapshots compares the snapshots of two versions package by package.
+// When toVer is the current version and has no snapshot yet, the current
+// pyproject (or requirements file) is resolved instead.
+func DiffSnapshots(fromVer, toVer string) (*SnapshotDiff, error) {
 	if err := utils.ValidateVersion(fromVer); err != nil {
 		return nil, fmt.Errorf("invalid fromVer: %w", err)
 	}
@@ -67,25 +63,84 @@ func GetDiffPackages(fromVer, toVer string) ([]string, error) {
 		}
 	}
 
-	fromPkgs, err := ParseReqFile(fromFile)
+	// Snapshots come from the index; only a freshly resolved toFile is parsed
+	index, err := OpenSnapshotIndex()
+	if err != nil {
+		fmt.Printf("Warning: snapshot index unavailable: %v\n", err)
+		index = nil
+	}
+	load := func(version, path string) ([]Requirement, error) {
+		if index != nil && path == filepath.Join(versionsDir, fmt.Sprintf("requirements_%s.txt", version)) {
+			if reqs, ok := index.Requirements(version); ok {
+				return reqs, nil
+			}
+		}
+		return loadSnapshot(path)
+	}
+
+	fromReqs, err := load(fromVer, fromFile)
 	if err != nil {
 		fmt.Printf("Warning: Could not read from version file %s: %v\n", fromFile, err)
-		fromPkgs = make(map[string]struct{})
+		fromReqs = nil
 	}
 
-	toPkgs, err := ParseReqFile(toFile)
+	toReqs, err := load(toVer, toFile)
 	if err != nil {
 		return nil, fmt.Errorf("error reading to version file %s: %w", toFile, err)
 	}
 
-	var diff []string
-	for pkg := range toPkgs {
-		if _, exists := fromPkgs[pkg]; !exists {
-			diff = append(diff, pkg)
+	diff := DiffRequirements(fromReqs, toReqs)
+	return &diff, nil
+}
+
+// loadSnapshot parses a requirements file and names its local path
+// dependencies after their pyproject.toml, so they compare equal to the
+// name==version specs written into snapshots.
+func loadSnapshot(path string) ([]Requirement, error) {
+	reqs, err := ParseRequirements(path)
+	if err != nil {
+		return nil, err
+	}
+	for i, req := range reqs {
+		if req.Path == "" {
+			continue
+		}
+		if spec, err := GetLocalPackageSpec(req.Path); err == nil {
+			if name, version, ok := pinnedSpec(spec); ok {
+				reqs[i].Name, reqs[i].Version = name, version
+			}
+		}
+	}
+	return reqs, nil
+}
+
+// ListSnapshotVersions returns the versions that have a requirements_<ver>.txt
+// snapshot in the versions directory, oldest first.
+func ListSnapshotVersions() ([]string, error) {
+	return snapshotVersionsIn(filepath.Join(config.GetResourcesDir(), "versions"))
+}
+
+func snapshotVersionsIn(versionsDir string) ([]string, error) {
+	entries, err := os.ReadDir(versionsDir)
+	if err != nil {
+		return nil, err
+	}
+
+	var versions []string
+	for _, entry := range entries {
+		name := entry.Name()
+		if entry.IsDir() || !strings.HasPrefix(name, "requirements_") || !strings.HasSuffix(name, ".txt") {
+			continue
+		}
+		version := strings.TrimSuffix(strings.TrimPrefix(name, "requirements_"), ".txt")
+		if utils.ValidateVersion(version) == nil {
+			versions = append(versions, version)
 		}
 	}
-	sort.Strings(diff)
-	return diff, nil
+	sort.Slice(versions, func(i, j int) bool {
+		return utils.CompareVersions(versions[i], versions[j]) < 0
+	})
+	return versions, nil
 }
 
 func DownloadDeps(packages []string, targetDir string) error {
@@ -112,15 +167,154 @@ func DownloadDeps(packages []string, targetDir string) error {
 	return err
 }
 
+// LinkWheels places the wheels for the given requirement lines, previously
+// downloaded into srcDir, into targetDir. Local path lines are matched by the
+// name and version from their pyproject.toml.
+func LinkWheels(packages []string, srcDir, targetDir string) error {
+	if err := os.MkdirAll(targetDir, 0755); err != nil {
+		return err
+	}
+
+	for _, pkg := range packages {
+		src, err := wheelFor(pkg, srcDir)
+		if err != nil {
+			return err
+		}
+		dst := filepath.Join(targetDir, filepath.Base(src))
+		if _, err := os.Stat(dst); err == nil {
+			continue
+		}
+		if err := utils.LinkOrCopy(src, dst); err != nil {
+			return err
+		}
+	}
+	return nil
+}
+
+// wheelFor returns the wheel in dir that satisfies the pinned requirement
+// line pkg. Local path requirements are matched by their pyproject metadata.
+func wheelFor(pkg, dir string) (string, error) {
+	spec := pkg
+	if filepath.IsAbs(pkg) {
+		if local, err := GetLocalPackageSpec(pkg); err == nil {
+			spec = local
+		}
+	}
+	name, version, ok := pinnedSpec(spec)
+	if !ok {
+		return "", fmt.Errorf("%w: cannot match unpinned requirement %q", errWheelNotFound, pkg)
+	}
+	return FindWheel(dir, name, version)
+}
+
+// ReqFileWheels returns the wheels in dir for every requirement of reqFile,
+// ignoring any other files left in dir by earlier builds. Requirements
+// without a wheel in dir (not exact pins, sdists, other platforms) are all
+// reported in one error.
+func ReqFileWheels(reqFile, dir string) ([]string, error) {
+	_, reqs, err := splitReqFile(reqFile)
+	if err != nil {
+		return nil, err
+	}
+	wheels := make([]string, 0, len(reqs))
+	var missing []string
+	for _, line := range reqs {
+		path, err := wheelFor(line, dir)
+		if errors.Is(err, errWheelNotFound) {
+			missing = append(missing, line)
+			continue
+		}
+		if err != nil {
+			return nil, err
+		}
+		wheels = append(wheels, path)
+	}
+	if len(missing) > 0 {
+		return nil, fmt.Errorf("no wheel to expand for %d requirement(s), which are not exact pins or have no win_amd64 or pure-Python wheel:\n  %s\npin them to versions with such a wheel, or build without --payload",
+			len(missing), strings.Join(missing, "\n  "))
+	}
+	return wheels, nil
+}
+
 func DownloadReqFile(reqFile, targetDir string) (string, error) {
 	resolvedReq, err := ResolveReqFile(reqFile, targetDir)
 	if err != nil {
 		return "", err
 	}
 
-	indexURL := config.GetIndexURL()
+	// 3. Take whatever is already in the wheel cache, download only the rest
+	cache, err := OpenWheelCache()
+	if err != nil {
+		return "", fmt.Errorf("failed to open wheel cache: %w", err)
+	}
+	missingReq := filepath.Join(targetDir, ".requirements.missing.txt")
+	defer os.Remove(missingReq)
+	pins, err := reqHashes(resolvedReq)
+	if err != nil {
+		return "", err
+	}
+	missing, err := fillFromCache(cache, resolvedReq, targetDir, missingReq, pins)
+	if err != nil {
+		return "", fmt.Errorf("failed to fill from wheel cache: %w", err)
+	}
+
+	if missing > 0 {
+		before, err := wheelSet(targetDir)
+		if err != nil {
+			return "", err
+		}
+
+		mirrors := IndexMirrors()
+		workers := config.GetDownloadWorkers()
+		pipReq := missingReq
+		if config.GetDownloader() == "native" {
+			// 4a. Fetch pinned wheels directly from the simple index
+			rest, err := nativeDownload(missingReq, targetDir, mirrors, workers)
+			if err != nil {
+				return "", err
+			}
+			pipReq = ""
+			if len(rest) > 0 {
+				fmt.Printf("%d requirements are not exact pins or have no matching wheel, passing them to pip\n", len(rest))
+				pipReq = filepath.Join(targetDir, ".requirements.pip.txt")
+				defer os.Remove(pipReq)
+				if err := os.WriteFile(pipReq, []byte(strings.Join(rest, "\n")+"\n"), 0644); err != nil {
+					return "", err
+				}
+			}
+		}
+
+		// 4b. Download using pip. With --no-deps (Linux cross-download) every line is
+		// independent, so the requirements can be fetched in parallel shards.
+		if pipReq != "" {
+			if runtime.GOOS == "linux" && workers > 1 {
+				if err := parallelPipDownload(pipReq, targetDir, mirrors, workers); err != nil {
+					return "", err
+				}
+			} else if err := pipDownload(pipReq, targetDir, mirrors, false); err != nil {
+				return "", err
+			}
+		}
+
+		if err := ingestNewWheels(cache, targetDir, before, pins); err != nil {
+			return "", fmt.Errorf("failed to update wheel cache: %w", err)
+		}
+	}
+
+	// Copy local path dependencies' wheels to targetDir
+	if err := copyLocalWheels(resolvedReq, targetDir); err != nil {
+		return "", fmt.Errorf("failed to copy local wheels: %w", err)
+	}
+
+	return resolvedReq, nil
+}
+
+// pipDownload runs `pip download` against the first mirror, moving on to the
+// next one when pip fails.
+func pipDownload(reqFile, targetDir string, mirrors []string, quiet bool) error {
+	span := trace.Start("pip download")
+	defer span.End()
 
-	// 3. Download using pip
 	pythonExe := "python"
 	if runtime.GOOS != "windows" {
 		if _, err := exec.LookPath("python3"); err == nil {
@@ -128,7 +322,7 @@ func DownloadReqFile(reqFile, targetDir string) (string, error) {
 		}
 	}
 
-	args := []string{"-m", "pip", "download", "-r", resolvedReq, "-d", targetDir, "-i", indexURL}
+	args := []string{"-m", "pip", "download", "-r", reqFile, "-d", targetDir}
 
 	if runtime.GOOS == "linux" {
 		// Use --no-deps because we hopefully resolved everything or are forced to
@@ -138,31 +332,35 @@ func DownloadReqFile(reqFile, targetDir string) (string, error) {
 			"--no-deps",
 		)
 	}
-
-	cmd := exec.Command(pythonExe, args...)
-	cmd.Stdout = os.Stdout
-	cmd.Stderr = os.Stderr
-
-	fmt.Printf("Downloading: %s %v\n", pythonExe, args)
-	if err := cmd.Run(); err != nil {
-		return "", err
+	if quiet {
+		args = append(args, "-q")
 	}
 
-	// Copy local path dependencies' wheels to targetDir
-	if err := copyLocalWheels(resolvedReq, targetDir); err != nil {
-		return "", fmt.Errorf("failed to copy local wheels: %w", err)
-	}
+	var err error
+	for _, mirror := range mirrors {
+		cmdArgs := append(append([]string{}, args...), "-i", mirror)
+		cmd := exec.Command(pythonExe, cmdArgs...)
+		cmd.Stdout = os.Stdout
+		cmd.Stderr = os.Stderr
 
-	return resolvedReq, nil
+		fmt.Printf("Downloading: %s %v\n", pythonExe, cmdArgs)
+		if err = span.Run(cmd); err == nil {
+			return nil
+		}
+		recordFailure(mirror)
+		fmt.Printf("Warning: pip download from %s failed: %v\n", mirror, err)
+	}
+	return err
 }
 
 func ResolveReqFile(reqFile, targetDir string) (string, error) {
+	span := trace.Start("resolve")
+	defer span.End()
+
 	if err := os.MkdirAll(targetDir, 0755); err != nil {
 		return "", err
 	}
 
-	indexURL := config.GetIndexURL()
-
 	// Resolve dependencies using 'uv' if available (preferred for cross-platform)
 	// or fallback to pip (risky/limited).
 	resolvedReq := reqFile // Default to using input as is
@@ -172,18 +370,36 @@ func ResolveReqFile(reqFile, targetDir string) (string, error) {
 		fmt.Println("Resolving dependencies with uv (cross-platform target: win_amd64, python 3.8)...")
 		resolvedReq = filepath.Join(targetDir, "requirements.txt")
 
-		uvArgs := []string{"pip", "compile",
-			reqFile,
-			"-o", resolvedReq,
-			"--python-version", "3.8",
-			"--python-platform", "x86_64-pc-windows-msvc",
-			"--index-url", indexURL,
-			"--no-emit-index-url",
-		}
-		uvCmd := exec.Command(uvPath, uvArgs...)
-		uvCmd.Stdout = os.Stdout
-		uvCmd.Stderr = os.Stderr
-		if err := uvCmd.Run(); err != nil {
+		// Mirrors serve the same packages, so the key uses the configured list
+		// rather than the order they are tried in
+		cacheKey, err := resolveCacheKey(reqFile, strings.Join(config.GetIndexURLs(), " "))
+		if err != nil {
+			return "", err
+		}
+		if lookupResolved(cacheKey, resolvedReq) {
+			span.SetAttr("cache", "hit")
+			fmt.Println("Inputs unchanged, reusing cached resolution.")
+			return resolvedReq, nil
+		}
+
+		span.SetAttr("cache", "miss")
+		for _, mirror := range IndexMirrors() {
+			uvArgs := []string{"pip", "compile",
+				reqFile,
+				"-o", resolvedReq,
+				"--index-url", mirror,
+			}
+			uvArgs = append(uvArgs, uvResolveArgs()...)
+			uvCmd := exec.Command(uvPath, uvArgs...)
+			uvCmd.Stdout = os.Stdout
+			uvCmd.Stderr = os.Stderr
+			if err = span.Run(uvCmd); err == nil {
+				break
+			}
+			recordFailure(mirror)
+			fmt.Printf("Warning: uv resolution against %s failed: %v\n", mirror, err)
+		}
+		if err != nil {
 			fmt.Printf("Warning: uv resolution failed: %v. Falling back to input as is.\n", err)
 			resolvedReq = reqFile
 		} else {
@@ -191,6 +407,9 @@ func ResolveReqFile(reqFile, targetDir string) (string, error) {
 			if err := postProcessRequirements(resolvedReq, filepath.Dir(reqFile)); err != nil {
 				return "", fmt.Errorf("failed to post-process requirements: %w", err)
 			}
+			if err := storeResolved(cacheKey, resolvedReq); err != nil {
+				fmt.Printf("Warning: failed to cache resolution: %v\n", err)
+			}
 		}
 	} else {
 		fmt.Println("uv not found or not on Linux. Skipping explicit resolution step.")
@@ -206,11 +425,24 @@ func postProcessRequirements(filePath, baseDir string) error {
 	defer f.Close()
 
 	var lines []string
+	var pending string
 	scanner := bufio.NewScanner(f)
 	for scanner.Scan() {
 		line := scanner.Text()
 		trimmed := strings.TrimSpace(line)
 
+		// Keep each requirement and its --hash options on one line, so the
+		// line-based readers see whole requirements
+		if strings.HasSuffix(trimmed, "\\") {
+			pending += strings.TrimSpace(strings.TrimSuffix(trimmed, "\\")) + " "
+			continue
+		}
+		if pending != "" {
+			line = pending + trimmed
+			trimmed = line
+			pending = ""
+		}
+
 		// Skip comments, empty lines, and command options
 		if trimmed == "" || strings.HasPrefix(trimmed, "#") || strings.HasPrefix(trimmed, "-") {
 			lines = append(lines, line)
@@ -239,120 +471,154 @@ func postProcessRequirements(filePath, baseDir string) error {
 	return os.WriteFile(filePath, []byte(strings.Join(lines, "\n")+"\n"), 0644)
 }
 
+// copyLocalWheels builds a wheel for every local path dependency of reqFile
+// into targetDir, running up to config.GetLocalBuildWorkers() builds at once,
+// and rewrites the path lines of reqFile to name==version pins.
 func copyLocalWheels(reqFile, targetDir string) error {
-	f, err := os.Open(reqFile)
+	content, err := os.ReadFile(reqFile)
 	if err != nil {
 		return err
 	}
-	defer f.Close()
-
-	var lines []string
-	pathMap := make(map[string]string) // Map from absolute path to package name
+	lines := strings.Split(strings.TrimRight(string(content), "\n"), "\n")
 
-	scanner := bufio.NewScanner(f)
-	for scanner.Scan() {
-		line := strings.TrimSpace(scanner.Text())
-		if line == "" || strings.HasPrefix(line, "#") || strings.HasPrefix(line, "-") {
-			lines = append(lines, scanner.Text())
+	// If the line is an absolute path on disk, it's a local dependency
+	var localDirs []string
+	seen := make(map[string]bool)
+	for _, line := range lines {
+		line = strings.TrimSpace(line)
+		if line == "" || strings.HasPrefix(line, "#") || strings.HasPrefix(line, "-") || !filepath.IsAbs(line) || seen[line] {
 			continue
 		}
+		if info, err := os.Stat(line); err == nil && info.IsDir() {
+			fmt.Printf("Detected local path dependency: %s\n", line)
+			seen[line] = true
+			localDirs = append(localDirs, line)
+		}
+	}
+	if len(localDirs) == 0 {
+		return nil
+	}
 
-		// If the line is an absolute path on disk, it's a local dependency
-		if filepath.IsAbs(line) {
-			if info, err := os.Stat(line); err == nil && info.IsDir() {
-				fmt.Printf("Detected local path dependency: %s\n", line)
-
-				// Build the wheel using `uv build --wheel` or `python -m build --wheel`
-				uvPath, err := exec.LookPath("uv")
-				var buildCmd *exec.Cmd
-				if err == nil {
-					buildCmd = exec.Command(uvPath, "build", "--wheel")
-				} else {
-					pythonExe := "python"
-					if runtime.GOOS != "windows" {
-						if _, err := exec.LookPath("python3"); err == nil {
-							pythonExe = "python3"
-						}
-					}
-					buildCmd = exec.Command(pythonExe, "-m", "build", "--wheel")
-				}
-				buildCmd.Dir = line
-				buildCmd.Stdout = os.Stdout
-				buildCmd.Stderr = os.Stderr
-				fmt.Printf("Building wheel in %s...\n", line)
-				if err := buildCmd.Run(); err != nil {
-					return fmt.Errorf("failed to build wheel in %s: %w", line, err)
-				}
+	// Once any requirement pins a hash, pip on the client insists on hashes for
+	// every line, so pin the wheels built here as well
+	hashed := strings.Contains(string(content), "--hash")
 
-				// Find the generated wheel in the `dist` directory
-				distDir := filepath.Join(line, "dist")
-				files, err := os.ReadDir(distDir)
-				if err != nil {
-					return fmt.Errorf("failed to read dist dir %s: %w", distDir, err)
-				}
+	specs := make([]string, len(localDirs))
+	err = utils.ForEachParallel(len(localDirs), config.GetLocalBuildWorkers(), func(i int) error {
+		wheel, err := buildLocalWheel(localDirs[i], targetDir)
+		if err != nil {
+			return err
+		}
+		info, err := ParseWheelFilename(filepath.Base(wheel))
+		if err != nil {
+			return err
+		}
+		specs[i] = fmt.Sprintf("%s==%s", info.Name, info.Version)
+		fmt.Printf("Mapped local path '%s' to package spec '%s'\n", localDirs[i], specs[i])
+		if hashed {
+			sum, _, err := hashFile(wheel)
+			if err != nil {
+				return err
+			}
+			specs[i] += " --hash=sha256:" + sum
+		}
+		return nil
+	})
+	if err != nil {
+		return err
+	}
 
-				var newestWheel string
-				var newestTime int64
-				for _, file := range files {
-					if !file.IsDir() && strings.HasSuffix(file.Name(), ".whl") {
-						filePath := filepath.Join(distDir, file.Name())
-						if fileInfo, err := os.Stat(filePath); err == nil {
-							if fileInfo.ModTime().UnixNano() > newestTime {
-								newestTime = fileInfo.ModTime().UnixNano()
-								newestWheel = filePath
-							}
-						}
-					}
-				}
+	// Rewrite requirements.txt replacing absolute paths with package names
+	pathMap := make(map[string]string, len(localDirs))
+	for i, dir := range localDirs {
+		pathMap[dir] = specs[i]
+	}
+	for i, line := range lines {
+		if spec, exists := pathMap[strings.TrimSpace(line)]; exists {
+			lines[i] = spec
+		}
+	}
+	if err := os.WriteFile(reqFile, []byte(strings.Join(lines, "\n")+"\n"), 0644); err != nil {
+		return fmt.Errorf("failed to rewrite requirements file %s: %w", reqFile, err)
+	}
+	fmt.Printf("Successfully updated %s with standard package names\n", reqFile)
+	return nil
+}
 
-				if newestWheel == "" {
-					return fmt.Errorf("no wheel found in %s", distDir)
-				}
+// buildLocalWheel builds the project in dir with `uv build --wheel` (or
+// `python -m build --wheel`) into a fresh output directory, so the wheel it
+// produced is known without looking at dist/, and moves it into targetDir.
+// The build output is printed once the build finishes, so concurrent builds
+// do not interleave. A wheel built earlier from identical sources is reused
+// instead, unless local_wheel_cache is disabled.
+func buildLocalWheel(dir, targetDir string) (string, error) {
+	span := trace.Start("build local wheel")
+	span.SetAttr("path", dir)
+	defer span.End()
+
+	cacheKey := ""
+	if config.GetLocalWheelCache() {
+		key, err := localWheelKey(dir)
+		if err != nil {
+			fmt.Printf("Warning: cannot fingerprint %s, building it: %v\n", dir, err)
+		} else if wheel := lookupLocalWheel(key, targetDir); wheel != "" {
+			span.SetAttr("cache", "hit")
+			fmt.Printf("Sources of %s unchanged, reusing %s\n", dir, filepath.Base(wheel))
+			return wheel, nil
+		} else {
+			cacheKey = key
+		}
+	}
 
-				// Copy the newest wheel to targetDir
-				destPath := filepath.Join(targetDir, filepath.Base(newestWheel))
-				fmt.Printf("Copying built wheel %s to %s\n", newestWheel, destPath)
-				if err := copyFile(newestWheel, destPath); err != nil {
-					return fmt.Errorf("failed to copy wheel: %w", err)
-				}
+	outDir, err := os.MkdirTemp(targetDir, ".build-")
+	if err != nil {
+		return "", err
+	}
+	defer os.RemoveAll(outDir)
 
-				// Derive the package spec (name==version) from wheel filename (e.g. soda_tracking_service-1.0.2-py3-none-any.whl -> soda-tracking-service==1.0.2)
-				baseName := filepath.Base(newestWheel)
-				parts := strings.Split(baseName, "-")
-				if len(parts) > 1 {
-					pkgName := strings.ReplaceAll(parts[0], "_", "-")
-					version := parts[1]
-					pkgSpec := fmt.Sprintf("%s==%s", pkgName, version)
-					pathMap[line] = pkgSpec
-					fmt.Printf("Mapped local path '%s' to package spec '%s'\n", line, pkgSpec)
-				}
+	var buildCmd *exec.Cmd
+	if uvPath, err := exec.LookPath("uv"); err == nil {
+		buildCmd = exec.Command(uvPath, "build", "--wheel", "--out-dir", outDir)
+	} else {
+		pythonExe := "python"
+		if runtime.GOOS != "windows" {
+			if _, err := exec.LookPath("python3"); err == nil {
+				pythonExe = "python3"
 			}
 		}
-		lines = append(lines, scanner.Text())
+		buildCmd = exec.Command(pythonExe, "-m", "build", "--wheel", "--outdir", outDir)
 	}
-	f.Close()
+	var output bytes.Buffer
+	buildCmd.Dir = dir
+	buildCmd.Stdout = &output
+	buildCmd.Stderr = &output
+	fmt.Printf("Building wheel in %s...\n", dir)
 
-	if err := scanner.Err(); err != nil {
-		return err
+	if err := span.Run(buildCmd); err != nil {
+		os.Stdout.Write(output.Bytes())
+		return "", fmt.Errorf("failed to build wheel in %s: %w", dir, err)
 	}
 
-	// Rewrite requirements.txt replacing absolute paths with package names
-	if len(pathMap) > 0 {
-		for i, line := range lines {
-			trimmed := strings.TrimSpace(line)
-			if pkgName, exists := pathMap[trimmed]; exists {
-				lines[i] = pkgName
-			}
-		}
-		// Write the updated requirements.txt back
-		err = os.WriteFile(reqFile, []byte(strings.Join(lines, "\n")+"\n"), 0644)
-		if err != nil {
-			return fmt.Errorf("failed to rewrite requirements file %s: %w", reqFile, err)
-		}
-		fmt.Printf("Successfully updated %s with standard package names\n", reqFile)
+	wheels, err := filepath.Glob(filepath.Join(outDir, "*.whl"))
+	if err != nil {
+		return "", err
+	}
+	if len(wheels) != 1 {
+		os.Stdout.Write(output.Bytes())
+		return "", fmt.Errorf("building %s produced %d wheels, expected 1", dir, len(wheels))
 	}
 
-	return nil
+	destPath := filepath.Join(targetDir, filepath.Base(wheels[0]))
+	if err := os.Rename(wheels[0], destPath); err != nil {
+		return "", fmt.Errorf("failed to copy wheel: %w", err)
+	}
+	fmt.Printf("Built %s\n", destPath)
+	if cacheKey != "" {
+		if err := storeLocalWheel(cacheKey, destPath); err != nil {
+			fmt.Printf("Warning: failed to cache %s: %v\n", filepath.Base(destPath), err)
+		}
+	}
+	return destPath, nil
 }
 
 func copyFile(src, dst string) error {
@@ -0,0 +1,437 @@
+package deps
+
+import (
+	"crypto/sha256"
+	"encoding/hex"
+	"encoding/json"
+	"errors"
+	"fmt"
+	"html"
+	"io"
+	"mime"
+	"net/http"
+	"net/url"
+	"os"
+	"path/filepath"
+	"regexp"
+	"strconv"
+	"strings"
+	"sync"
+	"time"
+
+	"builder/internal/config"
+	"builder/internal/trace"
+	"builder/internal/utils"
+)
+
+// Target environment of the embedded Python shipped by the installer.
+const (
+	targetPlatform = "win_amd64"
+	targetPyMajor  = 3
+	targetPyMinor  = 8
+)
+
+const (
+	simpleJSONType = "application/vnd.pypi.simple.v1+json"
+	simpleHTMLType = "application/vnd.pypi.simple.v1+html"
+)
+
+// IndexFile is one distribution file listed on a simple index project page.
+type IndexFile struct {
+	Filename string            `json:"filename"`
+	URL      string            `json:"url"`
+	Hashes   map[string]string `json:"hashes"`
+	Size     int64             `json:"size"`
+	Yanked   bool              `json:"-"`
+}
+
+// IndexClient talks to a PEP 503 / PEP 691 simple repository API served by
+// one or more mirrors, fastest first.
+type IndexClient struct {
+	mirrors []string
+	hedge   time.Duration
+	http    *http.Client
+}
+
+// NewIndexClient returns a client for the simple index mirrors at urls. The
+// underlying transport keeps up to `conns` idle connections per host and
+// negotiates HTTP/2 when the server supports it.
+func NewIndexClient(urls []string, conns int) *IndexClient {
+	transport := http.DefaultTransport.(*http.Transport).Clone()
+	transport.ForceAttemptHTTP2 = true
+	transport.MaxIdleConnsPerHost = conns
+	mirrors := make([]string, len(urls))
+	for i, u := range urls {
+		mirrors[i] = strings.TrimSuffix(u, "/")
+	}
+	return &IndexClient{
+		mirrors: mirrors,
+		hedge:   config.GetIndexHedgeDelay(),
+		http:    &http.Client{Transport: transport, Timeout: 30 * time.Minute},
+	}
+}
+
+// ProjectFiles lists the files of a project, preferring the PEP 691 JSON
+// representation and falling back to the PEP 503 HTML page. The page comes
+// from the first mirror that serves it; see hedgedGet.
+func (c *IndexClient) ProjectFiles(name string) ([]IndexFile, error) {
+	return c.projectFiles(c.mirrors, name)
+}
+
+func (c *IndexClient) projectFiles(mirrors []string, name string) ([]IndexFile, error) {
+	accept := simpleJSONType + ", " + simpleHTMLType + ";q=0.2, text/html;q=0.1"
+	resp, _, err := hedgedGet(c.http, mirrors, "/"+NormalizeName(name)+"/", accept, c.hedge)
+	if err != nil {
+		return nil, fmt.Errorf("index lookup for %s: %w", name, err)
+	}
+	defer resp.Body.Close()
+
+	base, err := url.Parse(resp.Request.URL.String())
+	if err != nil {
+		return nil, err
+	}
+	mediaType, _, _ := mime.ParseMediaType(resp.Header.Get("Content-Type"))
+	var files []IndexFile
+	if mediaType == simpleJSONType {
+		files, err = parseSimpleJSON(resp.Body)
+	} else {
+		files, err = parseSimpleHTML(resp.Body)
+	}
+	if err != nil {
+		return nil, fmt.Errorf("failed to parse index page for %s: %w", name, err)
+	}
+
+	for i := range files {
+		ref, err := url.Parse(files[i].URL)
+		if err != nil {
+			return nil, err
+		}
+		files[i].URL = base.ResolveReference(ref).String()
+	}
+	return files, nil
+}
+
+// SelectWheel picks the wheel to install for name==version. A mirror that
+// lags behind may not list the version yet, so the other mirrors are asked
+// one by one before giving up.
+func (c *IndexClient) SelectWheel(name, version string) (IndexFile, error) {
+	files, err := c.ProjectFiles(name)
+	if err != nil {
+		return IndexFile{}, err
+	}
+	f, selErr := selectWheel(files, name, version)
+	if selErr == nil || len(c.mirrors) == 1 {
+		return f, selErr
+	}
+	for _, mirror := range c.mirrors {
+		files, err := c.projectFiles([]string{mirror}, name)
+		if err != nil {
+			continue
+		}
+		if f, err := selectWheel(files, name, version); err == nil {
+			return f, nil
+		}
+	}
+	return IndexFile{}, selErr
+}
+
+func parseSimpleJSON(r io.Reader) ([]IndexFile, error) {
+	var page struct {
+		Files []struct {
+			IndexFile
+			Yanked interface{} `json:"yanked"`
+		} `json:"files"`
+	}
+	if err := json.NewDecoder(r).Decode(&page); err != nil {
+		return nil, err
+	}
+
+	files := make([]IndexFile, 0, len(page.Files))
+	for _, f := range page.Files {
+		// "yanked" is either a bool or a string holding the reason
+		switch y := f.Yanked.(type) {
+		case bool:
+			f.IndexFile.Yanked = y
+		case string:
+			f.IndexFile.Yanked = true
+		}
+		files = append(files, f.IndexFile)
+	}
+	return files, nil
+}
+
+// errNoWheel reports that the index has no wheel for the target platform,
+// only sdists or wheels for other platforms; pip can still fetch the sdist.
+var errNoWheel = errors.New("no wheel for the target platform")
+
+var anchorRegex = regexp.MustCompile(`(?is)<a\s([^>]*)>(.*?)</a>`)
+var hrefRegex = regexp.MustCompile(`(?is)href\s*=\s*("[^"]*"|'[^']*')`)
+
+func parseSimpleHTML(r io.Reader) ([]IndexFile, error) {
+	body, err := io.ReadAll(r)
+	if err != nil {
+		return nil, err
+	}
+
+	var files []IndexFile
+	for _, m := range anchorRegex.FindAllSubmatch(body, -1) {
+		attrs := string(m[1])
+		href := hrefRegex.FindStringSubmatch(attrs)
+		if href == nil {
+			continue
+		}
+		link := html.UnescapeString(strings.Trim(href[1], `"'`))
+		f := IndexFile{
+			Filename: strings.TrimSpace(html.UnescapeString(string(m[2]))),
+			URL:      link,
+			Hashes:   make(map[string]string),
+			Yanked:   strings.Contains(strings.ToLower(attrs), "data-yanked"),
+		}
+		// Hashes are carried in the URL fragment, e.g. #sha256=<hex>
+		if idx := strings.Index(link, "#"); idx != -1 {
+			f.URL = link[:idx]
+			if algo, sum, ok := strings.Cut(link[idx+1:], "="); ok {
+				f.Hashes[algo] = sum
+			}
+		}
+		files = append(files, f)
+	}
+	return files, nil
+}
+
+// wheelPriority ranks how well a wheel matches the target environment
+// (cp38, win_amd64). It returns -1 for incompatible wheels; higher is better.
+func wheelPriority(info WheelInfo) int {
+	best := -1
+	for _, py := range info.PyTags {
+		pyMinor, cpython, ok := parsePythonTag(py)
+		if !ok {
+			continue
+		}
+		for _, abi := range info.AbiTags {
+			var abiScore int
+			switch {
+			case abi == fmt.Sprintf("cp%d%d", targetPyMajor, targetPyMinor) && cpython && pyMinor == targetPyMinor:
+				abiScore = 3
+			case abi == "abi3" && cpython && pyMinor <= targetPyMinor:
+				abiScore = 2
+			case abi == "none" && !cpython && pyMinor <= targetPyMinor:
+				abiScore = 1
+			case abi == "none" && cpython && pyMinor == targetPyMinor:
+				abiScore = 1
+			default:
+				continue
+			}
+			for _, plat := range info.PlatTags {
+				var platScore int
+				switch plat {
+				case targetPlatform:
+					platScore = 2
+				case "any":
+					platScore = 1
+				default:
+					continue
+				}
+				if score := platScore*10 + abiScore; score > best {
+					best = score
+				}
+			}
+		}
+	}
+	return best
+}
+
+// parsePythonTag interprets tags like cp38, py3 and py38. minor is -1 for
+// major-only tags.
+func parsePythonTag(tag string) (minor int, cpython bool, ok bool) {
+	var digits string
+	switch {
+	case strings.HasPrefix(tag, "cp"):
+		digits, cpython = tag[2:], true
+	case strings.HasPrefix(tag, "py"):
+		digits = tag[2:]
+	default:
+		return 0, false, false
+	}
+	if digits == "" || digits[0] != byte('0'+targetPyMajor) {
+		return 0, false, false
+	}
+	if len(digits) == 1 {
+		return -1, cpython, !cpython
+	}
+	minor, err := strconv.Atoi(digits[1:])
+	if err != nil {
+		return 0, false, false
+	}
+	return minor, cpython, true
+}
+
+// selectWheel picks the best compatible, non-yanked wheel for name==version.
+func selectWheel(files []IndexFile, name, version string) (IndexFile, error) {
+	var best IndexFile
+	bestScore := -1
+	for _, f := range files {
+		if f.Yanked {
+			continue
+		}
+		info, err := ParseWheelFilename(f.Filename)
+		if err != nil || info.Name != NormalizeName(name) || !strings.EqualFold(info.Version, version) {
+			continue
+		}
+		if score := wheelPriority(info); score > bestScore {
+			best, bestScore = f, score
+		}
+	}
+	if bestScore < 0 {
+		return IndexFile{}, fmt.Errorf("no %s wheel for cp%d%d found for %s==%s: %w", targetPlatform, targetPyMajor, targetPyMinor, name, version, errNoWheel)
+	}
+	return best, nil
+}
+
+// FileSize returns the size of f, as listed by the index or, for indexes
+// that do not list sizes (PEP 503 HTML pages), from a HEAD request.
+func (c *IndexClient) FileSize(f IndexFile) (int64, error) {
+	if f.Size > 0 {
+		return f.Size, nil
+	}
+	resp, err := c.http.Head(f.URL)
+	if err != nil {
+		return 0, err
+	}
+	resp.Body.Close()
+	if resp.StatusCode != http.StatusOK || resp.ContentLength < 0 {
+		return 0, fmt.Errorf("size of %s: %s", f.Filename, resp.Status)
+	}
+	return resp.ContentLength, nil
+}
+
+// Download streams f into targetDir, verifying the sha256 published by the
+// index. The file is written to a .part file and renamed once complete. If
+// the transfer fails, the same file is looked up and fetched on the other
+// mirrors; it must still match the original hash.
+func (c *IndexClient) Download(f IndexFile, targetDir string) error {
+	err := c.download(f, targetDir)
+	if err == nil || len(c.mirrors) == 1 {
+		return err
+	}
+	info, perr := ParseWheelFilename(f.Filename)
+	if perr != nil {
+		return err
+	}
+	for _, mirror := range c.mirrors {
+		files, lerr := c.projectFiles([]string{mirror}, info.Name)
+		if lerr != nil {
+			continue
+		}
+		for _, alt := range files {
+			if alt.Filename != f.Filename || alt.URL == f.URL {
+				continue
+			}
+			fmt.Printf("Download of %s failed (%v), retrying from %s\n", f.Filename, err, mirror)
+			if want := f.Hashes["sha256"]; want != "" {
+				alt.Hashes = map[string]string{"sha256": want}
+			}
+			if err = c.download(alt, targetDir); err == nil {
+				return nil
+			}
+			break
+		}
+	}
+	return err
+}
+
+func (c *IndexClient) download(f IndexFile, targetDir string) error {
+	resp, err := c.http.Get(f.URL)
+	if err != nil {
+		return err
+	}
+	defer resp.Body.Close()
+	if resp.StatusCode != http.StatusOK {
+		return fmt.Errorf("download %s: bad status: %s", f.Filename, resp.Status)
+	}
+
+	dest := filepath.Join(targetDir, f.Filename)
+	part := dest + ".part"
+	out, err := os.Create(part)
+	if err != nil {
+		return err
+	}
+	h := sha256.New()
+	if _, err := io.Copy(io.MultiWriter(out, h), resp.Body); err != nil {
+		out.Close()
+		os.Remove(part)
+		return fmt.Errorf("download %s: %w", f.Filename, err)
+	}
+	if err := out.Close(); err != nil {
+		os.Remove(part)
+		return err
+	}
+
+	if want := f.Hashes["sha256"]; want != "" {
+		if got := hex.EncodeToString(h.Sum(nil)); !strings.EqualFold(got, want) {
+			os.Remove(part)
+			return fmt.Errorf("sha256 mismatch for %s: expected %s, got %s", f.Filename, want, got)
+		}
+	}
+	return os.Rename(part, dest)
+}
+
+// nativeDownload fetches every pinned requirement of reqFile straight from the
+// index, without starting pip. Lines it cannot handle (unpinned specifiers,
+// URLs) are returned so the caller can pass them to pip. Local path
+// dependencies are skipped; copyLocalWheels builds them.
+func nativeDownload(reqFile, targetDir string, mirrors []string, workers int) ([]string, error) {
+	_, reqs, err := splitReqFile(reqFile)
+	if err != nil {
+		return nil, err
+	}
+
+	type pin struct{ name, version, line string }
+	var pins []pin
+	var rest []string
+	for _, line := range reqs {
+		if name, version, ok := pinnedSpec(line); ok {
+			pins = append(pins, pin{name, version, line})
+			continue
+		}
+		if filepath.IsAbs(line) {
+			if info, err := os.Stat(line); err == nil && info.IsDir() {
+				continue
+			}
+		}
+		rest = append(rest, line)
+	}
+	if len(pins) == 0 {
+		return rest, nil
+	}
+
+	span := trace.Start("native download")
+	defer span.End()
+	fmt.Printf("Downloading %d wheels from %s with %d workers...\n", len(pins), mirrors[0], workers)
+	client := NewIndexClient(mirrors, workers)
+	var restMu sync.Mutex
+	err = utils.ForEachParallel(len(pins), workers, func(i int) error {
+		p := pins[i]
+		f, err := client.SelectWheel(p.name, p.version)
+		if errors.Is(err, errNoWheel) {
+			// Leave it to pip, which fetches the sdist as before
+			restMu.Lock()
+			rest = append(rest, p.line)
+			restMu.Unlock()
+			return nil
+		}
+		if err != nil {
+			return err
+		}
+		if err := client.Download(f, targetDir); err != nil {
+			return err
+		}
+		if fi, err := os.Stat(filepath.Join(targetDir, f.Filename)); err == nil {
+			span.AddFiles(1)
+			span.AddBytes(fi.Size())
+		}
+		fmt.Printf("Downloaded %s\n", f.Filename)
+		return nil
+	})
+	return rest, err
+}
@@ -0,0 +1,122 @@
+package deps
+
+import (
+	"os"
+	"path/filepath"
+	"runtime"
+	"strings"
+	"testing"
+)
+
+// fakeUV is a `uv build` stand-in that writes a wheel named after the
+// project directory into --out-dir.
+const fakeUV = `#!/bin/sh
+while [ $# -gt 0 ]; do
+	[ "$1" = "--out-dir" ] && out="$2"
+	shift
+done
+name=$(basename "$PWD")
+echo "$name" >> "$(dirname "$0")/builds.log"
+cat "$PWD"/*.py > "$out/${name}-1.0.0-py3-none-any.whl" 2>/dev/null || true
+`
+
+// setupFakeUV puts fakeUV on PATH and runs the test from a scratch directory,
+// where the default build/cache is created. It returns a function counting
+// the builds run so far.
+func setupFakeUV(t *testing.T) func() int {
+	if runtime.GOOS == "windows" {
+		t.Skip("needs a POSIX shell")
+	}
+	bin := t.TempDir()
+	if err := os.WriteFile(filepath.Join(bin, "uv"), []byte(fakeUV), 0755); err != nil {
+		t.Fatal(err)
+	}
+	t.Setenv("PATH", bin+string(os.PathListSeparator)+os.Getenv("PATH"))
+
+	wd, err := os.Getwd()
+	if err != nil {
+		t.Fatal(err)
+	}
+	if err := os.Chdir(t.TempDir()); err != nil {
+		t.Fatal(err)
+	}
+	t.Cleanup(func() { os.Chdir(wd) })
+
+	return func() int {
+		log, _ := os.ReadFile(filepath.Join(bin, "builds.log"))
+		return strings.Count(string(log), "\n")
+	}
+}
+
+func TestCopyLocalWheels(t *testing.T) {
+	setupFakeUV(t)
+
+	src := t.TempDir()
+	var projects []string
+	for _, name := range []string{"alpha_service", "beta_service", "gamma_service"} {
+		dir := filepath.Join(src, name)
+		if err := os.MkdirAll(filepath.Join(dir, "dist"), 0755); err != nil {
+			t.Fatal(err)
+		}
+		projects = append(projects, dir)
+	}
+	// A stale wheel in dist/ must not be picked up
+	os.WriteFile(filepath.Join(projects[0], "dist", "alpha_service-9.9.9-py3-none-any.whl"), nil, 0644)
+
+	target := t.TempDir()
+	reqFile := filepath.Join(target, "requirements.txt")
+	content := "requests==2.32.3\n" + strings.Join(projects, "\n") + "\n"
+	if err := os.WriteFile(reqFile, []byte(content), 0644); err != nil {
+		t.Fatal(err)
+	}
+	if err := copyLocalWheels(reqFile, target); err != nil {
+		t.Fatal(err)
+	}
+
+	got, _ := os.ReadFile(reqFile)
+	want := "requests==2.32.3\nalpha-service==1.0.0\nbeta-service==1.0.0\ngamma-service==1.0.0\n"
+	if string(got) != want {
+		t.Errorf("rewritten requirements = %q, want %q", got, want)
+	}
+	for _, name := range []string{"alpha_service", "beta_service", "gamma_service"} {
+		if _, err := os.Stat(filepath.Join(target, name+"-1.0.0-py3-none-any.whl")); err != nil {
+			t.Error(err)
+		}
+	}
+	if leftovers, _ := filepath.Glob(filepath.Join(target, ".build-*")); len(leftovers) != 0 {
+		t.Errorf("build directories left behind: %v", leftovers)
+	}
+}
+
+func TestLocalWheelCache(t *testing.T) {
+	builds := setupFakeUV(t)
+
+	project := filepath.Join(t.TempDir(), "delta_service")
+	if err := os.MkdirAll(filepath.Join(project, "dist"), 0755); err != nil {
+		t.Fatal(err)
+	}
+	source := filepath.Join(project, "service.py")
+	os.WriteFile(source, []byte("VERSION = 1\n"), 0644)
+
+	build := func() string {
+		target := t.TempDir()
+		wheel, err := buildLocalWheel(project, target)
+		if err != nil {
+			t.Fatal(err)
+		}
+		data, _ := os.ReadFile(wheel)
+		return string(data)
+	}
+
+	build()
+	// Build outputs do not change the fingerprint
+	os.WriteFile(filepath.Join(project, "dist", "old.whl"), nil, 0644)
+	if got := build(); got != "VERSION = 1\n" || builds() != 1 {
+		t.Fatalf("unchanged sources: got %q after %d builds, want a cache hit", got, builds())
+	}
+
+	os.WriteFile(source, []byte("VERSION = 2\n"), 0644)
+	if got := build(); got != "VERSION = 2\n" || builds() != 2 {
+		t.Fatalf("changed sources: got %q after %d builds, want a rebuild", got, builds())
+	}
+}
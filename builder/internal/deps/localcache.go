@@ -0,0 +1,204 @@
+package deps
+
+import (
+	"bytes"
+	"crypto/sha256"
+	"encoding/hex"
+	"fmt"
+	"io"
+	"os"
+	"os/exec"
+	"path/filepath"
+	"sort"
+	"strings"
+	"sync"
+
+	"builder/internal/config"
+	"builder/internal/utils"
+)
+
+// Directories never part of a local project's source when it is not in a git
+// work tree: build outputs, virtual environments and tool caches.
+var untrackedDirs = map[string]bool{
+	".git": true, ".hg": true, ".svn": true, ".venv": true, "venv": true, ".tox": true, ".nox": true,
+	"build": true, "dist": true, "__pycache__": true, ".mypy_cache": true, ".pytest_cache": true,
+	".ruff_cache": true, "node_modules": true,
+}
+
+var (
+	buildToolOnce    sync.Once
+	buildToolVersion string
+)
+
+// localBuildTool identifies the build frontend used for local projects, so
+// upgrading it invalidates cached wheels.
+func localBuildTool() string {
+	buildToolOnce.Do(func() {
+		var cmd *exec.Cmd
+		if uvPath, err := exec.LookPath("uv"); err == nil {
+			cmd = exec.Command(uvPath, "--version")
+		} else {
+			cmd = exec.Command("python3", "-m", "build", "--version")
+		}
+		out, _ := cmd.Output()
+		buildToolVersion = strings.TrimSpace(string(out))
+	})
+	return buildToolVersion
+}
+
+// localSourceFiles lists the files of the project in dir, relative to dir:
+// the files git tracks or would track when dir is in a work tree, otherwise
+// every file outside build outputs and environments.
+func localSourceFiles(dir string) ([]string, error) {
+	if tracked, err := gitFiles(dir, "--cached"); err == nil {
+		untracked, err := gitFiles(dir, "--others", "--exclude-standard")
+		if err != nil {
+			return nil, err
+		}
+		files := tracked
+		for _, f := range untracked {
+			if !inUntrackedDir(f) {
+				files = append(files, f)
+			}
+		}
+		return files, nil
+	}
+
+	var files []string
+	err := filepath.Walk(dir, func(p string, info os.FileInfo, err error) error {
+		if err != nil {
+			return err
+		}
+		if info.IsDir() {
+			if p != dir && inUntrackedDir(info.Name()+"/") {
+				return filepath.SkipDir
+			}
+			return nil
+		}
+		if !info.Mode().IsRegular() || strings.HasSuffix(info.Name(), ".pyc") {
+			return nil
+		}
+		rel, err := filepath.Rel(dir, p)
+		if err != nil {
+			return err
+		}
+		files = append(files, rel)
+		return nil
+	})
+	return files, err
+}
+
+func gitFiles(dir string, args ...string) ([]string, error) {
+	cmd := exec.Command("git", append([]string{"ls-files", "-z"}, args...)...)
+	cmd.Dir = dir
+	out, err := cmd.Output()
+	if err != nil {
+		return nil, err
+	}
+	var files []string
+	for _, f := range bytes.Split(out, []byte{0}) {
+		if len(f) > 0 {
+			files = append(files, filepath.FromSlash(string(f)))
+		}
+	}
+	return files, nil
+}
+
+// inUntrackedDir reports whether rel lies below a build output or
+// environment directory, e.g. a dist/ that is not in .gitignore.
+func inUntrackedDir(rel string) bool {
+	parts := strings.Split(filepath.ToSlash(rel), "/")
+	for _, part := range parts[:len(parts)-1] {
+		if untrackedDirs[part] || strings.HasSuffix(part, ".egg-info") {
+			return true
+		}
+	}
+	return false
+}
+
+// localWheelKey fingerprints everything a local project's wheel is built
+// from: its location, the content of its source files (pyproject.toml among
+// them, with the build backend requirements) and the build frontend version.
+func localWheelKey(dir string) (string, error) {
+	files, err := localSourceFiles(dir)
+	if err != nil {
+		return "", err
+	}
+	files = append(files, "pyproject.toml")
+	sort.Strings(files)
+
+	sums := make([]string, len(files))
+	err = utils.ForEachParallel(len(files), 8, func(i int) error {
+		if i > 0 && files[i] == files[i-1] {
+			return nil
+		}
+		f, err := os.Open(filepath.Join(dir, files[i]))
+		if err != nil {
+			// Deleted but still in the git index
+			sums[i] = "missing"
+			return nil
+		}
+		defer f.Close()
+		h := sha256.New()
+		if _, err := io.Copy(h, f); err != nil {
+			return err
+		}
+		sums[i] = hex.EncodeToString(h.Sum(nil))
+		return nil
+	})
+	if err != nil {
+		return "", err
+	}
+
+	h := sha256.New()
+	fmt.Fprintf(h, "project %s\n", dir)
+	fmt.Fprintf(h, "tool %s\n", localBuildTool())
+	for i, f := range files {
+		if sums[i] != "" {
+			fmt.Fprintf(h, "file %s %s\n", filepath.ToSlash(f), sums[i])
+		}
+	}
+	return hex.EncodeToString(h.Sum(nil)), nil
+}
+
+func localWheelCacheDir(key string) string {
+	return filepath.Join(config.GetCacheDir(), "local-wheels", key)
+}
+
+// lookupLocalWheel places the wheel cached under key into targetDir and
+// returns its path, or "" on a miss.
+func lookupLocalWheel(key, targetDir string) string {
+	wheels, _ := filepath.Glob(filepath.Join(localWheelCacheDir(key), "*.whl"))
+	if len(wheels) != 1 {
+		return ""
+	}
+	dest := filepath.Join(targetDir, filepath.Base(wheels[0]))
+	os.Remove(dest)
+	if err := utils.LinkOrCopy(wheels[0], dest); err != nil {
+		return ""
+	}
+	return dest
+}
+
+// storeLocalWheel caches a freshly built wheel under key. The entry is
+// assembled in a temporary directory and renamed into place, so concurrent
+// builders never see a partial entry.
+func storeLocalWheel(key, wheel string) error {
+	dir := localWheelCacheDir(key)
+	if err := os.MkdirAll(filepath.Dir(dir), 0755); err != nil {
+		return err
+	}
+	tmp, err := os.MkdirTemp(filepath.Dir(dir), ".tmp-")
+	if err != nil {
+		return err
+	}
+	if err := utils.LinkOrCopy(wheel, filepath.Join(tmp, filepath.Base(wheel))); err != nil {
+		os.RemoveAll(tmp)
+		return err
+	}
+	if err := os.Rename(tmp, dir); err != nil {
+		// Another builder stored the same key first
+		os.RemoveAll(tmp)
+	}
+	return nil
+}
@@ -0,0 +1,248 @@
+package deps
+
+import (
+	"context"
+	"fmt"
+	"io"
+	"net/http"
+	"sort"
+	"sync"
+	"time"
+
+	"builder/internal/config"
+)
+
+// mirrorProbeTimeout bounds the health probe of each index mirror.
+const mirrorProbeTimeout = 5 * time.Second
+
+// mirrorFailurePenalty is added to a mirror's latency per consecutive
+// failure when ordering mirrors.
+const mirrorFailurePenalty = 10 * time.Second
+
+// mirrorStats tracks the responsiveness of one index mirror for the whole
+// process, so downloads benefit from what resolution learned.
+type mirrorStats struct {
+	latency  time.Duration // EWMA of the time to response headers
+	samples  int
+	failures int // consecutive failures
+}
+
+var (
+	mirrorsMu   sync.Mutex
+	mirrorState = make(map[string]*mirrorStats)
+	probeOnce   = make(map[string]*sync.Once)
+)
+
+func statsFor(url string) *mirrorStats {
+	s, ok := mirrorState[url]
+	if !ok {
+		s = &mirrorStats{}
+		mirrorState[url] = s
+	}
+	return s
+}
+
+// recordLatency folds the time to headers of a successful request into the
+// mirror's moving average.
+func recordLatency(url string, d time.Duration) {
+	mirrorsMu.Lock()
+	defer mirrorsMu.Unlock()
+	s := statsFor(url)
+	if s.samples == 0 {
+		s.latency = d
+	} else {
+		s.latency = (s.latency*7 + d*3) / 10
+	}
+	s.samples++
+	s.failures = 0
+}
+
+func recordFailure(url string) {
+	mirrorsMu.Lock()
+	defer mirrorsMu.Unlock()
+	statsFor(url).failures++
+}
+
+// orderMirrors sorts urls from the most to the least responsive mirror,
+// keeping the configured order between equally scored ones.
+func orderMirrors(urls []string) []string {
+	mirrorsMu.Lock()
+	defer mirrorsMu.Unlock()
+	score := make(map[string]time.Duration, len(urls))
+	for _, u := range urls {
+		s := statsFor(u)
+		score[u] = s.latency + time.Duration(s.failures)*mirrorFailurePenalty
+	}
+	ordered := append([]string{}, urls...)
+	sort.SliceStable(ordered, func(i, j int) bool { return score[ordered[i]] < score[ordered[j]] })
+	return ordered
+}
+
+// probeMirrors measures every mirror once per process by fetching a small
+// project page, concurrently.
+func probeMirrors(urls []string) {
+	var wg sync.WaitGroup
+	for _, u := range urls {
+		mirrorsMu.Lock()
+		once, ok := probeOnce[u]
+		if !ok {
+			once = &sync.Once{}
+			probeOnce[u] = once
+		}
+		mirrorsMu.Unlock()
+
+		wg.Add(1)
+		go func(u string) {
+			defer wg.Done()
+			once.Do(func() { probeMirror(u) })
+		}(u)
+	}
+	wg.Wait()
+}
+
+func probeMirror(url string) {
+	ctx, cancel := context.WithTimeout(context.Background(), mirrorProbeTimeout)
+	defer cancel()
+	req, err := http.NewRequestWithContext(ctx, http.MethodGet, url+"/pip/", nil)
+	if err != nil {
+		recordFailure(url)
+		return
+	}
+	req.Header.Set("Accept", simpleJSONType+", "+simpleHTMLType+";q=0.2, text/html;q=0.1")
+	start := time.Now()
+	resp, err := http.DefaultClient.Do(req)
+	if err != nil {
+		fmt.Printf("Index mirror %s is unreachable: %v\n", url, err)
+		recordFailure(url)
+		return
+	}
+	resp.Body.Close()
+	if resp.StatusCode != http.StatusOK {
+		fmt.Printf("Index mirror %s is unhealthy: %s\n", url, resp.Status)
+		recordFailure(url)
+		return
+	}
+	recordLatency(url, time.Since(start))
+}
+
+// IndexMirrors returns the configured index URLs, fastest healthy mirror
+// first. With several mirrors they are probed on first use.
+func IndexMirrors() []string {
+	urls := config.GetIndexURLs()
+	if len(urls) > 1 {
+		probeMirrors(urls)
+	}
+	return orderMirrors(urls)
+}
+
+// attempt is the outcome of one request of a hedged fetch.
+type attempt struct {
+	index  int
+	mirror string
+	resp   *http.Response
+	err    error
+	cancel context.CancelFunc
+}
+
+// hedgedGet requests path from the mirrors in order. If the current mirror
+// has not answered with headers within hedge (0 disables hedging), the next
+// one is started as well; a failed request starts the next one at once. The
+// first 200 response wins and the other requests are cancelled. It returns
+// the winning response and the mirror that served it.
+func hedgedGet(client *http.Client, mirrors []string, path, accept string, hedge time.Duration) (*http.Response, string, error) {
+	results := make(chan attempt, len(mirrors))
+	cancels := make([]context.CancelFunc, 0, len(mirrors))
+	next, pending := 0, 0
+
+	launch := func() {
+		index, mirror := next, mirrors[next]
+		next++
+		pending++
+		ctx, cancel := context.WithCancel(context.Background())
+		cancels = append(cancels, cancel)
+		go func() {
+			req, err := http.NewRequestWithContext(ctx, http.MethodGet, mirror+path, nil)
+			if err != nil {
+				results <- attempt{index: index, mirror: mirror, err: err, cancel: cancel}
+				return
+			}
+			if accept != "" {
+				req.Header.Set("Accept", accept)
+			}
+			start := time.Now()
+			resp, err := client.Do(req)
+			switch {
+			case err == nil:
+				recordLatency(mirror, time.Since(start))
+			case ctx.Err() != nil:
+				// Lost the race: it took at least this long
+				recordLatency(mirror, time.Since(start))
+			default:
+				recordFailure(mirror)
+			}
+			results <- attempt{index: index, mirror: mirror, resp: resp, err: err, cancel: cancel}
+		}()
+	}
+
+	var timer <-chan time.Time
+	arm := func() {
+		timer = nil
+		if hedge > 0 && next < len(mirrors) {
+			timer = time.After(hedge)
+		}
+	}
+	launch()
+	arm()
+
+	var lastErr error
+	for pending > 0 {
+		select {
+		case <-timer:
+			launch()
+			arm()
+		case a := <-results:
+			pending--
+			if a.err == nil && a.resp.StatusCode == http.StatusOK {
+				// Cancel and drain the losers
+				for i, cancel := range cancels {
+					if i != a.index {
+						cancel()
+					}
+				}
+				go func(n int) {
+					for ; n > 0; n-- {
+						if l := <-results; l.resp != nil {
+							l.resp.Body.Close()
+						}
+					}
+				}(pending)
+				a.resp.Body = &cancelOnClose{ReadCloser: a.resp.Body, cancel: a.cancel}
+				return a.resp, a.mirror, nil
+			}
+			if a.err != nil {
+				lastErr = fmt.Errorf("%s: %w", a.mirror, a.err)
+			} else {
+				lastErr = fmt.Errorf("%s%s: bad status: %s", a.mirror, path, a.resp.Status)
+				a.resp.Body.Close()
+			}
+			a.cancel()
+			if next < len(mirrors) {
+				launch()
+				arm()
+			}
+		}
+	}
+	return nil, "", lastErr
+}
+
+// cancelOnClose releases the context of a winning request with its body.
+type cancelOnClose struct {
+	io.ReadCloser
+	cancel context.CancelFunc
+}
+
+func (b *cancelOnClose) Close() error {
+	err := b.ReadCloser.Close()
+	b.cancel()
+	return err
+}
@@ -0,0 +1,125 @@
+package deps
+
+import (
+	"crypto/sha256"
+	"encoding/hex"
+	"fmt"
+	"net/http"
+	"net/http/httptest"
+	"os"
+	"path/filepath"
+	"reflect"
+	"sort"
+	"strings"
+	"testing"
+	"time"
+)
+
+// fakeMirror serves a JSON project page for "demo" listing the given
+// versions. Files are served unless broken is set.
+func fakeMirror(t *testing.T, delay time.Duration, broken bool, versions ...string) *httptest.Server {
+	content := []byte("wheel content")
+	sum := sha256.Sum256(content)
+	srv := httptest.NewServer(http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		select {
+		case <-time.After(delay):
+		case <-r.Context().Done():
+			return
+		}
+		switch {
+		case r.URL.Path == "/demo/":
+			w.Header().Set("Content-Type", simpleJSONType)
+			fmt.Fprint(w, `{"files": [`)
+			for i, v := range versions {
+				if i > 0 {
+					fmt.Fprint(w, ",")
+				}
+				fmt.Fprintf(w, `{"filename": "demo-%s-py3-none-any.whl", "url": "/files/demo-%s-py3-none-any.whl", "hashes": {"sha256": "%s"}}`,
+					v, v, hex.EncodeToString(sum[:]))
+			}
+			fmt.Fprint(w, `]}`)
+		case !broken && strings.HasPrefix(r.URL.Path, "/files/"):
+			w.Write(content)
+		default:
+			http.NotFound(w, r)
+		}
+	}))
+	t.Cleanup(srv.Close)
+	return srv
+}
+
+func TestHedgedGet(t *testing.T) {
+	slow := fakeMirror(t, 500*time.Millisecond, false, "1.0")
+	fast := fakeMirror(t, 0, false, "1.0")
+
+	start := time.Now()
+	resp, mirror, err := hedgedGet(http.DefaultClient, []string{slow.URL, fast.URL}, "/demo/", "", 50*time.Millisecond)
+	if err != nil {
+		t.Fatal(err)
+	}
+	resp.Body.Close()
+	if mirror != fast.URL {
+		t.Errorf("served by %s, expected the fast mirror %s", mirror, fast.URL)
+	}
+	if elapsed := time.Since(start); elapsed > 400*time.Millisecond {
+		t.Errorf("hedged request took %s", elapsed)
+	}
+
+	// Without hedging a failing mirror still falls through to the next one
+	resp, mirror, err = hedgedGet(http.DefaultClient, []string{fast.URL, slow.URL}, "/missing/", "", 0)
+	if err == nil {
+		resp.Body.Close()
+		t.Fatalf("expected an error, served by %s", mirror)
+	}
+	if ordered := orderMirrors([]string{slow.URL, fast.URL}); ordered[0] != fast.URL {
+		t.Errorf("orderMirrors = %v, expected %s first", ordered, fast.URL)
+	}
+}
+
+func TestIndexClientFailover(t *testing.T) {
+	// The primary mirror lags behind and cannot serve files
+	stale := fakeMirror(t, 0, true, "1.0")
+	good := fakeMirror(t, 0, false, "1.0", "2.0")
+	client := NewIndexClient([]string{stale.URL, good.URL}, 1)
+
+	f, err := client.SelectWheel("demo", "2.0")
+	if err != nil {
+		t.Fatal(err)
+	}
+	if f.Filename != "demo-2.0-py3-none-any.whl" {
+		t.Errorf("SelectWheel = %s", f.Filename)
+	}
+
+	f, err = client.SelectWheel("demo", "1.0")
+	if err != nil {
+		t.Fatal(err)
+	}
+	dir := t.TempDir()
+	if err := client.Download(f, dir); err != nil {
+		t.Fatal(err)
+	}
+	if _, err := os.Stat(filepath.Join(dir, f.Filename)); err != nil {
+		t.Error(err)
+	}
+}
+
+func TestNativeDownloadFallsBackToPip(t *testing.T) {
+	mirror := fakeMirror(t, 0, false, "1.0")
+	dir := t.TempDir()
+	reqFile := filepath.Join(dir, "requirements.txt")
+	// demo 3.0 has no wheel on the index, e.g. an sdist-only release
+	if err := os.WriteFile(reqFile, []byte("demo==1.0\ndemo==3.0\nrequests>=2\n"), 0644); err != nil {
+		t.Fatal(err)
+	}
+	rest, err := nativeDownload(reqFile, dir, []string{mirror.URL}, 2)
+	if err != nil {
+		t.Fatal(err)
+	}
+	sort.Strings(rest)
+	if !reflect.DeepEqual(rest, []string{"demo==3.0", "requests>=2"}) {
+		t.Errorf("left for pip: %v", rest)
+	}
+	if _, err := os.Stat(filepath.Join(dir, "demo-1.0-py3-none-any.whl")); err != nil {
+		t.Error(err)
+	}
+}
@@ -0,0 +1,121 @@
+package deps
+
+import (
+	"bufio"
+	"fmt"
+	"os"
+	"path/filepath"
+	"strings"
+
+	"builder/internal/utils"
+)
+
+// splitReqFile separates a requirements file into option lines (e.g. --index-url),
+// which every shard needs, and the individual requirement lines. Backslash
+// continuations are joined and --hash options dropped: the builder checks
+// hashes itself, and pip refuses hash-less lines (local wheels) once any
+// line carries one.
+func splitReqFile(path string) (options []string, reqs []string, err error) {
+	f, err := os.Open(path)
+	if err != nil {
+		return nil, nil, err
+	}
+	defer f.Close()
+
+	var pending string
+	scanner := bufio.NewScanner(f)
+	for scanner.Scan() {
+		line := strings.TrimSpace(scanner.Text())
+		if strings.HasSuffix(line, "\\") {
+			pending += strings.TrimSuffix(line, "\\") + " "
+			continue
+		}
+		line = strings.TrimSpace(pending + line)
+		pending = ""
+		if line == "" || strings.HasPrefix(line, "#") {
+			continue
+		}
+		if strings.HasPrefix(line, "-") {
+			options = append(options, line)
+			continue
+		}
+		line, _ = splitHashes(line)
+		reqs = append(reqs, line)
+	}
+	return options, reqs, scanner.Err()
+}
+
+// shardLines distributes lines round-robin over at most n shards.
+func shardLines(lines []string, n int) [][]string {
+	if n > len(lines) {
+		n = len(lines)
+	}
+	if n < 1 {
+		return nil
+	}
+	shards := make([][]string, n)
+	for i, line := range lines {
+		shards[i%n] = append(shards[i%n], line)
+	}
+	return shards
+}
+
+// parallelPipDownload splits the resolved requirements into shards and runs one
+// `pip download --no-deps` per shard concurrently. Each shard downloads into its
+// own staging directory; the results are moved into targetDir afterwards.
+func parallelPipDownload(resolvedReq, targetDir string, mirrors []string, workers int) error {
+	options, reqs, err := splitReqFile(resolvedReq)
+	if err != nil {
+		return err
+	}
+	shards := shardLines(reqs, workers)
+	if len(shards) == 0 {
+		return nil
+	}
+
+	stagingDir, err := os.MkdirTemp(targetDir, ".shards-")
+	if err != nil {
+		return err
+	}
+	defer os.RemoveAll(stagingDir)
+
+	fmt.Printf("Downloading %d requirements in %d shards...\n", len(reqs), len(shards))
+	err = utils.ForEachParallel(len(shards), workers, func(i int) error {
+		shardDir := filepath.Join(stagingDir, fmt.Sprintf("shard-%d", i))
+		if err := os.MkdirAll(shardDir, 0755); err != nil {
+			return err
+		}
+		shardReq := filepath.Join(stagingDir, fmt.Sprintf("shard-%d.txt", i))
+		content := strings.Join(append(append([]string{}, options...), shards[i]...), "\n") + "\n"
+		if err := os.WriteFile(shardReq, []byte(content), 0644); err != nil {
+			return err
+		}
+		if err := pipDownload(shardReq, shardDir, mirrors, true); err != nil {
+			return fmt.Errorf("shard %d failed: %w", i, err)
+		}
+		return nil
+	})
+	if err != nil {
+		return err
+	}
+
+	// Merge shard results into targetDir
+	for i := range shards {
+		shardDir := filepath.Join(stagingDir, fmt.Sprintf("shard-%d", i))
+		entries, err := os.ReadDir(shardDir)
+		if err != nil {
+			return err
+		}
+		for _, entry := range entries {
+			if entry.IsDir() {
+				continue
+			}
+			src := filepath.Join(shardDir, entry.Name())
+			dst := filepath.Join(targetDir, entry.Name())
+			if err := os.Rename(src, dst); err != nil {
+				return fmt.Errorf("failed to merge %s: %w", entry.Name(), err)
+			}
+		}
+	}
+	return nil
+}
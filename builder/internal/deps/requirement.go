@@ -0,0 +1,281 @@
+package deps
+
+import (
+	"bufio"
+	"fmt"
+	"os"
+	"path/filepath"
+	"regexp"
+	"sort"
+	"strings"
+)
+
+// Requirement is one parsed line of a requirements file.
+type Requirement struct {
+	Line      string   // requirement as written, without comments and hashes
+	Name      string   // PEP 503 normalized name; empty for bare paths
+	Extras    []string // normalized and sorted
+	Specifier string   // version specifier, e.g. "==1.2.3"
+	Version   string   // exact version for `==` pins
+	Marker    string   // environment marker after ';'
+	URL       string   // target of `name @ url` references
+	Path      string   // local path lines
+	Hashes    []string // sha256 digests from --hash options
+}
+
+var hashOptionRegex = regexp.MustCompile(`\s*--hash[=\s]\s*(\S+)`)
+
+// splitHashes removes the --hash options from a requirement line and returns
+// the line and the sha256 digests they pin.
+func splitHashes(line string) (string, []string) {
+	var hashes []string
+	for _, m := range hashOptionRegex.FindAllStringSubmatch(line, -1) {
+		if algo, digest, ok := strings.Cut(m[1], ":"); ok && algo == "sha256" {
+			hashes = append(hashes, strings.ToLower(digest))
+		}
+	}
+	if hashes == nil && !strings.Contains(line, "--hash") {
+		return line, nil
+	}
+	return strings.TrimSpace(hashOptionRegex.ReplaceAllString(line, "")), hashes
+}
+
+// pinKey identifies name==version across spellings of name and version.
+func pinKey(name, version string) string {
+	return NormalizeName(name) + "==" + strings.ToLower(version)
+}
+
+// hashPinned reports whether sum is one of the pinned digests.
+func hashPinned(pinned []string, sum string) bool {
+	for _, h := range pinned {
+		if strings.EqualFold(h, sum) {
+			return true
+		}
+	}
+	return false
+}
+
+// reqHashes returns the sha256 digests pinned for each exact pin of reqFile,
+// keyed by pinKey. Requirements without --hash options are left out.
+func reqHashes(reqFile string) (map[string][]string, error) {
+	reqs, err := ParseRequirements(reqFile)
+	if err != nil {
+		return nil, err
+	}
+	pins := make(map[string][]string)
+	for _, req := range reqs {
+		if req.Version != "" && len(req.Hashes) > 0 {
+			key := pinKey(req.Name, req.Version)
+			pins[key] = append(pins[key], req.Hashes...)
+		}
+	}
+	return pins, nil
+}
+
+var requirementRegex = regexp.MustCompile(`^([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[([^\]]*)\])?\s*(.*)$`)
+
+// ParseRequirement parses a single requirement line (PEP 508 subset used in
+// requirements files: name, extras, specifiers, markers, direct references and
+// bare local paths).
+func ParseRequirement(line string) (Requirement, error) {
+	line, hashes := splitHashes(strings.TrimSpace(line))
+	req := Requirement{Line: line, Hashes: hashes}
+	if line == "" {
+		return req, fmt.Errorf("empty requirement")
+	}
+
+	// Bare local paths, as written by postProcessRequirements
+	if filepath.IsAbs(line) || strings.HasPrefix(line, ".") {
+		req.Path = line
+		return req, nil
+	}
+
+	body := line
+	if idx := strings.Index(body, ";"); idx != -1 {
+		req.Marker = strings.TrimSpace(body[idx+1:])
+		body = strings.TrimSpace(body[:idx])
+	}
+
+	m := requirementRegex.FindStringSubmatch(body)
+	if m == nil {
+		return req, fmt.Errorf("invalid requirement: %s", line)
+	}
+	req.Name = NormalizeName(m[1])
+	if m[2] != "" {
+		for _, extra := range strings.Split(m[2], ",") {
+			if extra = strings.TrimSpace(extra); extra != "" {
+				req.Extras = append(req.Extras, NormalizeName(extra))
+			}
+		}
+		sort.Strings(req.Extras)
+	}
+
+	rest := strings.TrimSpace(m[3])
+	switch {
+	case strings.HasPrefix(rest, "@"):
+		req.URL = strings.TrimSpace(rest[1:])
+	case rest != "":
+		req.Specifier = strings.Join(strings.Fields(rest), "")
+		if strings.HasPrefix(req.Specifier, "==") && !strings.HasPrefix(req.Specifier, "===") &&
+			!strings.ContainsAny(req.Specifier[2:], ",*") {
+			req.Version = req.Specifier[2:]
+		}
+	}
+	return req, nil
+}
+
+// Key identifies the package a requirement refers to across snapshots.
+func (r Requirement) Key() string {
+	if r.Name != "" {
+		return r.Name
+	}
+	return r.Path
+}
+
+// ParseRequirements reads a requirements file, skipping comments, blank
+// lines and option lines, and joining backslash continuations.
+func ParseRequirements(path string) ([]Requirement, error) {
+	f, err := os.Open(path)
+	if err != nil {
+		return nil, err
+	}
+	defer f.Close()
+
+	var reqs []Requirement
+	var pending string
+	scanner := bufio.NewScanner(f)
+	for scanner.Scan() {
+		line := scanner.Text()
+		if idx := strings.Index(line, " #"); idx != -1 {
+			line = line[:idx]
+		}
+		line = strings.TrimSpace(line)
+		if strings.HasSuffix(line, "\\") {
+			pending += strings.TrimSuffix(line, "\\") + " "
+			continue
+		}
+		line = strings.TrimSpace(pending + line)
+		pending = ""
+
+		if line == "" || strings.HasPrefix(line, "#") || strings.HasPrefix(line, "-") {
+			continue
+		}
+		req, err := ParseRequirement(line)
+		if err != nil {
+			return nil, fmt.Errorf("%s: %w", path, err)
+		}
+		reqs = append(reqs, req)
+	}
+	return reqs, scanner.Err()
+}
+
+// PackageChange describes how one package differs between two snapshots.
+type PackageChange struct {
+	Name        string `json:"name"`
+	FromVersion string `json:"from_version,omitempty"`
+	ToVersion   string `json:"to_version,omitempty"`
+	Line        string `json:"line"` // requirement to install, or the removed line
+}
+
+// SnapshotDiff is the structured difference between two snapshots.
+type SnapshotDiff struct {
+	Added      []PackageChange `json:"added"`
+	Upgraded   []PackageChange `json:"upgraded"`
+	Downgraded []PackageChange `json:"downgraded"`
+	Removed    []PackageChange `json:"removed"`
+}
+
+// DiffRequirements compares two resolved snapshots by normalized package name
+// and PEP 440 version, so formatting, name spelling, comments and marker
+// whitespace do not count as changes.
+func DiffRequirements(from, to []Requirement) SnapshotDiff {
+	fromByKey := make(map[string]Requirement, len(from))
+	for _, req := range from {
+		fromByKey[req.Key()] = req
+	}
+	toByKey := make(map[string]Requirement, len(to))
+	for _, req := range to {
+		toByKey[req.Key()] = req
+	}
+
+	var diff SnapshotDiff
+	for key, req := range toByKey {
+		change := PackageChange{Name: key, ToVersion: req.Version, Line: req.Line}
+		old, exists := fromByKey[key]
+		if !exists {
+			diff.Added = append(diff.Added, change)
+			continue
+		}
+		change.FromVersion = old.Version
+
+		if old.Version != "" && req.Version != "" {
+			switch CompareVersionStrings(old.Version, req.Version) {
+			case -1:
+				diff.Upgraded = append(diff.Upgraded, change)
+			case 1:
+				diff.Downgraded = append(diff.Downgraded, change)
+			}
+			continue
+		}
+		// Unpinned, URL or path requirements: reinstall when the reference changed
+		if old.Specifier != req.Specifier || old.URL != req.URL || old.Path != req.Path {
+			diff.Upgraded = append(diff.Upgraded, change)
+		}
+	}
+	for key, req := range fromByKey {
+		if _, exists := toByKey[key]; !exists {
+			diff.Removed = append(diff.Removed, PackageChange{Name: key, FromVersion: req.Version, Line: req.Line})
+		}
+	}
+
+	for _, changes := range [][]PackageChange{diff.Added, diff.Upgraded, diff.Downgraded, diff.Removed} {
+		sort.Slice(changes, func(i, j int) bool { return changes[i].Name < changes[j].Name })
+	}
+	return diff
+}
+
+// InstallLines returns the requirement lines the upgrade has to install.
+func (d SnapshotDiff) InstallLines() []string {
+	var lines []string
+	for _, changes := range [][]PackageChange{d.Added, d.Upgraded, d.Downgraded} {
+		for _, c := range changes {
+			lines = append(lines, c.Line)
+		}
+	}
+	sort.Strings(lines)
+	return lines
+}
+
+// Packages the installer bootstraps itself; an upgrade must never remove them
+// even if an older snapshot listed them explicitly.
+var protectedPackages = map[string]bool{"pip": true, "setuptools": true, "wheel": true}
+
+// UninstallNames returns the names of removed packages that the upgrade
+// should uninstall.
+func (d SnapshotDiff) UninstallNames() []string {
+	var names []string
+	for _, c := range d.Removed {
+		if c.Name != "" && !protectedPackages[c.Name] && !strings.ContainsAny(c.Name, "/\\") {
+			names = append(names, c.Name)
+		}
+	}
+	return names
+}
+
+// StaleWheelPatterns returns file name patterns matching the wheels of the
+// old versions of upgraded, downgraded and removed packages, which the
+// client wheel cache no longer needs once the upgrade is installed. Name
+// separators become '?', since wheel file names spell them '_' or '.'.
+func (d SnapshotDiff) StaleWheelPatterns() []string {
+	var patterns []string
+	for _, changes := range [][]PackageChange{d.Upgraded, d.Downgraded, d.Removed} {
+		for _, c := range changes {
+			if c.Name == "" || c.FromVersion == "" || strings.ContainsAny(c.Name, "/\\") {
+				continue
+			}
+			patterns = append(patterns, strings.ReplaceAll(c.Name, "-", "?")+"-"+c.FromVersion+"-*.whl")
+		}
+	}
+	sort.Strings(patterns)
+	return patterns
+}
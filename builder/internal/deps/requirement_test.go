@@ -0,0 +1,169 @@
+package deps
+
+import (
+	"os"
+	"path/filepath"
+	"reflect"
+	"testing"
+)
+
+func TestCompareVersionStrings(t *testing.T) {
+	// Each version sorts strictly before the next (PEP 440 examples)
+	ordered := []string{
+		"1.0.dev456",
+		"1.0a1",
+		"1.0a2.dev456",
+		"1.0a12.dev456",
+		"1.0a12",
+		"1.0b1.dev456",
+		"1.0b2",
+		"1.0b2.post345.dev456",
+		"1.0b2.post345",
+		"1.0rc1.dev456",
+		"1.0rc1",
+		"1.0",
+		"1.0+abc.5",
+		"1.0+abc.7",
+		"1.0+5",
+		"1.0.post456.dev34",
+		"1.0.post456",
+		"1.1.dev1",
+		"1.10",
+		"1!0.1",
+	}
+	for i := 0; i+1 < len(ordered); i++ {
+		if got := CompareVersionStrings(ordered[i], ordered[i+1]); got != -1 {
+			t.Errorf("CompareVersionStrings(%q, %q) = %d, expected -1", ordered[i], ordered[i+1], got)
+		}
+		if got := CompareVersionStrings(ordered[i+1], ordered[i]); got != 1 {
+			t.Errorf("CompareVersionStrings(%q, %q) = %d, expected 1", ordered[i+1], ordered[i], got)
+		}
+	}
+
+	equal := [][2]string{{"1.0", "1.0.0"}, {"1.0RC1", "1.0rc1"}, {"1.0-1", "1.0.post1"}, {"v2.0", "2.0"}}
+	for _, pair := range equal {
+		if got := CompareVersionStrings(pair[0], pair[1]); got != 0 {
+			t.Errorf("CompareVersionStrings(%q, %q) = %d, expected 0", pair[0], pair[1], got)
+		}
+	}
+}
+
+func TestParseRequirement(t *testing.T) {
+	req, err := ParseRequirement(`Uvicorn[Standard, http2] == 0.33.0 ; sys_platform == "win32"`)
+	if err != nil {
+		t.Fatalf("ParseRequirement returned error: %v", err)
+	}
+	expected := Requirement{
+		Line:      `Uvicorn[Standard, http2] == 0.33.0 ; sys_platform == "win32"`,
+		Name:      "uvicorn",
+		Extras:    []string{"http2", "standard"},
+		Specifier: "==0.33.0",
+		Version:   "0.33.0",
+		Marker:    `sys_platform == "win32"`,
+	}
+	if !reflect.DeepEqual(req, expected) {
+		t.Errorf("ParseRequirement = %+v, expected %+v", req, expected)
+	}
+
+	req, err = ParseRequirement("soda-tracking-service @ file:///home/soda/src/soda-tracking-service")
+	if err != nil || req.Name != "soda-tracking-service" || req.URL != "file:///home/soda/src/soda-tracking-service" {
+		t.Errorf("ParseRequirement(direct reference) = %+v, %v", req, err)
+	}
+
+	req, err = ParseRequirement("/home/soda/src/soda-tracking-service")
+	if err != nil || req.Path != "/home/soda/src/soda-tracking-service" || req.Name != "" {
+		t.Errorf("ParseRequirement(path) = %+v, %v", req, err)
+	}
+
+	req, err = ParseRequirement(`colorama==0.4.6 ; sys_platform == "win32" --hash=sha256:4F1D --hash=md5:abc --hash sha256:08695f`)
+	if err != nil || req.Line != `colorama==0.4.6 ; sys_platform == "win32"` || req.Marker != `sys_platform == "win32"` ||
+		!reflect.DeepEqual(req.Hashes, []string{"4f1d", "08695f"}) {
+		t.Errorf("ParseRequirement(hashes) = %+v, %v", req, err)
+	}
+}
+
+func TestSplitReqFileHashes(t *testing.T) {
+	path := filepath.Join(t.TempDir(), "requirements.txt")
+	content := "--no-binary :none:\n" +
+		"six==1.16.0 \\\n    --hash=sha256:aaaa \\\n    --hash=sha256:bbbb\n    # via -r requirements.in\n" +
+		"/src/local-pkg\n"
+	if err := os.WriteFile(path, []byte(content), 0644); err != nil {
+		t.Fatal(err)
+	}
+	options, reqs, err := splitReqFile(path)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if !reflect.DeepEqual(options, []string{"--no-binary :none:"}) || !reflect.DeepEqual(reqs, []string{"six==1.16.0", "/src/local-pkg"}) {
+		t.Errorf("splitReqFile = %q, %q", options, reqs)
+	}
+	pins, err := reqHashes(path)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if expected := map[string][]string{"six==1.16.0": {"aaaa", "bbbb"}}; !reflect.DeepEqual(pins, expected) {
+		t.Errorf("reqHashes = %v, expected %v", pins, expected)
+	}
+}
+
+func TestDiffRequirements(t *testing.T) {
+	parse := func(lines ...string) []Requirement {
+		var reqs []Requirement
+		for _, line := range lines {
+			req, err := ParseRequirement(line)
+			if err != nil {
+				t.Fatalf("ParseRequirement(%q) returned error: %v", line, err)
+			}
+			reqs = append(reqs, req)
+		}
+		return reqs
+	}
+
+	from := parse(
+		"soda_tracking_service==1.0.4",
+		"BeautifulSoup4==4.12.0",
+		"numpy==1.24.4",
+		"six==1.16.0",
+		"tqdm",
+		"urllib3==2.2.3",
+	)
+	to := parse(
+		"soda-tracking-service==1.0.5",
+		"beautifulsoup4==4.12.0",
+		"numpy==1.24.04",
+		"tqdm==4.67.1",
+		"urllib3==2.2.2",
+		"zipp==3.20.2",
+	)
+
+	diff := DiffRequirements(from, to)
+	expected := SnapshotDiff{
+		Added: []PackageChange{{Name: "zipp", ToVersion: "3.20.2", Line: "zipp==3.20.2"}},
+		Upgraded: []PackageChange{
+			{Name: "soda-tracking-service", FromVersion: "1.0.4", ToVersion: "1.0.5", Line: "soda-tracking-service==1.0.5"},
+			{Name: "tqdm", ToVersion: "4.67.1", Line: "tqdm==4.67.1"},
+		},
+		Downgraded: []PackageChange{{Name: "urllib3", FromVersion: "2.2.3", ToVersion: "2.2.2", Line: "urllib3==2.2.2"}},
+		Removed:    []PackageChange{{Name: "six", FromVersion: "1.16.0", Line: "six==1.16.0"}},
+	}
+	if !reflect.DeepEqual(diff, expected) {
+		t.Errorf("DiffRequirements =\n%+v\nexpected\n%+v", diff, expected)
+	}
+
+	lines := diff.InstallLines()
+	expectedLines := []string{"soda-tracking-service==1.0.5", "tqdm==4.67.1", "urllib3==2.2.2", "zipp==3.20.2"}
+	if !reflect.DeepEqual(lines, expectedLines) {
+		t.Errorf("InstallLines = %v, expected %v", lines, expectedLines)
+	}
+
+	stale := diff.StaleWheelPatterns()
+	expectedStale := []string{"six-1.16.0-*.whl", "soda?tracking?service-1.0.4-*.whl", "urllib3-2.2.3-*.whl"}
+	if !reflect.DeepEqual(stale, expectedStale) {
+		t.Errorf("StaleWheelPatterns = %v, expected %v", stale, expectedStale)
+	}
+
+	removed := DiffRequirements(parse("pip>=24.0", "six==1.16.0", "/src/local-pkg"), nil).UninstallNames()
+	if !reflect.DeepEqual(removed, []string{"six"}) {
+		t.Errorf("UninstallNames = %v, expected [six]", removed)
+	}
+}
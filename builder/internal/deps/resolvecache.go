@@ -0,0 +1,214 @@
+package deps
+
+import (
+	"crypto/sha256"
+	"encoding/hex"
+	"encoding/json"
+	"fmt"
+	"os"
+	"path/filepath"
+	"strings"
+	"sync"
+	"time"
+
+	"builder/internal/config"
+)
+
+// Arguments that determine what `uv pip compile` produces besides the input
+// file itself. Changing any of them invalidates the resolution cache.
+var uvTargetArgs = []string{
+	"--python-version", "3.8",
+	"--python-platform", "x86_64-pc-windows-msvc",
+	"--no-emit-index-url",
+}
+
+// uvResolveArgs returns uvTargetArgs plus the options taken from the config.
+func uvResolveArgs() []string {
+	args := append([]string{}, uvTargetArgs...)
+	if config.GetGenerateHashes() {
+		args = append(args, "--generate-hashes")
+	}
+	return args
+}
+
+// resolveCacheEntry records the local path dependencies a cached resolution
+// saw, with a fingerprint of their metadata, so edits to them invalidate it.
+type resolveCacheEntry struct {
+	LocalDeps map[string]string `json:"local_deps"`
+}
+
+// resolvedMemo is a resolution cache entry held in memory, so a long-running
+// process (see serve) skips the cache directory once it has seen a key.
+type resolvedMemo struct {
+	entry    resolveCacheEntry
+	content  []byte
+	modified time.Time
+}
+
+var (
+	resolvedMemosMu sync.Mutex
+	resolvedMemos   = make(map[string]*resolvedMemo)
+)
+
+func resolveCacheDir(key string) string {
+	return filepath.Join(config.GetCacheDir(), "resolve", key)
+}
+
+// resolveCacheKey fingerprints everything that goes into a resolution: the
+// input file content and location (relative paths are resolved against it),
+// the index URL and the target platform/python version.
+func resolveCacheKey(reqFile, indexURL string) (string, error) {
+	content, err := os.ReadFile(reqFile)
+	if err != nil {
+		return "", err
+	}
+	absReq, err := filepath.Abs(reqFile)
+	if err != nil {
+		return "", err
+	}
+
+	h := sha256.New()
+	fmt.Fprintf(h, "input:%s\n", filepath.Dir(absReq))
+	fmt.Fprintf(h, "index:%s\n", indexURL)
+	fmt.Fprintf(h, "target:%s\n", strings.Join(uvResolveArgs(), " "))
+	h.Write(content)
+	return hex.EncodeToString(h.Sum(nil)), nil
+}
+
+// localDepFingerprint hashes the packaging metadata of a local project.
+func localDepFingerprint(dir string) string {
+	h := sha256.New()
+	for _, name := range []string{"pyproject.toml", "setup.cfg", "setup.py"} {
+		content, err := os.ReadFile(filepath.Join(dir, name))
+		if err != nil {
+			continue
+		}
+		fmt.Fprintf(h, "%s:%d\n", name, len(content))
+		h.Write(content)
+	}
+	return hex.EncodeToString(h.Sum(nil))
+}
+
+// localDepsOf returns the local project directories referenced by a resolved
+// requirements file, either as absolute paths (after postProcessRequirements)
+// or as `name @ file://` references.
+func localDepsOf(resolved string) ([]string, error) {
+	_, reqs, err := splitReqFile(resolved)
+	if err != nil {
+		return nil, err
+	}
+	var dirs []string
+	for _, line := range reqs {
+		if _, ref, ok := strings.Cut(line, " @ file://"); ok {
+			line = strings.TrimSpace(strings.SplitN(ref, ";", 2)[0])
+		}
+		if !filepath.IsAbs(line) {
+			continue
+		}
+		if info, err := os.Stat(line); err == nil && info.IsDir() {
+			dirs = append(dirs, line)
+		}
+	}
+	return dirs, nil
+}
+
+// lookupResolved copies a cached resolution for key to dest. It reports false
+// when there is no entry, the entry is older than the configured TTL, or one
+// of its local path dependencies has changed.
+func lookupResolved(key, dest string) bool {
+	ttl := config.GetResolveCacheTTL()
+	if ttl <= 0 {
+		return false
+	}
+
+	resolvedMemosMu.Lock()
+	memo, ok := resolvedMemos[key]
+	resolvedMemosMu.Unlock()
+	if !ok {
+		var err error
+		if memo, err = readResolved(key); err != nil {
+			return false
+		}
+		resolvedMemosMu.Lock()
+		resolvedMemos[key] = memo
+		resolvedMemosMu.Unlock()
+	}
+	if time.Since(memo.modified) > ttl {
+		return false
+	}
+	for path, fingerprint := range memo.entry.LocalDeps {
+		if localDepFingerprint(path) != fingerprint {
+			fmt.Printf("Local dependency %s changed, resolving again\n", path)
+			return false
+		}
+	}
+
+	if err := os.WriteFile(dest, memo.content, 0644); err != nil {
+		return false
+	}
+	return true
+}
+
+// readResolved loads the cache entry for key from the cache directory.
+func readResolved(key string) (*resolvedMemo, error) {
+	dir := resolveCacheDir(key)
+	cached := filepath.Join(dir, "requirements.txt")
+	info, err := os.Stat(cached)
+	if err != nil {
+		return nil, err
+	}
+	content, err := os.ReadFile(cached)
+	if err != nil {
+		return nil, err
+	}
+	data, err := os.ReadFile(filepath.Join(dir, "entry.json"))
+	if err != nil {
+		return nil, err
+	}
+	memo := &resolvedMemo{content: content, modified: info.ModTime()}
+	if err := json.Unmarshal(data, &memo.entry); err != nil {
+		return nil, err
+	}
+	return memo, nil
+}
+
+// storeResolved saves the resolved requirements file under key.
+func storeResolved(key, resolved string) error {
+	localDeps, err := localDepsOf(resolved)
+	if err != nil {
+		return err
+	}
+	entry := resolveCacheEntry{LocalDeps: make(map[string]string)}
+	for _, dir := range localDeps {
+		entry.LocalDeps[dir] = localDepFingerprint(dir)
+	}
+	data, err := json.MarshalIndent(entry, "", "  ")
+	if err != nil {
+		return err
+	}
+
+	dir := resolveCacheDir(key)
+	if err := os.MkdirAll(dir, 0755); err != nil {
+		return err
+	}
+	if err := os.WriteFile(filepath.Join(dir, "entry.json"), data, 0644); err != nil {
+		return err
+	}
+	// Write then rename so a concurrent lookup never sees a partial file
+	tmp := filepath.Join(dir, "requirements.txt.tmp")
+	if err := copyFile(resolved, tmp); err != nil {
+		return err
+	}
+	if err := os.Rename(tmp, filepath.Join(dir, "requirements.txt")); err != nil {
+		return err
+	}
+
+	content, err := os.ReadFile(resolved)
+	if err != nil {
+		return err
+	}
+	resolvedMemosMu.Lock()
+	resolvedMemos[key] = &resolvedMemo{entry: entry, content: content, modified: time.Now()}
+	resolvedMemosMu.Unlock()
+	return nil
+}
@@ -0,0 +1,132 @@
+package deps
+
+import (
+	"os"
+	"path/filepath"
+	"testing"
+	"time"
+
+	"github.com/spf13/viper"
+)
+
+func TestResolveCacheKey(t *testing.T) {
+	dir := t.TempDir()
+	reqFile := filepath.Join(dir, "requirements.in")
+	if err := os.WriteFile(reqFile, []byte("requests==2.32.3\n"), 0644); err != nil {
+		t.Fatal(err)
+	}
+	index := "https://pypi.org/simple https://mirror.example/simple"
+	key := func(indexURL string) string {
+		t.Helper()
+		k, err := resolveCacheKey(reqFile, indexURL)
+		if err != nil {
+			t.Fatal(err)
+		}
+		return k
+	}
+	base := key(index)
+	if again := key(index); again != base {
+		t.Fatalf("key of unchanged inputs changed: %s -> %s", base, again)
+	}
+
+	if err := os.WriteFile(reqFile, []byte("requests==2.32.4\n"), 0644); err != nil {
+		t.Fatal(err)
+	}
+	if key(index) == base {
+		t.Error("key ignores the requirement content")
+	}
+	if err := os.WriteFile(reqFile, []byte("requests==2.32.3\n"), 0644); err != nil {
+		t.Fatal(err)
+	}
+
+	for _, other := range []string{"https://pypi.org/simple", "https://mirror.example/simple https://pypi.org/simple"} {
+		if key(other) == base {
+			t.Errorf("key ignores the index URL list %q", other)
+		}
+	}
+
+	saved := uvTargetArgs
+	uvTargetArgs = append(append([]string{}, saved...), "--python-version", "3.9")
+	if key(index) == base {
+		t.Error("key ignores the uv target args")
+	}
+	uvTargetArgs = saved
+
+	viper.Set("generate_hashes", false)
+	defer viper.Set("generate_hashes", true)
+	if key(index) == base {
+		t.Error("key ignores --generate-hashes")
+	}
+}
+
+func TestResolveCacheLookup(t *testing.T) {
+	// The cache lives under build/cache relative to the working directory
+	dir := t.TempDir()
+	wd, _ := os.Getwd()
+	os.Chdir(dir)
+	defer os.Chdir(wd)
+
+	local := filepath.Join(dir, "local-pkg")
+	if err := os.MkdirAll(local, 0755); err != nil {
+		t.Fatal(err)
+	}
+	if err := os.WriteFile(filepath.Join(local, "pyproject.toml"), []byte("[project]\nname = \"local-pkg\"\n"), 0644); err != nil {
+		t.Fatal(err)
+	}
+	resolved := filepath.Join(dir, "requirements.txt")
+	content := "requests==2.32.3\n" + local + "\n"
+	if err := os.WriteFile(resolved, []byte(content), 0644); err != nil {
+		t.Fatal(err)
+	}
+	forget := func(key string) {
+		resolvedMemosMu.Lock()
+		delete(resolvedMemos, key)
+		resolvedMemosMu.Unlock()
+	}
+
+	const key = "0123456789abcdef"
+	defer forget(key)
+	if err := storeResolved(key, resolved); err != nil {
+		t.Fatal(err)
+	}
+	dest := filepath.Join(dir, "out.txt")
+	if !lookupResolved(key, dest) {
+		t.Fatal("fresh entry missed")
+	}
+	if data, _ := os.ReadFile(dest); string(data) != content {
+		t.Errorf("cached resolution = %q", data)
+	}
+	// Read back from the cache directory, as a new process would
+	forget(key)
+	if !lookupResolved(key, dest) {
+		t.Error("entry missed after reloading it from disk")
+	}
+
+	if lookupResolved("fedcba9876543210", dest) {
+		t.Error("a different key hit the cache")
+	}
+
+	// Editing the metadata of a local dependency invalidates the entry
+	if err := os.WriteFile(filepath.Join(local, "setup.cfg"), []byte("[metadata]\nversion = 2\n"), 0644); err != nil {
+		t.Fatal(err)
+	}
+	if lookupResolved(key, dest) {
+		t.Error("entry hit after a local dependency changed")
+	}
+	if err := os.Remove(filepath.Join(local, "setup.cfg")); err != nil {
+		t.Fatal(err)
+	}
+	if !lookupResolved(key, dest) {
+		t.Error("entry missed after the local dependency was restored")
+	}
+
+	// Entries older than the TTL expire
+	old := time.Now().Add(-25 * time.Hour)
+	if err := os.Chtimes(filepath.Join(resolveCacheDir(key), "requirements.txt"), old, old); err != nil {
+		t.Fatal(err)
+	}
+	forget(key)
+	if lookupResolved(key, dest) {
+		t.Error("entry hit after the default TTL of 24h expired")
+	}
+}
@@ -0,0 +1,496 @@
+package deps
+
+import (
+	"bufio"
+	"bytes"
+	"crypto/sha256"
+	"encoding/binary"
+	"encoding/hex"
+	"errors"
+	"fmt"
+	"io"
+	"math/bits"
+	"os"
+	"path/filepath"
+	"sort"
+	"strings"
+	"sync"
+
+	"builder/internal/config"
+	"builder/internal/utils"
+)
+
+// snapshotIndexPath returns where the index of the snapshots in dir is kept:
+// in the cache directory, one file per versions directory, so builds never
+// write into the source tree. It is derived from the snapshots and rebuilt
+// when missing.
+func snapshotIndexPath(dir string) (string, error) {
+	abs, err := filepath.Abs(dir)
+	if err != nil {
+		return "", err
+	}
+	sum := sha256.Sum256([]byte(abs))
+	return filepath.Join(config.GetCacheDir(), "snapshots", hex.EncodeToString(sum[:8])+".idx"), nil
+}
+
+var snapshotIndexMagic = []byte("PSIX\x01")
+
+var (
+	snapshotIndexesMu sync.Mutex
+	snapshotIndexes   = make(map[string]*SnapshotIndex)
+)
+
+// indexPin is one distinct requirement across all snapshots. Its fields are
+// ids into the string table; 0 is the empty string.
+type indexPin struct {
+	name, version, specifier, url, path, line uint32
+}
+
+// indexedSnapshot records which pins a snapshot file contains, and the size
+// and modification time of the file when it was indexed.
+type indexedSnapshot struct {
+	size    int64
+	modTime int64
+	pins    []uint64 // bitset over pin ids
+}
+
+// SnapshotIndex interns the requirements of every requirements_<ver>.txt
+// snapshot and stores a bitset of pins per version, so diffs and "which
+// versions ship X" queries need no parsing.
+type SnapshotIndex struct {
+	dir       string
+	path      string // of the index file
+	strs      []string
+	strIDs    map[string]uint32
+	pins      []indexPin
+	pinIDs    map[indexPin]uint32
+	snapshots map[string]*indexedSnapshot
+}
+
+// PackageOccurrence is a package version and the snapshots that ship it.
+type PackageOccurrence struct {
+	Name     string
+	Version  string
+	Line     string   // as written in the first snapshot shipping it
+	Versions []string // snapshot versions, oldest first
+}
+
+func newSnapshotIndex(dir, path string) *SnapshotIndex {
+	return &SnapshotIndex{
+		dir:       dir,
+		path:      path,
+		strs:      []string{""},
+		strIDs:    map[string]uint32{"": 0},
+		pinIDs:    make(map[indexPin]uint32),
+		snapshots: make(map[string]*indexedSnapshot),
+	}
+}
+
+// OpenSnapshotIndex loads the index of resources/versions, reindexes the
+// snapshots added or changed since it was written and saves it back. The
+// index is kept for the life of the process and only reloaded when a
+// snapshot changed; an index once returned is never modified.
+func OpenSnapshotIndex() (*SnapshotIndex, error) {
+	dir := filepath.Join(config.GetResourcesDir(), "versions")
+	path, err := snapshotIndexPath(dir)
+	if err != nil {
+		return nil, err
+	}
+	return openSnapshotIndex(dir, path)
+}
+
+func openSnapshotIndex(dir, path string) (*SnapshotIndex, error) {
+	snapshotIndexesMu.Lock()
+	defer snapshotIndexesMu.Unlock()
+	if x, ok := snapshotIndexes[path]; ok {
+		if stale, err := x.stale(); err == nil && !stale {
+			return x, nil
+		}
+	}
+
+	x, err := loadSnapshotIndex(dir, path)
+	if err != nil {
+		fmt.Printf("Warning: rebuilding snapshot index: %v\n", err)
+		x = newSnapshotIndex(dir, path)
+	}
+	changed, err := x.refresh()
+	if err != nil {
+		return nil, err
+	}
+	if changed {
+		if err := x.save(); err != nil {
+			fmt.Printf("Warning: failed to save snapshot index: %v\n", err)
+		}
+	}
+	snapshotIndexes[path] = x
+	return x, nil
+}
+
+func (x *SnapshotIndex) intern(s string) uint32 {
+	if id, ok := x.strIDs[s]; ok {
+		return id
+	}
+	id := uint32(len(x.strs))
+	x.strs = append(x.strs, s)
+	x.strIDs[s] = id
+	return id
+}
+
+func (x *SnapshotIndex) internPin(req Requirement) uint32 {
+	p := indexPin{
+		name:      x.intern(req.Name),
+		version:   x.intern(req.Version),
+		specifier: x.intern(req.Specifier),
+		url:       x.intern(req.URL),
+		path:      x.intern(req.Path),
+		line:      x.intern(req.Line),
+	}
+	if id, ok := x.pinIDs[p]; ok {
+		return id
+	}
+	id := uint32(len(x.pins))
+	x.pins = append(x.pins, p)
+	x.pinIDs[p] = id
+	return id
+}
+
+// stale reports whether snapshot files were added, modified or deleted since
+// the index was refreshed.
+func (x *SnapshotIndex) stale() (bool, error) {
+	versions, err := snapshotVersionsIn(x.dir)
+	if err != nil {
+		return false, err
+	}
+	if len(versions) != len(x.snapshots) {
+		return true, nil
+	}
+	for _, version := range versions {
+		s, ok := x.snapshots[version]
+		if !ok {
+			return true, nil
+		}
+		info, err := os.Stat(filepath.Join(x.dir, fmt.Sprintf("requirements_%s.txt", version)))
+		if err != nil {
+			return false, err
+		}
+		if s.size != info.Size() || s.modTime != info.ModTime().UnixNano() {
+			return true, nil
+		}
+	}
+	return false, nil
+}
+
+// refresh reindexes new and modified snapshot files and drops deleted ones.
+func (x *SnapshotIndex) refresh() (bool, error) {
+	versions, err := snapshotVersionsIn(x.dir)
+	if err != nil {
+		return false, err
+	}
+	changed := false
+	present := make(map[string]bool, len(versions))
+	for _, version := range versions {
+		present[version] = true
+		path := filepath.Join(x.dir, fmt.Sprintf("requirements_%s.txt", version))
+		info, err := os.Stat(path)
+		if err != nil {
+			return false, err
+		}
+		if s, ok := x.snapshots[version]; ok && s.size == info.Size() && s.modTime == info.ModTime().UnixNano() {
+			continue
+		}
+		reqs, err := ParseRequirements(path)
+		if err != nil {
+			return false, err
+		}
+		s := &indexedSnapshot{size: info.Size(), modTime: info.ModTime().UnixNano()}
+		for _, req := range reqs {
+			id := x.internPin(req)
+			for int(id/64) >= len(s.pins) {
+				s.pins = append(s.pins, 0)
+			}
+			s.pins[id/64] |= 1 << (id % 64)
+		}
+		x.snapshots[version] = s
+		changed = true
+	}
+	for version := range x.snapshots {
+		if !present[version] {
+			delete(x.snapshots, version)
+			changed = true
+		}
+	}
+	return changed, nil
+}
+
+// Versions returns the indexed snapshot versions, oldest first.
+func (x *SnapshotIndex) Versions() []string {
+	versions := make([]string, 0, len(x.snapshots))
+	for v := range x.snapshots {
+		versions = append(versions, v)
+	}
+	sort.Slice(versions, func(i, j int) bool { return utils.CompareVersions(versions[i], versions[j]) < 0 })
+	return versions
+}
+
+func (s *indexedSnapshot) has(id uint32) bool {
+	return int(id/64) < len(s.pins) && s.pins[id/64]&(1<<(id%64)) != 0
+}
+
+// Requirements returns the requirements of the snapshot of version, as
+// loadSnapshot would parse them.
+func (x *SnapshotIndex) Requirements(version string) ([]Requirement, bool) {
+	s, ok := x.snapshots[version]
+	if !ok {
+		return nil, false
+	}
+	var reqs []Requirement
+	for w, word := range s.pins {
+		for word != 0 {
+			id := w*64 + bits.TrailingZeros64(word)
+			word &= word - 1
+			p := x.pins[id]
+			req := Requirement{
+				Line:      x.strs[p.line],
+				Name:      x.strs[p.name],
+				Specifier: x.strs[p.specifier],
+				Version:   x.strs[p.version],
+				URL:       x.strs[p.url],
+				Path:      x.strs[p.path],
+			}
+			if req.Path != "" {
+				// Named after the pyproject.toml at query time, as loadSnapshot does
+				if spec, err := GetLocalPackageSpec(req.Path); err == nil {
+					if name, version, ok := pinnedSpec(spec); ok {
+						req.Name, req.Version = name, version
+					}
+				}
+			}
+			reqs = append(reqs, req)
+		}
+	}
+	return reqs, true
+}
+
+// Which lists the versions of package name shipped by the snapshots, each
+// with the snapshots that contain it, lowest package version first. A
+// non-empty version restricts the result to that version or, like "47", to
+// the releases below it ("47.0.1").
+func (x *SnapshotIndex) Which(name, version string) []PackageOccurrence {
+	nameID, ok := x.strIDs[NormalizeName(name)]
+	if !ok {
+		return nil
+	}
+	version = strings.ToLower(version)
+	byVersion := make(map[string]*PackageOccurrence)
+	var pins []uint32
+	for id, p := range x.pins {
+		v := strings.ToLower(x.strs[p.version])
+		if p.name != nameID || (version != "" && v != version && !strings.HasPrefix(v, version+".")) {
+			continue
+		}
+		pins = append(pins, uint32(id))
+		if _, ok := byVersion[v]; !ok {
+			byVersion[v] = &PackageOccurrence{Name: x.strs[p.name], Version: x.strs[p.version]}
+		}
+	}
+	for _, sv := range x.Versions() {
+		s := x.snapshots[sv]
+		for _, id := range pins {
+			if !s.has(id) {
+				continue
+			}
+			p := x.pins[id]
+			occ := byVersion[strings.ToLower(x.strs[p.version])]
+			if n := len(occ.Versions); n == 0 || occ.Versions[n-1] != sv {
+				occ.Versions = append(occ.Versions, sv)
+			}
+			if occ.Line == "" {
+				occ.Line = x.strs[p.line]
+			}
+		}
+	}
+
+	var found []PackageOccurrence
+	for _, occ := range byVersion {
+		if len(occ.Versions) > 0 {
+			found = append(found, *occ)
+		}
+	}
+	sort.Slice(found, func(i, j int) bool {
+		return CompareVersionStrings(found[i].Version, found[j].Version) < 0
+	})
+	return found
+}
+
+// save writes the index, keeping only the pins and strings still referenced.
+func (x *SnapshotIndex) save() error {
+	versions := x.Versions()
+	compact := newSnapshotIndex(x.dir, x.path)
+	remap := make(map[uint32]uint32)
+	for _, version := range versions {
+		s := x.snapshots[version]
+		out := &indexedSnapshot{size: s.size, modTime: s.modTime}
+		for w, word := range s.pins {
+			for word != 0 {
+				id := uint32(w*64 + bits.TrailingZeros64(word))
+				word &= word - 1
+				newID, ok := remap[id]
+				if !ok {
+					p := x.pins[id]
+					newID = compact.internPin(Requirement{
+						Name: x.strs[p.name], Version: x.strs[p.version], Specifier: x.strs[p.specifier],
+						URL: x.strs[p.url], Path: x.strs[p.path], Line: x.strs[p.line],
+					})
+					remap[id] = newID
+				}
+				for int(newID/64) >= len(out.pins) {
+					out.pins = append(out.pins, 0)
+				}
+				out.pins[newID/64] |= 1 << (newID % 64)
+			}
+		}
+		compact.snapshots[version] = out
+	}
+	versionIDs := make([]uint32, len(versions))
+	for i, version := range versions {
+		versionIDs[i] = compact.intern(version)
+	}
+
+	var buf bytes.Buffer
+	buf.Write(snapshotIndexMagic)
+	putUvarint(&buf, uint64(len(compact.strs)-1))
+	for _, s := range compact.strs[1:] {
+		putUvarint(&buf, uint64(len(s)))
+		buf.WriteString(s)
+	}
+	putUvarint(&buf, uint64(len(compact.pins)))
+	for _, p := range compact.pins {
+		for _, id := range []uint32{p.name, p.version, p.specifier, p.url, p.path, p.line} {
+			putUvarint(&buf, uint64(id))
+		}
+	}
+	putUvarint(&buf, uint64(len(versions)))
+	for i, version := range versions {
+		s := compact.snapshots[version]
+		putUvarint(&buf, uint64(versionIDs[i]))
+		putUvarint(&buf, uint64(s.size))
+		putUvarint(&buf, uint64(s.modTime))
+		putUvarint(&buf, uint64(len(s.pins)))
+		for _, word := range s.pins {
+			binary.Write(&buf, binary.LittleEndian, word)
+		}
+	}
+
+	if err := os.MkdirAll(filepath.Dir(x.path), 0755); err != nil {
+		return err
+	}
+	tmp, err := os.CreateTemp(filepath.Dir(x.path), ".snapshots-")
+	if err != nil {
+		return err
+	}
+	if _, err := tmp.Write(buf.Bytes()); err != nil {
+		tmp.Close()
+		os.Remove(tmp.Name())
+		return err
+	}
+	if err := tmp.Close(); err != nil {
+		os.Remove(tmp.Name())
+		return err
+	}
+	return os.Rename(tmp.Name(), x.path)
+}
+
+func putUvarint(buf *bytes.Buffer, v uint64) {
+	var tmp [binary.MaxVarintLen64]byte
+	buf.Write(tmp[:binary.PutUvarint(tmp[:], v)])
+}
+
+func loadSnapshotIndex(dir, path string) (*SnapshotIndex, error) {
+	x := newSnapshotIndex(dir, path)
+	data, err := os.ReadFile(path)
+	if os.IsNotExist(err) {
+		return x, nil
+	}
+	if err != nil {
+		return nil, err
+	}
+	if !bytes.HasPrefix(data, snapshotIndexMagic) {
+		return nil, errors.New("unknown snapshot index format")
+	}
+	r := bufio.NewReader(bytes.NewReader(data[len(snapshotIndexMagic):]))
+	return x, x.decode(r)
+}
+
+func (x *SnapshotIndex) decode(r *bufio.Reader) error {
+	n, err := binary.ReadUvarint(r)
+	if err != nil {
+		return err
+	}
+	for i := uint64(0); i < n; i++ {
+		size, err := binary.ReadUvarint(r)
+		if err != nil {
+			return err
+		}
+		b := make([]byte, size)
+		if _, err := io.ReadFull(r, b); err != nil {
+			return err
+		}
+		x.intern(string(b))
+	}
+	if len(x.strs) != int(n)+1 {
+		return errors.New("duplicate strings in snapshot index")
+	}
+
+	id := func() (uint32, error) {
+		v, err := binary.ReadUvarint(r)
+		if err == nil && v >= uint64(len(x.strs)) {
+			err = errors.New("string id out of range in snapshot index")
+		}
+		return uint32(v), err
+	}
+	if n, err = binary.ReadUvarint(r); err != nil {
+		return err
+	}
+	for i := uint64(0); i < n; i++ {
+		var fields [6]uint32
+		for j := range fields {
+			if fields[j], err = id(); err != nil {
+				return err
+			}
+		}
+		p := indexPin{fields[0], fields[1], fields[2], fields[3], fields[4], fields[5]}
+		x.pinIDs[p] = uint32(len(x.pins))
+		x.pins = append(x.pins, p)
+	}
+
+	if n, err = binary.ReadUvarint(r); err != nil {
+		return err
+	}
+	for i := uint64(0); i < n; i++ {
+		versionID, err := id()
+		if err != nil {
+			return err
+		}
+		var header [3]uint64
+		for j := range header {
+			if header[j], err = binary.ReadUvarint(r); err != nil {
+				return err
+			}
+		}
+		if header[2] > uint64(len(x.pins)/64+1) {
+			return errors.New("bitset longer than the pin table in snapshot index")
+		}
+		s := &indexedSnapshot{size: int64(header[0]), modTime: int64(header[1]), pins: make([]uint64, header[2])}
+		if err := binary.Read(r, binary.LittleEndian, s.pins); err != nil {
+			return err
+		}
+		// Requirements and Which index the pin table with every set bit
+		for w, word := range s.pins {
+			if valid := len(x.pins) - w*64; valid <= 0 && word != 0 || valid > 0 && valid < 64 && word>>uint(valid) != 0 {
+				return errors.New("bitset references a pin outside the pin table in snapshot index")
+			}
+		}
+		x.snapshots[x.strs[versionID]] = s
+	}
+	return nil
+}
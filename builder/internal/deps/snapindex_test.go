@@ -0,0 +1,99 @@
+package deps
+
+import (
+	"os"
+	"path/filepath"
+	"reflect"
+	"testing"
+)
+
+func TestSnapshotIndex(t *testing.T) {
+	dir := t.TempDir()
+	path := filepath.Join(t.TempDir(), "snapshots.idx")
+	write := func(version, content string) {
+		if err := os.WriteFile(filepath.Join(dir, "requirements_"+version+".txt"), []byte(content), 0644); err != nil {
+			t.Fatal(err)
+		}
+	}
+	write("20", "cryptography==46.0.1\nsix==1.16.0\n")
+	write("21", "cryptography==47.0.0 --hash=sha256:aaaa\nsix==1.16.0\n")
+	write("23", "# comment\nCryptography==47.0.0\nrequests==2.32.3\n")
+
+	index, err := openSnapshotIndex(dir, path)
+	if err != nil {
+		t.Fatal(err)
+	}
+	check := func(index *SnapshotIndex) {
+		t.Helper()
+		if versions := index.Versions(); !reflect.DeepEqual(versions, []string{"20", "21", "23"}) {
+			t.Errorf("Versions = %v", versions)
+		}
+		found := index.Which("CRYPTOGRAPHY", "47")
+		if len(found) != 1 || found[0].Version != "47.0.0" || !reflect.DeepEqual(found[0].Versions, []string{"21", "23"}) {
+			t.Errorf("Which(cryptography, 47) = %+v", found)
+		}
+		for _, pair := range [][2]string{{"20", "21"}, {"21", "23"}, {"20", "23"}} {
+			from, _ := index.Requirements(pair[0])
+			to, _ := index.Requirements(pair[1])
+			parsedFrom, _ := loadSnapshot(filepath.Join(dir, "requirements_"+pair[0]+".txt"))
+			parsedTo, _ := loadSnapshot(filepath.Join(dir, "requirements_"+pair[1]+".txt"))
+			if got, expected := DiffRequirements(from, to), DiffRequirements(parsedFrom, parsedTo); !reflect.DeepEqual(got, expected) {
+				t.Errorf("indexed diff %s -> %s = %+v, expected %+v", pair[0], pair[1], got, expected)
+			}
+		}
+	}
+	check(index)
+
+	// Reloaded from disk without reparsing anything
+	loaded, err := loadSnapshotIndex(dir, path)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if changed, err := loaded.refresh(); err != nil || changed {
+		t.Errorf("refresh of a fresh index = %v, %v", changed, err)
+	}
+	check(loaded)
+	if again, err := openSnapshotIndex(dir, path); err != nil || again != index {
+		t.Errorf("unchanged index was reloaded: %v", err)
+	}
+
+	// A bit past the pin table makes the index unreadable, so it is rebuilt
+	data, err := os.ReadFile(path)
+	if err != nil {
+		t.Fatal(err)
+	}
+	data[len(data)-1] |= 0x80
+	if err := os.WriteFile(path, data, 0644); err != nil {
+		t.Fatal(err)
+	}
+	if _, err := loadSnapshotIndex(dir, path); err == nil {
+		t.Error("loaded an index whose bitset references a missing pin")
+	}
+	snapshotIndexesMu.Lock()
+	delete(snapshotIndexes, path)
+	snapshotIndexesMu.Unlock()
+	index, err = openSnapshotIndex(dir, path)
+	if err != nil {
+		t.Fatal(err)
+	}
+	check(index)
+
+	// Snapshots added or removed later are picked up incrementally
+	write("24", "cryptography==47.0.1\n")
+	if err := os.Remove(filepath.Join(dir, "requirements_20.txt")); err != nil {
+		t.Fatal(err)
+	}
+	index, err = openSnapshotIndex(dir, path)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if versions := index.Versions(); !reflect.DeepEqual(versions, []string{"21", "23", "24"}) {
+		t.Errorf("Versions after update = %v", versions)
+	}
+	if found := index.Which("cryptography", "47.0.1"); len(found) != 1 || !reflect.DeepEqual(found[0].Versions, []string{"24"}) {
+		t.Errorf("Which(cryptography, 47.0.1) = %+v", found)
+	}
+	if found := index.Which("cryptography", "46"); len(found) != 0 {
+		t.Errorf("Which(cryptography, 46) after removal = %+v", found)
+	}
+}
@@ -0,0 +1,219 @@
+package deps
+
+import (
+	"archive/zip"
+	"container/heap"
+	"fmt"
+	"sync"
+
+	"builder/internal/utils"
+)
+
+// UpgradeStep is one upgrade package of a chain.
+type UpgradeStep struct {
+	From  string `json:"from"`
+	To    string `json:"to"`
+	Bytes int64  `json:"bytes"`
+}
+
+// UpgradePath is the cheapest sequence of upgrade packages from one version
+// to the target version.
+type UpgradePath struct {
+	From  string        `json:"from"`
+	Steps []UpgradeStep `json:"steps"`
+	Bytes int64         `json:"bytes"`
+}
+
+// ShortestUpgradePaths finds, for every version in versions older than
+// toVer, the sequence of upgrades to toVer with the least total cost, where
+// cost(from, to) is the cost of a single upgrade package. Upgrades only go
+// forward, so a path may pass through any release in between. cost is called
+// at most once per pair.
+func ShortestUpgradePaths(versions []string, toVer string, cost func(from, to string) (int64, error)) (map[string]UpgradePath, error) {
+	nodes := []string{toVer}
+	for _, v := range versions {
+		if utils.CompareVersions(v, toVer) < 0 {
+			nodes = append(nodes, v)
+		}
+	}
+
+	// Dijkstra from toVer over the reversed edges: dist[v] is the cheapest
+	// cost of getting from v to toVer, next[v] the first hop on that path
+	dist := map[string]int64{toVer: 0}
+	next := make(map[string]UpgradeStep)
+	done := make(map[string]bool)
+	queue := &versionQueue{{version: toVer}}
+	for queue.Len() > 0 {
+		item := heap.Pop(queue).(versionItem)
+		to := item.version
+		if done[to] {
+			continue
+		}
+		done[to] = true
+		for _, from := range nodes {
+			if done[from] || utils.CompareVersions(from, to) >= 0 {
+				continue
+			}
+			c, err := cost(from, to)
+			if err != nil {
+				return nil, fmt.Errorf("estimating upgrade %s -> %s: %w", from, to, err)
+			}
+			if d, ok := dist[from]; !ok || item.dist+c < d {
+				dist[from] = item.dist + c
+				next[from] = UpgradeStep{From: from, To: to, Bytes: c}
+				heap.Push(queue, versionItem{version: from, dist: dist[from]})
+			}
+		}
+	}
+
+	paths := make(map[string]UpgradePath, len(nodes)-1)
+	for _, from := range nodes[1:] {
+		path := UpgradePath{From: from, Bytes: dist[from]}
+		for v := from; v != toVer; {
+			step := next[v]
+			path.Steps = append(path.Steps, step)
+			v = step.To
+		}
+		paths[from] = path
+	}
+	return paths, nil
+}
+
+type versionItem struct {
+	version string
+	dist    int64
+}
+
+type versionQueue []versionItem
+
+func (q versionQueue) Len() int            { return len(q) }
+func (q versionQueue) Less(i, j int) bool  { return q[i].dist < q[j].dist }
+func (q versionQueue) Swap(i, j int)       { q[i], q[j] = q[j], q[i] }
+func (q *versionQueue) Push(x interface{}) { *q = append(*q, x.(versionItem)) }
+func (q *versionQueue) Pop() interface{} {
+	old := *q
+	item := old[len(old)-1]
+	*q = old[:len(old)-1]
+	return item
+}
+
+// PayloadEstimator estimates how many bytes an upgrade package ships, from
+// wheel sizes in the wheel cache or on the index. Sizes are looked up once
+// per wheel, so costing every pair of snapshots stays cheap.
+type PayloadEstimator struct {
+	// Deltas estimates upgraded wheels as binary deltas against the old
+	// wheel (see build-upgrade --delta) when both wheels are cached.
+	Deltas bool
+
+	mu     sync.Mutex
+	sizes  map[string]int64
+	client *IndexClient
+}
+
+// NewPayloadEstimator returns an estimator for full wheels, or deltas.
+func NewPayloadEstimator(deltas bool) *PayloadEstimator {
+	return &PayloadEstimator{Deltas: deltas, sizes: make(map[string]int64)}
+}
+
+// Estimate returns the payload of the upgrade described by diff.
+func (e *PayloadEstimator) Estimate(diff *SnapshotDiff) (int64, error) {
+	cache, err := OpenWheelCache()
+	if err != nil {
+		return 0, err
+	}
+	var total int64
+	for _, changes := range [][]PackageChange{diff.Added, diff.Upgraded, diff.Downgraded} {
+		for _, c := range changes {
+			if c.ToVersion == "" {
+				// Unpinned or local requirement; its size is unknown
+				continue
+			}
+			if e.Deltas && c.FromVersion != "" {
+				oldWheel, oldOK := cache.Lookup(c.Name, c.FromVersion)
+				newWheel, newOK := cache.Lookup(c.Name, c.ToVersion)
+				if oldOK && newOK {
+					if n, err := estimateDelta(oldWheel.Path, newWheel.Path); err == nil {
+						total += n
+						continue
+					}
+				}
+			}
+			n, err := e.wheelSize(cache, c.Name, c.ToVersion)
+			if err != nil {
+				return 0, err
+			}
+			total += n
+		}
+	}
+	return total, nil
+}
+
+func (e *PayloadEstimator) wheelSize(cache *WheelCache, name, version string) (int64, error) {
+	key := pinKey(name, version)
+	e.mu.Lock()
+	n, ok := e.sizes[key]
+	e.mu.Unlock()
+	if ok {
+		return n, nil
+	}
+
+	if w, found := cache.Lookup(name, version); found {
+		n = w.Size
+	} else {
+		e.mu.Lock()
+		if e.client == nil {
+			e.client = NewIndexClient(IndexMirrors(), 1)
+		}
+		client := e.client
+		e.mu.Unlock()
+		f, err := client.SelectWheel(name, version)
+		if err == nil {
+			n, err = client.FileSize(f)
+		}
+		if err != nil {
+			// e.g. a local package: every path ships it once, so it does not
+			// change which path is cheapest
+			fmt.Printf("Warning: size of %s==%s unknown, not counted: %v\n", name, version, err)
+			n = 0
+		}
+	}
+	e.mu.Lock()
+	e.sizes[key] = n
+	e.mu.Unlock()
+	return n, nil
+}
+
+// estimateDelta approximates the size of a binary delta between two wheels
+// from their zip directories: members stored with the same CRC and size are
+// identical deflate streams that the delta copies, everything else ships as
+// literals.
+func estimateDelta(oldPath, newPath string) (int64, error) {
+	oldZip, err := zip.OpenReader(oldPath)
+	if err != nil {
+		return 0, err
+	}
+	defer oldZip.Close()
+	newZip, err := zip.OpenReader(newPath)
+	if err != nil {
+		return 0, err
+	}
+	defer newZip.Close()
+
+	type member struct {
+		crc  uint32
+		size uint64
+	}
+	old := make(map[member]bool, len(oldZip.File))
+	for _, f := range oldZip.File {
+		old[member{f.CRC32, f.CompressedSize64}] = true
+	}
+	var n int64
+	for _, f := range newZip.File {
+		// Local header and directory entry; offsets shift between versions
+		n += int64(76 + 2*len(f.Name))
+		if !old[member{f.CRC32, f.CompressedSize64}] {
+			n += int64(f.CompressedSize64)
+		}
+	}
+	return n, nil
+}
@@ -0,0 +1,88 @@
+package deps
+
+import (
+	"archive/zip"
+	"os"
+	"path/filepath"
+	"reflect"
+	"testing"
+)
+
+func TestShortestUpgradePaths(t *testing.T) {
+	costs := map[[2]string]int64{
+		{"1", "2"}: 10, {"1", "3"}: 50, {"1", "4"}: 60,
+		{"2", "3"}: 10, {"2", "4"}: 45,
+		{"3", "4"}: 20,
+	}
+	calls := make(map[[2]string]int)
+	paths, err := ShortestUpgradePaths([]string{"1", "2", "3", "4", "5"}, "4", func(from, to string) (int64, error) {
+		calls[[2]string{from, to}]++
+		return costs[[2]string{from, to}], nil
+	})
+	if err != nil {
+		t.Fatal(err)
+	}
+	hops := func(p UpgradePath) []string {
+		v := []string{p.From}
+		for _, s := range p.Steps {
+			v = append(v, s.To)
+		}
+		return v
+	}
+	for from, expected := range map[string][]string{
+		"1": {"1", "2", "3", "4"}, // 40 chained beats 60 direct
+		"2": {"2", "3", "4"},
+		"3": {"3", "4"},
+	} {
+		if got := hops(paths[from]); !reflect.DeepEqual(got, expected) {
+			t.Errorf("path from %s = %v, expected %v", from, got, expected)
+		}
+	}
+	if paths["1"].Bytes != 40 {
+		t.Errorf("cost from 1 = %d", paths["1"].Bytes)
+	}
+	if _, ok := paths["5"]; ok {
+		t.Error("planned a downgrade from 5")
+	}
+	for pair, n := range calls {
+		if n > 1 {
+			t.Errorf("cost(%s, %s) called %d times", pair[0], pair[1], n)
+		}
+	}
+}
+
+func TestEstimateDelta(t *testing.T) {
+	dir := t.TempDir()
+	write := func(name string, members map[string]string) string {
+		path := filepath.Join(dir, name)
+		f, err := os.Create(path)
+		if err != nil {
+			t.Fatal(err)
+		}
+		zw := zip.NewWriter(f)
+		for member, content := range members {
+			w, err := zw.Create(member)
+			if err != nil {
+				t.Fatal(err)
+			}
+			w.Write([]byte(content))
+		}
+		if err := zw.Close(); err != nil {
+			t.Fatal(err)
+		}
+		f.Close()
+		return path
+	}
+	big := string(make([]byte, 1<<16))
+	oldPath := write("old.whl", map[string]string{"demo/data.bin": big, "demo/__init__.py": "v1"})
+	newPath := write("new.whl", map[string]string{"demo/data.bin": big, "demo/__init__.py": "version 2"})
+
+	n, err := estimateDelta(oldPath, newPath)
+	if err != nil {
+		t.Fatal(err)
+	}
+	info, _ := os.Stat(newPath)
+	if n <= 0 || n >= info.Size() {
+		t.Errorf("estimated delta %d, wheel %d bytes", n, info.Size())
+	}
+}
@@ -0,0 +1,175 @@
+package deps
+
+import (
+	"math/big"
+	"regexp"
+	"strconv"
+	"strings"
+)
+
+// pep440Regex is the version pattern from PEP 440 Appendix B.
+var pep440Regex = regexp.MustCompile(`(?i)^\s*v?` +
+	`(?:(?P<epoch>[0-9]+)!)?` +
+	`(?P<release>[0-9]+(?:\.[0-9]+)*)` +
+	`(?:[-_.]?(?P<pre_l>alpha|a|beta|b|preview|pre|c|rc)[-_.]?(?P<pre_n>[0-9]+)?)?` +
+	`(?:(?:-(?P<post_n1>[0-9]+))|(?:[-_.]?(?P<post_l>post|rev|r)[-_.]?(?P<post_n2>[0-9]+)?))?` +
+	`(?:[-_.]?(?P<dev_l>dev)[-_.]?(?P<dev_n>[0-9]+)?)?` +
+	`(?:\+(?P<local>[a-z0-9]+(?:[-_.][a-z0-9]+)*))?\s*$`)
+
+// Version is a parsed PEP 440 version.
+type Version struct {
+	Epoch   int
+	Release []*big.Int
+	Pre     string // "a", "b" or "rc"; empty if not a pre-release
+	PreN    int
+	Post    int // -1 if not a post-release
+	Dev     int // -1 if not a dev release
+	Local   []string
+}
+
+// ParseVersion parses a PEP 440 version string.
+func ParseVersion(s string) (Version, bool) {
+	m := pep440Regex.FindStringSubmatch(s)
+	if m == nil {
+		return Version{}, false
+	}
+	group := func(name string) string { return m[pep440Regex.SubexpIndex(name)] }
+	num := func(s string) int {
+		n, _ := strconv.Atoi(s)
+		return n
+	}
+
+	v := Version{Epoch: num(group("epoch")), Post: -1, Dev: -1}
+	for _, part := range strings.Split(group("release"), ".") {
+		n, _ := new(big.Int).SetString(part, 10)
+		v.Release = append(v.Release, n)
+	}
+	if l := strings.ToLower(group("pre_l")); l != "" {
+		switch l {
+		case "alpha":
+			l = "a"
+		case "beta":
+			l = "b"
+		case "c", "pre", "preview":
+			l = "rc"
+		}
+		v.Pre, v.PreN = l, num(group("pre_n"))
+	}
+	if n := group("post_n1"); n != "" {
+		v.Post = num(n)
+	} else if group("post_l") != "" {
+		v.Post = num(group("post_n2"))
+	}
+	if group("dev_l") != "" {
+		v.Dev = num(group("dev_n"))
+	}
+	if local := group("local"); local != "" {
+		v.Local = strings.FieldsFunc(strings.ToLower(local), func(r rune) bool {
+			return r == '.' || r == '-' || r == '_'
+		})
+	}
+	return v, true
+}
+
+// Compare orders two versions by PEP 440 rules. It returns -1, 0 or 1.
+func (v Version) Compare(o Version) int {
+	if c := compareInt(v.Epoch, o.Epoch); c != 0 {
+		return c
+	}
+
+	// Release segments, ignoring trailing zeros (1.0 == 1.0.0)
+	for i := 0; i < len(v.Release) || i < len(o.Release); i++ {
+		a, b := big.NewInt(0), big.NewInt(0)
+		if i < len(v.Release) {
+			a = v.Release[i]
+		}
+		if i < len(o.Release) {
+			b = o.Release[i]
+		}
+		if c := a.Cmp(b); c != 0 {
+			return c
+		}
+	}
+
+	if c := compareInt(v.preKey(), o.preKey()); c != 0 {
+		return c
+	}
+	if v.Pre != "" && v.PreN != o.PreN {
+		return compareInt(v.PreN, o.PreN)
+	}
+	if c := compareInt(v.Post, o.Post); c != 0 {
+		return c
+	}
+	// A dev release sorts before the corresponding release
+	if c := compareInt(devKey(v.Dev), devKey(o.Dev)); c != 0 {
+		return c
+	}
+	return compareLocal(v.Local, o.Local)
+}
+
+// preKey orders the pre-release phase. A dev release without pre or post
+// segment (1.0.dev1) sorts before any pre-release of the same release.
+func (v Version) preKey() int {
+	switch {
+	case v.Pre == "" && v.Post == -1 && v.Dev != -1:
+		return -1
+	case v.Pre == "a":
+		return 0
+	case v.Pre == "b":
+		return 1
+	case v.Pre == "rc":
+		return 2
+	default:
+		return 3
+	}
+}
+
+func devKey(dev int) int {
+	if dev == -1 {
+		return int(^uint(0) >> 1)
+	}
+	return dev
+}
+
+func compareLocal(a, b []string) int {
+	for i := 0; i < len(a) && i < len(b); i++ {
+		an, aerr := strconv.Atoi(a[i])
+		bn, berr := strconv.Atoi(b[i])
+		switch {
+		case aerr == nil && berr == nil:
+			if c := compareInt(an, bn); c != 0 {
+				return c
+			}
+		case aerr == nil:
+			return 1 // numeric segments sort after alphanumeric ones
+		case berr == nil:
+			return -1
+		default:
+			if c := strings.Compare(a[i], b[i]); c != 0 {
+				return c
+			}
+		}
+	}
+	return compareInt(len(a), len(b))
+}
+
+func compareInt(a, b int) int {
+	switch {
+	case a < b:
+		return -1
+	case a > b:
+		return 1
+	}
+	return 0
+}
+
+// CompareVersionStrings compares two PEP 440 version strings, falling back to
+// a plain string comparison when either is not a valid version.
+func CompareVersionStrings(a, b string) int {
+	va, okA := ParseVersion(a)
+	vb, okB := ParseVersion(b)
+	if !okA || !okB {
+		return strings.Compare(a, b)
+	}
+	return va.Compare(vb)
+}
@@ -0,0 +1,61 @@
+package deps
+
+import (
+	"fmt"
+	"regexp"
+	"strings"
+)
+
+var nameSeparatorRegex = regexp.MustCompile(`[-_.]+`)
+
+// NormalizeName returns the PEP 503 normalized form of a project name.
+func NormalizeName(name string) string {
+	return strings.ToLower(nameSeparatorRegex.ReplaceAllString(strings.TrimSpace(name), "-"))
+}
+
+// WheelInfo holds the components of a wheel filename (PEP 427).
+type WheelInfo struct {
+	Filename string
+	Name     string // PEP 503 normalized
+	Version  string
+	Build    string
+	PyTags   []string
+	AbiTags  []string
+	PlatTags []string
+}
+
+// ParseWheelFilename splits a wheel filename such as
+// soda_tracking_service-1.0.2-py3-none-any.whl into its components.
+func ParseWheelFilename(filename string) (WheelInfo, error) {
+	if !strings.HasSuffix(filename, ".whl") {
+		return WheelInfo{}, fmt.Errorf("not a wheel: %s", filename)
+	}
+	parts := strings.Split(strings.TrimSuffix(filename, ".whl"), "-")
+	if len(parts) != 5 && len(parts) != 6 {
+		return WheelInfo{}, fmt.Errorf("malformed wheel filename: %s", filename)
+	}
+
+	info := WheelInfo{
+		Filename: filename,
+		Name:     NormalizeName(parts[0]),
+		Version:  parts[1],
+	}
+	if len(parts) == 6 {
+		info.Build = parts[2]
+		parts = append(parts[:2], parts[3:]...)
+	}
+	info.PyTags = strings.Split(parts[2], ".")
+	info.AbiTags = strings.Split(parts[3], ".")
+	info.PlatTags = strings.Split(parts[4], ".")
+	return info, nil
+}
+
+// pinnedSpec extracts name and version from an exact pin like `name==1.2.3`,
+// ignoring extras and environment markers.
+func pinnedSpec(line string) (name, version string, ok bool) {
+	req, err := ParseRequirement(line)
+	if err != nil || req.Version == "" {
+		return "", "", false
+	}
+	return req.Name, req.Version, true
+}
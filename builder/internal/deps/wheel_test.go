@@ -0,0 +1,94 @@
+package deps
+
+import "testing"
+
+func TestParseWheelFilename(t *testing.T) {
+	tests := []struct {
+		filename string
+		name     string
+		version  string
+		valid    bool
+	}{
+		{"soda_tracking_service-1.0.2-py3-none-any.whl", "soda-tracking-service", "1.0.2", true},
+		{"cryptography-44.0.2-cp37-abi3-win_amd64.whl", "cryptography", "44.0.2", true},
+		{"pkg-1.0-1build-cp38-cp38-win_amd64.whl", "pkg", "1.0", true},
+		{"pkg-1.0.tar.gz", "", "", false},
+		{"pkg-1.0-py3.whl", "", "", false},
+	}
+
+	for _, tt := range tests {
+		info, err := ParseWheelFilename(tt.filename)
+		if !tt.valid {
+			if err == nil {
+				t.Errorf("ParseWheelFilename(%q) returned nil, expected error", tt.filename)
+			}
+			continue
+		}
+		if err != nil {
+			t.Errorf("ParseWheelFilename(%q) returned error: %v", tt.filename, err)
+			continue
+		}
+		if info.Name != tt.name || info.Version != tt.version {
+			t.Errorf("ParseWheelFilename(%q) = %s %s, expected %s %s", tt.filename, info.Name, info.Version, tt.name, tt.version)
+		}
+	}
+}
+
+func TestPinnedSpec(t *testing.T) {
+	tests := []struct {
+		line    string
+		name    string
+		version string
+		ok      bool
+	}{
+		{"annotated-types==0.7.0", "annotated-types", "0.7.0", true},
+		{"Soda_Tracking.Service==1.0.2", "soda-tracking-service", "1.0.2", true},
+		{"uvicorn[standard]==0.33.0", "uvicorn", "0.33.0", true},
+		{`colorama==0.4.6 ; sys_platform == "win32"`, "colorama", "0.4.6", true},
+		{"requests>=2.0", "", "", false},
+		{"/home/soda/src/soda-tracking-service", "", "", false},
+	}
+
+	for _, tt := range tests {
+		name, version, ok := pinnedSpec(tt.line)
+		if ok != tt.ok || name != tt.name || version != tt.version {
+			t.Errorf("pinnedSpec(%q) = %q, %q, %v; expected %q, %q, %v", tt.line, name, version, ok, tt.name, tt.version, tt.ok)
+		}
+	}
+}
+
+func TestSelectWheel(t *testing.T) {
+	files := []IndexFile{
+		{Filename: "cryptography-44.0.2-cp37-abi3-manylinux_2_28_x86_64.whl"},
+		{Filename: "cryptography-44.0.2-cp37-abi3-win_amd64.whl"},
+		{Filename: "cryptography-44.0.2-cp39-abi3-win_amd64.whl"},
+		{Filename: "cryptography-44.0.2.tar.gz"},
+		{Filename: "pydantic_core-2.27.2-cp38-cp38-win_amd64.whl"},
+		{Filename: "pydantic_core-2.27.2-cp38-none-any.whl", Yanked: true},
+		{Filename: "six-1.17.0-py2.py3-none-any.whl"},
+	}
+
+	tests := []struct {
+		name     string
+		version  string
+		expected string
+	}{
+		{"cryptography", "44.0.2", "cryptography-44.0.2-cp37-abi3-win_amd64.whl"},
+		{"pydantic-core", "2.27.2", "pydantic_core-2.27.2-cp38-cp38-win_amd64.whl"},
+		{"six", "1.17.0", "six-1.17.0-py2.py3-none-any.whl"},
+		{"six", "1.16.0", ""},
+	}
+
+	for _, tt := range tests {
+		f, err := selectWheel(files, tt.name, tt.version)
+		if tt.expected == "" {
+			if err == nil {
+				t.Errorf("selectWheel(%s==%s) = %s, expected error", tt.name, tt.version, f.Filename)
+			}
+			continue
+		}
+		if err != nil || f.Filename != tt.expected {
+			t.Errorf("selectWheel(%s==%s) = %q, %v; expected %q", tt.name, tt.version, f.Filename, err, tt.expected)
+		}
+	}
+}
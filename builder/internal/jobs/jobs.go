@@ -0,0 +1,250 @@
+// Package jobs runs builder commands submitted to a long-running process.
+package jobs
+
+import (
+	"bytes"
+	"errors"
+	"fmt"
+	"strings"
+	"sync"
+	"time"
+)
+
+// ErrQueueFull is returned by Submit when the queue holds its capacity of
+// waiting jobs.
+var ErrQueueFull = errors.New("job queue is full")
+
+// ErrClosed is returned by Submit after Close.
+var ErrClosed = errors.New("job queue is closed")
+
+// maxFinished is the number of finished jobs kept for status queries.
+const maxFinished = 256
+
+// State is the lifecycle stage of a job.
+type State string
+
+const (
+	Queued    State = "queued"
+	Running   State = "running"
+	Succeeded State = "succeeded"
+	Failed    State = "failed"
+)
+
+// Job is one command line submitted to the queue.
+type Job struct {
+	ID   string
+	Args []string
+
+	mu       sync.Mutex
+	state    State
+	err      error
+	output   bytes.Buffer
+	created  time.Time
+	started  time.Time
+	finished time.Time
+	done     chan struct{}
+}
+
+// Status is a point-in-time copy of a job, as served by the API.
+type Status struct {
+	ID       string     `json:"id"`
+	Args     []string   `json:"args"`
+	State    State      `json:"state"`
+	Error    string     `json:"error,omitempty"`
+	Created  time.Time  `json:"created"`
+	Started  *time.Time `json:"started,omitempty"`
+	Finished *time.Time `json:"finished,omitempty"`
+}
+
+// Status returns the current state of the job.
+func (j *Job) Status() Status {
+	j.mu.Lock()
+	defer j.mu.Unlock()
+	s := Status{ID: j.ID, Args: j.Args, State: j.state, Created: j.created}
+	if j.err != nil {
+		s.Error = j.err.Error()
+	}
+	if !j.started.IsZero() {
+		started := j.started
+		s.Started = &started
+	}
+	if !j.finished.IsZero() {
+		finished := j.finished
+		s.Finished = &finished
+	}
+	return s
+}
+
+// Write appends command output to the job log.
+func (j *Job) Write(p []byte) (int, error) {
+	j.mu.Lock()
+	defer j.mu.Unlock()
+	return j.output.Write(p)
+}
+
+// Output returns the output written so far.
+func (j *Job) Output() []byte {
+	j.mu.Lock()
+	defer j.mu.Unlock()
+	return append([]byte{}, j.output.Bytes()...)
+}
+
+// Done is closed when the job has finished.
+func (j *Job) Done() <-chan struct{} {
+	return j.done
+}
+
+func (j *Job) setState(state State, err error) {
+	j.mu.Lock()
+	defer j.mu.Unlock()
+	j.state = state
+	j.err = err
+	switch state {
+	case Running:
+		j.started = time.Now()
+	case Succeeded, Failed:
+		j.finished = time.Now()
+	}
+}
+
+// RunFunc executes a job, writing its output to the job.
+type RunFunc func(job *Job) error
+
+// Queue runs submitted jobs on a fixed number of workers. A job whose
+// arguments equal those of a queued or running job is not run again: the
+// submitter gets the existing job.
+type Queue struct {
+	run     RunFunc
+	pending chan *Job
+
+	mu     sync.Mutex
+	nextID int
+	jobs   map[string]*Job
+	order  []*Job
+	active map[string]*Job // queued or running, keyed by arguments
+	closed bool
+	wg     sync.WaitGroup
+}
+
+// NewQueue starts workers goroutines running jobs with run. At most
+// capacity jobs wait for a worker.
+func NewQueue(workers, capacity int, run RunFunc) *Queue {
+	if workers < 1 {
+		workers = 1
+	}
+	q := &Queue{
+		run:     run,
+		pending: make(chan *Job, capacity),
+		jobs:    make(map[string]*Job),
+		active:  make(map[string]*Job),
+	}
+	for i := 0; i < workers; i++ {
+		q.wg.Add(1)
+		go q.worker()
+	}
+	return q
+}
+
+func jobKey(args []string) string {
+	return strings.Join(args, "\x00")
+}
+
+// Submit queues a job for args. It returns the already active job for the
+// same arguments instead, with existing set.
+func (q *Queue) Submit(args []string) (job *Job, existing bool, err error) {
+	key := jobKey(args)
+	q.mu.Lock()
+	defer q.mu.Unlock()
+	if q.closed {
+		return nil, false, ErrClosed
+	}
+	if job, ok := q.active[key]; ok {
+		return job, true, nil
+	}
+
+	q.nextID++
+	job = &Job{
+		ID:      fmt.Sprintf("%d", q.nextID),
+		Args:    append([]string{}, args...),
+		state:   Queued,
+		created: time.Now(),
+		done:    make(chan struct{}),
+	}
+	select {
+	case q.pending <- job:
+	default:
+		q.nextID--
+		return nil, false, ErrQueueFull
+	}
+	q.jobs[job.ID] = job
+	q.order = append(q.order, job)
+	q.active[key] = job
+	return job, false, nil
+}
+
+// Get returns the job with the given id.
+func (q *Queue) Get(id string) (*Job, bool) {
+	q.mu.Lock()
+	defer q.mu.Unlock()
+	job, ok := q.jobs[id]
+	return job, ok
+}
+
+// List returns all jobs in submission order.
+func (q *Queue) List() []*Job {
+	q.mu.Lock()
+	defer q.mu.Unlock()
+	return append([]*Job{}, q.order...)
+}
+
+// Close stops accepting jobs and waits for the queued ones to finish.
+func (q *Queue) Close() {
+	q.mu.Lock()
+	if !q.closed {
+		q.closed = true
+		close(q.pending)
+	}
+	q.mu.Unlock()
+	q.wg.Wait()
+}
+
+func (q *Queue) worker() {
+	defer q.wg.Done()
+	for job := range q.pending {
+		job.setState(Running, nil)
+		err := q.run(job)
+
+		if err != nil {
+			job.setState(Failed, err)
+		} else {
+			job.setState(Succeeded, nil)
+		}
+
+		// Later submissions of the same arguments start a new job
+		q.mu.Lock()
+		delete(q.active, jobKey(job.Args))
+		q.prune()
+		q.mu.Unlock()
+		close(job.done)
+	}
+}
+
+// prune forgets the oldest finished jobs beyond maxFinished.
+func (q *Queue) prune() {
+	finished := 0
+	for _, job := range q.order {
+		if q.active[jobKey(job.Args)] != job {
+			finished++
+		}
+	}
+	kept := q.order[:0]
+	for _, job := range q.order {
+		if finished > maxFinished && q.active[jobKey(job.Args)] != job {
+			delete(q.jobs, job.ID)
+			finished--
+			continue
+		}
+		kept = append(kept, job)
+	}
+	q.order = kept
+}
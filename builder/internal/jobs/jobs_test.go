@@ -0,0 +1,84 @@
+package jobs
+
+import (
+	"errors"
+	"fmt"
+	"sync/atomic"
+	"testing"
+)
+
+func TestQueueDeduplicates(t *testing.T) {
+	release := make(chan struct{})
+	var runs atomic.Int32
+	q := NewQueue(1, 4, func(job *Job) error {
+		runs.Add(1)
+		<-release
+		fmt.Fprintf(job, "ran %v\n", job.Args)
+		if job.Args[0] == "fail" {
+			return errors.New("failed")
+		}
+		return nil
+	})
+
+	first, existing, err := q.Submit([]string{"build-installer"})
+	if err != nil || existing {
+		t.Fatalf("Submit = %v, %v", existing, err)
+	}
+	again, existing, err := q.Submit([]string{"build-installer"})
+	if err != nil || !existing || again != first {
+		t.Errorf("identical job was not deduplicated: %v, %v", existing, err)
+	}
+	failing, _, err := q.Submit([]string{"fail"})
+	if err != nil {
+		t.Fatal(err)
+	}
+	close(release)
+	<-first.Done()
+	<-failing.Done()
+
+	if runs.Load() != 2 {
+		t.Errorf("%d runs, expected 2", runs.Load())
+	}
+	if s := first.Status(); s.State != Succeeded || s.Finished == nil {
+		t.Errorf("status = %+v", s)
+	}
+	if s := failing.Status(); s.State != Failed || s.Error != "failed" {
+		t.Errorf("status = %+v", s)
+	}
+	if string(first.Output()) != "ran [build-installer]\n" {
+		t.Errorf("output = %q", first.Output())
+	}
+
+	// A finished job is run again when resubmitted
+	next, existing, err := q.Submit([]string{"build-installer"})
+	if err != nil || existing || next == first {
+		t.Errorf("resubmitted job = %v, %v", existing, err)
+	}
+	q.Close()
+	if _, _, err := q.Submit([]string{"build-installer"}); !errors.Is(err, ErrClosed) {
+		t.Errorf("Submit after Close = %v", err)
+	}
+}
+
+func TestQueueFull(t *testing.T) {
+	release := make(chan struct{})
+	started := make(chan struct{}, 3)
+	q := NewQueue(1, 1, func(job *Job) error {
+		started <- struct{}{}
+		<-release
+		return nil
+	})
+	defer q.Close()
+	defer close(release)
+
+	if _, _, err := q.Submit([]string{"a"}); err != nil {
+		t.Fatal(err)
+	}
+	<-started
+	if _, _, err := q.Submit([]string{"b"}); err != nil {
+		t.Fatal(err)
+	}
+	if _, _, err := q.Submit([]string{"c"}); !errors.Is(err, ErrQueueFull) {
+		t.Errorf("Submit to a full queue = %v", err)
+	}
+}
@@ -0,0 +1,188 @@
+package nsis
+
+import (
+	"bufio"
+	"crypto/sha256"
+	"encoding/hex"
+	"fmt"
+	"io"
+	"os"
+	"path/filepath"
+	"regexp"
+	"sort"
+	"strings"
+
+	"builder/internal/config"
+	"builder/internal/utils"
+)
+
+// compileCacheKey fingerprints everything that determines the compiled
+// installer: the makensis version, the final script, the defines (except the
+// output path), the plugin DLLs and the content of every file the script
+// packs with File.
+func compileCacheKey(version string, script []byte, scriptDir, pluginDir string, defines map[string]string) (string, error) {
+	h := sha256.New()
+	fmt.Fprintf(h, "makensis %s\n", version)
+	fmt.Fprintf(h, "script %x\n", sha256.Sum256(script))
+
+	keys := make([]string, 0, len(defines))
+	for k := range defines {
+		if k != "INSTALLER_OUTPUT" {
+			keys = append(keys, k)
+		}
+	}
+	sort.Strings(keys)
+	for _, k := range keys {
+		fmt.Fprintf(h, "define %s=%s\n", k, defines[k])
+	}
+
+	files := referencedFiles(script, scriptDir, defines)
+	if pluginDir != "" {
+		plugins, _ := filepath.Glob(filepath.Join(pluginDir, "*.dll"))
+		files = append(files, plugins...)
+	}
+	sort.Strings(files)
+	sums := make([]string, len(files))
+	err := utils.ForEachParallel(len(files), 8, func(i int) error {
+		sums[i] = hashPath(files[i])
+		return nil
+	})
+	if err != nil {
+		return "", err
+	}
+	for i, f := range files {
+		fmt.Fprintf(h, "file %s %s\n", f, sums[i])
+	}
+	return hex.EncodeToString(h.Sum(nil)), nil
+}
+
+var (
+	defineRefRegex  = regexp.MustCompile(`\$\{(\w+)\}`)
+	scriptDefRegex  = regexp.MustCompile(`^!define\s+(\w+)\s+"?([^"]*)"?`)
+	fileTokensRegex = regexp.MustCompile(`"[^"]*"|'[^']*'|\S+`)
+)
+
+// referencedFiles lists the files packed by the script's File commands, with
+// ${DEFINE} references expanded. Wildcard and /r arguments are expanded to
+// every file below their directory, which may include a few more files than
+// makensis packs but never fewer.
+func referencedFiles(script []byte, scriptDir string, defines map[string]string) []string {
+	values := make(map[string]string)
+	var commands []string
+	scanner := bufio.NewScanner(strings.NewReader(string(script)))
+	for scanner.Scan() {
+		line := strings.TrimSpace(scanner.Text())
+		if m := scriptDefRegex.FindStringSubmatch(line); m != nil {
+			if _, ok := values[m[1]]; !ok {
+				values[m[1]] = m[2]
+			}
+		}
+		if len(line) > 5 && strings.EqualFold(line[:5], "File ") {
+			commands = append(commands, line[5:])
+		}
+	}
+	// Command-line defines win over the script's !ifndef defaults
+	for k, v := range defines {
+		values[k] = v
+	}
+
+	seen := make(map[string]bool)
+	var files []string
+	add := func(p string) {
+		if !seen[p] {
+			seen[p] = true
+			files = append(files, p)
+		}
+	}
+	for _, args := range commands {
+		recursive := false
+		source := ""
+		for _, tok := range fileTokensRegex.FindAllString(args, -1) {
+			tok = strings.Trim(tok, `"'`)
+			lower := strings.ToLower(tok)
+			switch {
+			case lower == "/r":
+				recursive = true
+			case lower == "/a", lower == "/nonfatal", lower == "/x", strings.HasPrefix(lower, "/oname="):
+			default:
+				// The source is the last argument; /x patterns before it are overwritten
+				source = tok
+			}
+		}
+		if source == "" {
+			continue
+		}
+		source = defineRefRegex.ReplaceAllStringFunc(source, func(ref string) string {
+			if v, ok := values[ref[2:len(ref)-1]]; ok {
+				return v
+			}
+			return ref
+		})
+		source = filepath.FromSlash(strings.ReplaceAll(source, `\`, "/"))
+		if !filepath.IsAbs(source) {
+			source = filepath.Join(scriptDir, source)
+		}
+
+		dir, base := source, ""
+		if strings.ContainsAny(filepath.Base(source), "*?") {
+			dir, base = filepath.Dir(source), filepath.Base(source)
+		}
+		if info, err := os.Stat(dir); err == nil && info.IsDir() && (recursive || base == "*") {
+			filepath.Walk(dir, func(p string, info os.FileInfo, err error) error {
+				if err == nil && info.Mode().IsRegular() {
+					add(p)
+				}
+				return nil
+			})
+			continue
+		}
+		if base != "" {
+			matches, _ := filepath.Glob(source)
+			for _, m := range matches {
+				add(m)
+			}
+			continue
+		}
+		add(source)
+	}
+	return files
+}
+
+func hashPath(p string) string {
+	f, err := os.Open(p)
+	if err != nil {
+		return "missing"
+	}
+	defer f.Close()
+	h := sha256.New()
+	if _, err := io.Copy(h, f); err != nil {
+		return "unreadable"
+	}
+	return hex.EncodeToString(h.Sum(nil))
+}
+
+func compileCachePath(key string) string {
+	return filepath.Join(config.GetCacheDir(), "nsis", key+".exe")
+}
+
+// restoreCompiled places a cached installer at output; it reports false on a miss.
+func restoreCompiled(key, output string) bool {
+	cached := compileCachePath(key)
+	if _, err := os.Stat(cached); err != nil {
+		return false
+	}
+	os.Remove(output)
+	if err := utils.LinkOrCopy(cached, output); err != nil {
+		return false
+	}
+	return true
+}
+
+// storeCompiled adds a freshly compiled installer to the cache.
+func storeCompiled(key, output string) error {
+	cached := compileCachePath(key)
+	if err := os.MkdirAll(filepath.Dir(cached), 0755); err != nil {
+		return err
+	}
+	return utils.LinkOrCopy(output, cached)
+}
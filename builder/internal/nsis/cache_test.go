@@ -0,0 +1,43 @@
+package nsis
+
+import (
+	"os"
+	"path/filepath"
+	"reflect"
+	"sort"
+	"testing"
+)
+
+func TestReferencedFiles(t *testing.T) {
+	dir := t.TempDir()
+	for _, name := range []string{"res/a.exe", "res/b.py", "pkgs/x.whl", "pkgs/sub/y.whl", "build/upgrade.txt"} {
+		p := filepath.Join(dir, filepath.FromSlash(name))
+		os.MkdirAll(filepath.Dir(p), 0755)
+		os.WriteFile(p, []byte(name), 0644)
+	}
+
+	script := []byte(`!ifndef RESOURCES_DIR
+  !define RESOURCES_DIR "res"
+!endif
+  File "${RESOURCES_DIR}/a.exe"
+  File /oname=$PLUGINSDIR\b.py "${RESOURCES_DIR}\b.py"
+  File /r "${PACKAGES_DIR}"
+  file "upgrade.txt"
+  FileWrite $0 "not a file command"
+`)
+	got := referencedFiles(script, filepath.Join(dir, "build"), map[string]string{
+		"PACKAGES_DIR":  filepath.Join(dir, "pkgs"),
+		"RESOURCES_DIR": filepath.Join(dir, "res"),
+	})
+	expected := []string{
+		filepath.Join(dir, "build/upgrade.txt"),
+		filepath.Join(dir, "pkgs/sub/y.whl"),
+		filepath.Join(dir, "pkgs/x.whl"),
+		filepath.Join(dir, "res/a.exe"),
+		filepath.Join(dir, "res/b.py"),
+	}
+	sort.Strings(got)
+	if !reflect.DeepEqual(got, expected) {
+		t.Errorf("referencedFiles =\n%v\nexpected\n%v", got, expected)
+	}
+}
@@ -1,6 +1,7 @@
 package nsis
 
 import (
+	"bytes"
 	"fmt"
 	"os"
 	"os/exec"
@@ -8,6 +9,8 @@ import (
 	"runtime"
 	"strings"
 
+	"builder/internal/config"
+	"builder/internal/trace"
 	"builder/internal/utils"
 	"github.com/spf13/viper"
 )
@@ -35,7 +38,20 @@ func FindMakensis() (string, error) {
 	return "", fmt.Errorf("makensis not found")
 }
 
-func GenerateUpgradeScript(fromVer, toVer, outputDir string) (string, error) {
+// pruneWheelCache returns the script lines deleting the given wheel file
+// name patterns from the client wheel cache.
+func pruneWheelCache(patterns []string, indent string) string {
+	var b strings.Builder
+	for _, p := range patterns {
+		fmt.Fprintf(&b, "%sDelete \"$INSTDIR\\wheels\\%s\"\n", indent, p)
+	}
+	return b.String()
+}
+
+// GenerateUpgradeScript writes the script of the fromVer -> toVer upgrade.
+// staleWheels are the wheel file name patterns the upgrade removes from the
+// client wheel cache (see deps.SnapshotDiff.StaleWheelPatterns).
+func GenerateUpgradeScript(fromVer, toVer string, staleWheels []string, outputDir string) (string, error) {
 	// Get resources dir for template
 	resDir := "resources"
 	configFile := viper.ConfigFileUsed()
@@ -52,6 +68,7 @@ func GenerateUpgradeScript(fromVer, toVer, outputDir string) (string, error) {
 	scriptContent := string(content)
 	scriptContent = strings.ReplaceAll(scriptContent, "%%FROM_VERSION%%", fromVer)
 	scriptContent = strings.ReplaceAll(scriptContent, "%%TO_VERSION%%", toVer)
+	scriptContent = strings.ReplaceAll(scriptContent, "%%PRUNE_WHEEL_CACHE%%\n", pruneWheelCache(staleWheels, "  "))
 
 	destPath := filepath.Join(outputDir, fmt.Sprintf("upgrade_%s_to_%s.nsi", fromVer, toVer))
 	err = os.WriteFile(destPath, []byte(scriptContent), 0644)
@@ -61,7 +78,108 @@ func GenerateUpgradeScript(fromVer, toVer, outputDir string) (string, error) {
 	return destPath, nil
 }
 
+// CumulativeUpgrade is the part of a cumulative upgrade installer that
+// upgrades one older version. Paths are relative to the build directory.
+type CumulativeUpgrade struct {
+	FromVersion string `json:"from_version"`
+	// Wheels are the packages pip installs, one path per file
+	Wheels           []string `json:"wheels"`
+	RequirementsFile string   `json:"requirements_file"`
+	// UninstallFile and Deltas are empty when the upgrade has none
+	UninstallFile string   `json:"uninstall_file,omitempty"`
+	Deltas        []string `json:"deltas,omitempty"`
+	// StaleWheels are the wheel file name patterns removed from the client
+	// wheel cache after the upgrade
+	StaleWheels []string `json:"stale_wheels,omitempty"`
+}
+
+// GenerateCumulativeScript writes the script of an installer that upgrades
+// any of the given versions to toVer. Every wheel is packed once, in its own
+// function; the installer calls the functions of the installed version only.
+func GenerateCumulativeScript(toVer string, upgrades []CumulativeUpgrade, outputDir string) (string, error) {
+	resDir := "resources"
+	configFile := viper.ConfigFileUsed()
+	if configFile != "" {
+		resDir = filepath.Dir(configFile)
+	}
+
+	tplPath := filepath.Join(resDir, "cumulative_template.nsi")
+	content, err := os.ReadFile(tplPath)
+	if err != nil {
+		return "", fmt.Errorf("failed to read template %s: %w", tplPath, err)
+	}
+
+	var fns strings.Builder
+	var fromVers []string
+	wheelFuncs := make(map[string]string)
+	for _, u := range upgrades {
+		fromVers = append(fromVers, u.FromVersion)
+		for _, w := range u.Wheels {
+			base := filepath.Base(w)
+			if _, ok := wheelFuncs[base]; ok {
+				continue
+			}
+			wheelFuncs[base] = fmt.Sprintf("ExtractWheel%d", len(wheelFuncs))
+			fmt.Fprintf(&fns, "Function %s\n  File \"%s\"\nFunctionEnd\n", wheelFuncs[base], filepath.ToSlash(w))
+		}
+	}
+	fmt.Fprintf(&fns, "!define FROM_VERSIONS \"%s\"\n", strings.Join(fromVers, ", "))
+
+	fns.WriteString("Function FindUpgrade\n  StrCpy $UPGRADE_INDEX \"\"\n")
+	for i, u := range upgrades {
+		fmt.Fprintf(&fns, "  ${If} $FROM_VERSION == \"%s\"\n    StrCpy $UPGRADE_INDEX %d\n  ${EndIf}\n", u.FromVersion, i)
+	}
+	fns.WriteString("FunctionEnd\n")
+
+	fns.WriteString("Function ExtractUpgrade\n")
+	for i, u := range upgrades {
+		fmt.Fprintf(&fns, "  ${If} $UPGRADE_INDEX == %d\n", i)
+		fns.WriteString("    SetOutPath \"$INSTDIR\\packages_upgrade_cumulative\"\n")
+		for _, w := range u.Wheels {
+			fmt.Fprintf(&fns, "    Call %s\n", wheelFuncs[filepath.Base(w)])
+		}
+		fns.WriteString("    SetOutPath \"$INSTDIR\"\n")
+		fmt.Fprintf(&fns, "    File \"/oname=requirements_upgrade_cumulative.txt\" \"%s\"\n", filepath.ToSlash(u.RequirementsFile))
+		if u.UninstallFile != "" {
+			fmt.Fprintf(&fns, "    File \"/oname=uninstall_upgrade_cumulative.txt\" \"%s\"\n", filepath.ToSlash(u.UninstallFile))
+		}
+		if len(u.Deltas) > 0 {
+			fns.WriteString("    SetOutPath \"$INSTDIR\\deltas_upgrade_cumulative\"\n")
+			for _, d := range u.Deltas {
+				fmt.Fprintf(&fns, "    File \"%s\"\n", filepath.ToSlash(d))
+			}
+		}
+		fns.WriteString("  ${EndIf}\n")
+	}
+	fns.WriteString("FunctionEnd\n")
+
+	fns.WriteString("Function PruneWheelCache\n")
+	for i, u := range upgrades {
+		if len(u.StaleWheels) == 0 {
+			continue
+		}
+		fmt.Fprintf(&fns, "  ${If} $UPGRADE_INDEX == %d\n", i)
+		fns.WriteString(pruneWheelCache(u.StaleWheels, "    "))
+		fns.WriteString("  ${EndIf}\n")
+	}
+	fns.WriteString("FunctionEnd\n")
+
+	scriptContent := string(content)
+	scriptContent = strings.ReplaceAll(scriptContent, "%%TO_VERSION%%", toVer)
+	scriptContent = strings.ReplaceAll(scriptContent, "%%UPGRADE_FUNCTIONS%%", fns.String())
+
+	destPath := filepath.Join(outputDir, fmt.Sprintf("upgrade_cumulative_to_%s.nsi", toVer))
+	if err := os.WriteFile(destPath, []byte(scriptContent), 0644); err != nil {
+		return "", fmt.Errorf("failed to write script %s: %w", destPath, err)
+	}
+	return destPath, nil
+}
+
 func CompileNSIS(scriptPath string, defines map[string]string) error {
+	span := trace.Start("makensis")
+	span.SetAttr("script", filepath.Base(scriptPath))
+	defer span.End()
+
 	makensis, err := FindMakensis()
 	if err != nil {
 		return err
@@ -78,42 +196,59 @@ func CompileNSIS(scriptPath string, defines map[string]string) error {
 		prefix = "-"
 	}
 
-	// Create temp script with BOM and potential injection
-	tempScript := strings.TrimSuffix(scriptPath, ".nsi") + ".temp.nsi"
-	f, err := os.Create(tempScript)
+	// Use absolute path to resources dir if possible, or relative
+	resDir := "resources"
+	configFile := viper.ConfigFileUsed()
+	if configFile != "" {
+		resDir = filepath.Dir(configFile)
+	}
+	absResDir, err := filepath.Abs(resDir)
 	if err != nil {
-		return err
+		return fmt.Errorf("failed to get absolute path for resources: %w", err)
 	}
-	
+
+	// Build temp script with BOM and potential injection
+	var script bytes.Buffer
+
 	// Write UTF-8 BOM
-	f.Write([]byte{0xEF, 0xBB, 0xBF})
-	
+	script.Write([]byte{0xEF, 0xBB, 0xBF})
+
 	// Inject !addplugindir for Linux
 	if runtime.GOOS == "linux" {
-		// Use absolute path to resources dir if possible, or relative
-		resDir := "resources"
-		configFile := viper.ConfigFileUsed()
-		if configFile != "" {
-			resDir = filepath.Dir(configFile)
-		}
-		absResDir, err := filepath.Abs(resDir)
-		if err != nil {
-			f.Close()
-			return fmt.Errorf("failed to get absolute path for resources: %w", err)
-		}
-		
 		sanitizedPath, err := utils.SanitizeNSISPath(absResDir)
 		if err != nil {
-			f.Close()
 			return fmt.Errorf("failed to sanitize resources path: %w", err)
 		}
 
 		// Escape backslashes for NSIS if on Windows, but this is Linux block
 		// NSIS string escaping?
-		fmt.Fprintf(f, "!addplugindir %s\n", sanitizedPath)
+		fmt.Fprintf(&script, "!addplugindir %s\n", sanitizedPath)
+	}
+	script.Write(content)
+
+	// Reuse the installer from an identical earlier compilation
+	output := defines["INSTALLER_OUTPUT"]
+	cacheKey := ""
+	if output != "" && config.GetNSISCache() {
+		if version, err := exec.Command(makensis, prefix+"VERSION").Output(); err == nil {
+			key, err := compileCacheKey(strings.TrimSpace(string(version)), script.Bytes(), filepath.Dir(scriptPath), absResDir, defines)
+			if err == nil {
+				if restoreCompiled(key, output) {
+					span.SetAttr("cache", "hit")
+					fmt.Println("makensis cache hit:", output)
+					return nil
+				}
+				cacheKey = key
+			}
+		}
+		// The previous output may be a hardlink into the cache; never write through it
+		os.Remove(output)
+	}
+
+	tempScript := strings.TrimSuffix(scriptPath, ".nsi") + ".temp.nsi"
+	if err := os.WriteFile(tempScript, script.Bytes(), 0644); err != nil {
+		return err
 	}
-	f.Write(content)
-	f.Close()
 	defer os.Remove(tempScript)
 
 	// Build arguments
@@ -135,5 +270,17 @@ func CompileNSIS(scriptPath string, defines map[string]string) error {
 	cmd.Stderr = os.Stderr
 	
 	fmt.Printf("Compiling: %s %v\n", makensis, args)
-	return cmd.Run()
+	if err := span.Run(cmd); err != nil {
+		return err
+	}
+	if fi, err := os.Stat(output); err == nil {
+		span.AddFiles(1)
+		span.AddBytes(fi.Size())
+	}
+	if cacheKey != "" {
+		if err := storeCompiled(cacheKey, output); err != nil {
+			fmt.Println("Warning: failed to cache compiled installer:", err)
+		}
+	}
+	return nil
 }
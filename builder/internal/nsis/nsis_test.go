@@ -0,0 +1,92 @@
+package nsis
+
+import (
+	"os"
+	"path/filepath"
+	"strings"
+	"testing"
+)
+
+func TestGenerateCumulativeScript(t *testing.T) {
+	// Without a config file the template is read from ./resources
+	dir := t.TempDir()
+	tpl := "!define TO_VERSION \"%%TO_VERSION%%\"\n%%UPGRADE_FUNCTIONS%%\n"
+	os.MkdirAll(filepath.Join(dir, "resources"), 0755)
+	if err := os.WriteFile(filepath.Join(dir, "resources", "cumulative_template.nsi"), []byte(tpl), 0644); err != nil {
+		t.Fatal(err)
+	}
+	wd, _ := os.Getwd()
+	os.Chdir(dir)
+	defer os.Chdir(wd)
+
+	path, err := GenerateCumulativeScript("20", []CumulativeUpgrade{
+		{
+			FromVersion:      "18",
+			Wheels:           []string{"packages_upgrade_18_to_20/a-2.0-py3-none-any.whl", "packages_upgrade_18_to_20/b-2.0-py3-none-any.whl"},
+			RequirementsFile: "requirements_upgrade_18_to_20.txt",
+			UninstallFile:    "uninstall_upgrade_18_to_20.txt",
+			StaleWheels:      []string{"a-1.0-*.whl", "c-1.0-*.whl"},
+		},
+		{
+			FromVersion:      "19",
+			Wheels:           []string{"packages_upgrade_19_to_20/b-2.0-py3-none-any.whl"},
+			RequirementsFile: "requirements_upgrade_19_to_20.txt",
+		},
+	}, dir)
+	if err != nil {
+		t.Fatal(err)
+	}
+	data, err := os.ReadFile(path)
+	if err != nil {
+		t.Fatal(err)
+	}
+	script := string(data)
+	if strings.Contains(script, "%%") {
+		t.Error("unreplaced placeholder in script")
+	}
+	// b is needed by both versions but packed once
+	if n := strings.Count(script, "b-2.0-py3-none-any.whl\""); n != 1 {
+		t.Errorf("b packed %d times", n)
+	}
+	if n := strings.Count(script, "Call ExtractWheel1"); n != 2 {
+		t.Errorf("b extracted by %d upgrades, expected 2", n)
+	}
+	for _, want := range []string{
+		`!define FROM_VERSIONS "18, 19"`,
+		`${If} $FROM_VERSION == "19"`,
+		`File "/oname=uninstall_upgrade_cumulative.txt" "uninstall_upgrade_18_to_20.txt"`,
+		"  ${If} $UPGRADE_INDEX == 0\n    Delete \"$INSTDIR\\wheels\\a-1.0-*.whl\"\n    Delete \"$INSTDIR\\wheels\\c-1.0-*.whl\"\n  ${EndIf}\nFunctionEnd",
+	} {
+		if !strings.Contains(script, want) {
+			t.Errorf("script lacks %s", want)
+		}
+	}
+	if strings.Contains(script, "uninstall_upgrade_19_to_20.txt") {
+		t.Error("uninstall list packed for an upgrade without removals")
+	}
+}
+
+func TestGenerateUpgradeScript(t *testing.T) {
+	dir := t.TempDir()
+	tpl := "!define FROM_VERSION \"%%FROM_VERSION%%\"\nFunction PruneWheelCache\n%%PRUNE_WHEEL_CACHE%%\nFunctionEnd\n"
+	os.MkdirAll(filepath.Join(dir, "resources"), 0755)
+	if err := os.WriteFile(filepath.Join(dir, "resources", "upgrade_template.nsi"), []byte(tpl), 0644); err != nil {
+		t.Fatal(err)
+	}
+	wd, _ := os.Getwd()
+	os.Chdir(dir)
+	defer os.Chdir(wd)
+
+	path, err := GenerateUpgradeScript("19", "20", []string{"a-1.0-*.whl"}, dir)
+	if err != nil {
+		t.Fatal(err)
+	}
+	data, err := os.ReadFile(path)
+	if err != nil {
+		t.Fatal(err)
+	}
+	expected := "!define FROM_VERSION \"19\"\nFunction PruneWheelCache\n  Delete \"$INSTDIR\\wheels\\a-1.0-*.whl\"\nFunctionEnd\n"
+	if string(data) != expected {
+		t.Errorf("script =\n%s\nexpected\n%s", data, expected)
+	}
+}
@@ -0,0 +1,93 @@
+package payload
+
+import (
+	"fmt"
+	"os"
+	"os/exec"
+	"path"
+	"path/filepath"
+	"strings"
+
+	"builder/internal/trace"
+)
+
+// pycTag is the cache tag of the client's embedded Python.
+const pycTag = "cpython-38"
+
+// FindPython38 returns a CPython 3.8 interpreter for compiling bytecode: the
+// configured path if set, otherwise python3.8 on PATH, otherwise one managed
+// by uv. Bytecode is version specific, so no other version is accepted.
+func FindPython38(configured string) (string, error) {
+	var candidates []string
+	if configured != "" {
+		candidates = append(candidates, configured)
+	} else {
+		if p, err := exec.LookPath("python3.8"); err == nil {
+			candidates = append(candidates, p)
+		}
+		if uv, err := exec.LookPath("uv"); err == nil {
+			if out, err := exec.Command(uv, "python", "find", "3.8").Output(); err == nil {
+				candidates = append(candidates, strings.TrimSpace(string(out)))
+			}
+		}
+	}
+
+	for _, p := range candidates {
+		out, err := exec.Command(p, "-c", "import sys; print('%d.%d' % sys.version_info[:2])").Output()
+		if err == nil && strings.TrimSpace(string(out)) == "3.8" {
+			return p, nil
+		}
+	}
+	return "", fmt.Errorf("no Python 3.8 interpreter found (set python38 in config.toml, or install python3.8 or uv)")
+}
+
+// CompileBytecode compiles every module in the payload's site-packages with
+// python, using unchecked-hash pycs: the client never stats or rehashes the
+// sources, and the files stay valid whatever mtimes the installer gives them.
+// Source paths in the bytecode (tracebacks, logging, warnings) name the
+// modules under clientRoot, where root is installed on the client, instead
+// of the build directory.
+// It then adds the .pyc files to their dists' records and returns how many
+// were added. Modules that fail to compile (e.g. Python 2 test fixtures some
+// packages ship) are left without bytecode, as pip does.
+func CompileBytecode(python string, dists []*Dist, root, clientRoot string, workers int) (int, error) {
+	cmd := exec.Command(python, "-m", "compileall", "-q",
+		"-j", fmt.Sprint(workers),
+		"--invalidation-mode", "unchecked-hash",
+		"-d", path.Join(clientRoot, SitePackages),
+		filepath.Join(root, filepath.FromSlash(SitePackages)))
+	cmd.Stdout = os.Stdout
+	cmd.Stderr = os.Stderr
+	span := trace.Start("compileall")
+	err := span.Run(cmd)
+	span.End()
+	if err != nil {
+		if _, ok := err.(*exec.ExitError); !ok {
+			return 0, err
+		}
+		fmt.Println("Warning: some modules could not be compiled and are shipped without bytecode")
+	}
+
+	added := 0
+	for _, d := range dists {
+		var pycs []RecordEntry
+		for _, f := range d.Files {
+			if !strings.HasPrefix(f.Path, SitePackages+"/") || !strings.HasSuffix(f.Path, ".py") {
+				continue
+			}
+			dir, file := path.Split(f.Path)
+			pyc := dir + "__pycache__/" + strings.TrimSuffix(file, ".py") + "." + pycTag + ".pyc"
+			data, err := os.ReadFile(filepath.Join(root, filepath.FromSlash(pyc)))
+			if os.IsNotExist(err) {
+				continue
+			}
+			if err != nil {
+				return added, err
+			}
+			pycs = append(pycs, NewRecordEntry(pyc, data))
+		}
+		d.Files = append(d.Files, pycs...)
+		added += len(pycs)
+	}
+	return added, nil
+}
@@ -0,0 +1,337 @@
+// Package payload expands wheels into a ready-made Python environment tree
+// (Lib/site-packages and Scripts) that an installer can extract as-is
+// instead of running pip on the client.
+package payload
+
+import (
+	"archive/zip"
+	"crypto/sha256"
+	"encoding/base64"
+	"encoding/csv"
+	"fmt"
+	"io"
+	"os"
+	"path"
+	"path/filepath"
+	"sort"
+	"strings"
+	"sync"
+
+	"builder/internal/deps"
+	"builder/internal/utils"
+)
+
+// Layout of the embedded Python on the client, relative to its root.
+const (
+	SitePackages = "Lib/site-packages"
+	ScriptsDir   = "Scripts"
+)
+
+// installerName is written to each dist-info/INSTALLER file.
+const installerName = "phis-builder"
+
+// RecordEntry is one line of a RECORD file. Path is relative to the payload
+// root, using forward slashes.
+type RecordEntry struct {
+	Path string
+	Hash string
+	Size int64
+}
+
+// Dist is a wheel expanded into the payload.
+type Dist struct {
+	Name     string
+	Version  string
+	DistInfo string // dist-info directory relative to the payload root
+	Files    []RecordEntry
+}
+
+// Build expands every wheel into root and writes their RECORD files.
+func Build(wheels []string, root string, workers int) ([]*Dist, error) {
+	dists, err := Expand(wheels, root, workers)
+	if err != nil {
+		return nil, err
+	}
+	if err := WriteRecords(dists, root); err != nil {
+		return nil, err
+	}
+	return dists, nil
+}
+
+// Expand unpacks the wheels into root concurrently. RECORD files are not
+// written, so callers can add files (e.g. compiled bytecode) first.
+func Expand(wheels []string, root string, workers int) ([]*Dist, error) {
+	owners := &fileOwners{owner: make(map[string]string)}
+	dists := make([]*Dist, len(wheels))
+	err := utils.ForEachParallel(len(wheels), workers, func(i int) error {
+		d, err := installWheel(wheels[i], root, owners)
+		if err != nil {
+			return fmt.Errorf("%s: %w", filepath.Base(wheels[i]), err)
+		}
+		dists[i] = d
+		return nil
+	})
+	if err != nil {
+		return nil, err
+	}
+	return dists, nil
+}
+
+// fileOwners detects two wheels installing the same file.
+type fileOwners struct {
+	mu    sync.Mutex
+	owner map[string]string
+}
+
+func (o *fileOwners) claim(p, wheel string) error {
+	o.mu.Lock()
+	defer o.mu.Unlock()
+	key := strings.ToLower(p) // the client filesystem is case-insensitive
+	if prev, ok := o.owner[key]; ok && prev != wheel {
+		return fmt.Errorf("%s is also installed by %s", p, prev)
+	}
+	o.owner[key] = wheel
+	return nil
+}
+
+func installWheel(wheelPath, root string, owners *fileOwners) (*Dist, error) {
+	info, err := deps.ParseWheelFilename(filepath.Base(wheelPath))
+	if err != nil {
+		return nil, err
+	}
+	if !supportedPlatform(info.PlatTags) {
+		return nil, fmt.Errorf("platform %s cannot be installed on win_amd64", strings.Join(info.PlatTags, "."))
+	}
+
+	zr, err := zip.OpenReader(wheelPath)
+	if err != nil {
+		return nil, err
+	}
+	defer zr.Close()
+
+	distInfo, err := findDistInfo(zr.File)
+	if err != nil {
+		return nil, err
+	}
+	dataDir := strings.TrimSuffix(distInfo, ".dist-info") + ".data"
+	d := &Dist{
+		Name:     info.Name,
+		Version:  info.Version,
+		DistInfo: SitePackages + "/" + distInfo,
+	}
+
+	var entryPoints *zip.File
+	for _, f := range zr.File {
+		if strings.HasSuffix(f.Name, "/") {
+			continue
+		}
+		name := f.Name
+		if !safePath(name) {
+			return nil, fmt.Errorf("unsafe path in wheel: %s", name)
+		}
+		switch name {
+		case distInfo + "/RECORD", distInfo + "/RECORD.jws", distInfo + "/RECORD.p7s":
+			continue // replaced by the RECORD written for the installed files
+		case distInfo + "/entry_points.txt":
+			entryPoints = f
+		}
+
+		dest, err := destination(name, dataDir, info.Name)
+		if err != nil {
+			return nil, err
+		}
+		if err := owners.claim(dest, info.Filename); err != nil {
+			return nil, err
+		}
+		entry, err := extractFile(f, root, dest)
+		if err != nil {
+			return nil, err
+		}
+		d.Files = append(d.Files, entry)
+	}
+
+	if entryPoints != nil {
+		scripts, err := readEntryPoints(entryPoints)
+		if err != nil {
+			return nil, err
+		}
+		for _, s := range scripts {
+			entries, err := writeLaunchers(root, s, owners, info.Filename)
+			if err != nil {
+				return nil, err
+			}
+			d.Files = append(d.Files, entries...)
+		}
+	}
+
+	entry, err := writeFile(root, d.DistInfo+"/INSTALLER", []byte(installerName+"\n"))
+	if err != nil {
+		return nil, err
+	}
+	d.Files = append(d.Files, entry)
+	return d, nil
+}
+
+func supportedPlatform(tags []string) bool {
+	for _, tag := range tags {
+		if tag == "any" || tag == "win_amd64" {
+			return true
+		}
+	}
+	return false
+}
+
+// findDistInfo returns the name of the wheel's top-level .dist-info directory.
+func findDistInfo(files []*zip.File) (string, error) {
+	found := ""
+	for _, f := range files {
+		top, rest, ok := strings.Cut(f.Name, "/")
+		if !ok || rest != "WHEEL" || !strings.HasSuffix(top, ".dist-info") {
+			continue
+		}
+		if found != "" && found != top {
+			return "", fmt.Errorf("multiple .dist-info directories")
+		}
+		found = top
+	}
+	if found == "" {
+		return "", fmt.Errorf("no .dist-info directory")
+	}
+	return found, nil
+}
+
+func safePath(name string) bool {
+	if strings.Contains(name, "\\") || path.IsAbs(name) || strings.Contains(name, ":") {
+		return false
+	}
+	for _, part := range strings.Split(name, "/") {
+		if part == ".." {
+			return false
+		}
+	}
+	return true
+}
+
+// destination maps a wheel member to its install location, following the
+// Windows install scheme for the .data directory.
+func destination(name, dataDir, distName string) (string, error) {
+	rest, ok := strings.CutPrefix(name, dataDir+"/")
+	if !ok {
+		return SitePackages + "/" + name, nil
+	}
+	scheme, sub, _ := strings.Cut(rest, "/")
+	switch scheme {
+	case "purelib", "platlib":
+		return SitePackages + "/" + sub, nil
+	case "scripts":
+		return ScriptsDir + "/" + sub, nil
+	case "headers":
+		return "Include/" + distName + "/" + sub, nil
+	case "data":
+		return sub, nil
+	}
+	return "", fmt.Errorf("unknown .data scheme %q", scheme)
+}
+
+func extractFile(f *zip.File, root, dest string) (RecordEntry, error) {
+	rc, err := f.Open()
+	if err != nil {
+		return RecordEntry{}, err
+	}
+	defer rc.Close()
+
+	target := filepath.Join(root, filepath.FromSlash(dest))
+	if err := os.MkdirAll(filepath.Dir(target), 0755); err != nil {
+		return RecordEntry{}, err
+	}
+	out, err := os.Create(target)
+	if err != nil {
+		return RecordEntry{}, err
+	}
+	h := sha256.New()
+	n, err := io.Copy(io.MultiWriter(out, h), rc)
+	if cerr := out.Close(); err == nil {
+		err = cerr
+	}
+	if err != nil {
+		return RecordEntry{}, fmt.Errorf("extracting %s: %w", f.Name, err)
+	}
+	return RecordEntry{Path: dest, Hash: recordHash(h.Sum(nil)), Size: n}, nil
+}
+
+// ExtractZip unpacks a plain zip archive (such as the embeddable Python
+// distribution) into root.
+func ExtractZip(zipPath, root string) error {
+	zr, err := zip.OpenReader(zipPath)
+	if err != nil {
+		return err
+	}
+	defer zr.Close()
+	for _, f := range zr.File {
+		if strings.HasSuffix(f.Name, "/") {
+			continue
+		}
+		if !safePath(f.Name) {
+			return fmt.Errorf("unsafe path in %s: %s", filepath.Base(zipPath), f.Name)
+		}
+		if _, err := extractFile(f, root, f.Name); err != nil {
+			return err
+		}
+	}
+	return nil
+}
+
+func writeFile(root, dest string, data []byte) (RecordEntry, error) {
+	target := filepath.Join(root, filepath.FromSlash(dest))
+	if err := os.MkdirAll(filepath.Dir(target), 0755); err != nil {
+		return RecordEntry{}, err
+	}
+	if err := os.WriteFile(target, data, 0644); err != nil {
+		return RecordEntry{}, err
+	}
+	return NewRecordEntry(dest, data), nil
+}
+
+// NewRecordEntry returns the RECORD entry for a file with the given content.
+func NewRecordEntry(dest string, data []byte) RecordEntry {
+	sum := sha256.Sum256(data)
+	return RecordEntry{Path: dest, Hash: recordHash(sum[:]), Size: int64(len(data))}
+}
+
+func recordHash(sum []byte) string {
+	return "sha256=" + base64.RawURLEncoding.EncodeToString(sum)
+}
+
+// WriteRecords writes dist-info/RECORD for every dist. Paths are written
+// relative to site-packages, as pip does.
+func WriteRecords(dists []*Dist, root string) error {
+	for _, d := range dists {
+		recordPath := d.DistInfo + "/RECORD"
+		files := append([]RecordEntry{}, d.Files...)
+		sort.Slice(files, func(i, j int) bool { return files[i].Path < files[j].Path })
+
+		var sb strings.Builder
+		w := csv.NewWriter(&sb)
+		w.UseCRLF = false
+		for _, f := range files {
+			w.Write([]string{relToSitePackages(f.Path), f.Hash, fmt.Sprint(f.Size)})
+		}
+		w.Write([]string{relToSitePackages(recordPath), "", ""})
+		w.Flush()
+		if err := w.Error(); err != nil {
+			return err
+		}
+		target := filepath.Join(root, filepath.FromSlash(recordPath))
+		if err := os.WriteFile(target, []byte(sb.String()), 0644); err != nil {
+			return err
+		}
+	}
+	return nil
+}
+
+func relToSitePackages(p string) string {
+	if rest, ok := strings.CutPrefix(p, SitePackages+"/"); ok {
+		return rest
+	}
+	return "../../" + p
+}
@@ -0,0 +1,153 @@
+package payload
+
+import (
+	"archive/zip"
+	"encoding/binary"
+	"os"
+	"os/exec"
+	"path/filepath"
+	"strings"
+	"testing"
+)
+
+func writeWheel(t *testing.T, dir, filename string, files map[string]string) string {
+	t.Helper()
+	p := filepath.Join(dir, filename)
+	f, err := os.Create(p)
+	if err != nil {
+		t.Fatal(err)
+	}
+	zw := zip.NewWriter(f)
+	for name, content := range files {
+		w, err := zw.Create(name)
+		if err != nil {
+			t.Fatal(err)
+		}
+		w.Write([]byte(content))
+	}
+	if err := zw.Close(); err != nil {
+		t.Fatal(err)
+	}
+	f.Close()
+	return p
+}
+
+func TestBuild(t *testing.T) {
+	dir := t.TempDir()
+	wheel := writeWheel(t, dir, "demo_pkg-1.0-py3-none-any.whl", map[string]string{
+		"demo_pkg/__init__.py":                    "VALUE = 1\n",
+		"demo_pkg-1.0.dist-info/METADATA":         "Name: demo-pkg\nVersion: 1.0\n",
+		"demo_pkg-1.0.dist-info/WHEEL":            "Wheel-Version: 1.0\nRoot-Is-Purelib: true\n",
+		"demo_pkg-1.0.dist-info/RECORD":           "stale\n",
+		"demo_pkg-1.0.dist-info/entry_points.txt": "[console_scripts]\ndemo = demo_pkg.cli:main [extra]\n",
+		"demo_pkg-1.0.data/scripts/helper.py":     "print('hi')\n",
+		"demo_pkg-1.0.data/data/share/demo.txt":   "data\n",
+	})
+
+	root := filepath.Join(dir, "payload")
+	dists, err := Build([]string{wheel}, root, 2)
+	if err != nil {
+		t.Fatalf("Build returned error: %v", err)
+	}
+	if len(dists) != 1 || dists[0].Name != "demo-pkg" {
+		t.Fatalf("unexpected dists %+v", dists)
+	}
+
+	for _, p := range []string{
+		"Lib/site-packages/demo_pkg/__init__.py",
+		"Lib/site-packages/demo_pkg-1.0.dist-info/INSTALLER",
+		"Scripts/helper.py",
+		"Scripts/demo.cmd",
+		"Scripts/demo-script.py",
+		"share/demo.txt",
+	} {
+		if _, err := os.Stat(filepath.Join(root, p)); err != nil {
+			t.Errorf("missing %s", p)
+		}
+	}
+
+	script, _ := os.ReadFile(filepath.Join(root, "Scripts/demo-script.py"))
+	if !strings.Contains(string(script), "from demo_pkg.cli import main") {
+		t.Errorf("unexpected launcher script:\n%s", script)
+	}
+
+	record, err := os.ReadFile(filepath.Join(root, "Lib/site-packages/demo_pkg-1.0.dist-info/RECORD"))
+	if err != nil {
+		t.Fatal(err)
+	}
+	for _, line := range []string{
+		"demo_pkg/__init__.py,sha256=",
+		"../../Scripts/demo.cmd,sha256=",
+		"../../share/demo.txt,sha256=",
+		"demo_pkg-1.0.dist-info/RECORD,,",
+	} {
+		if !strings.Contains(string(record), line) {
+			t.Errorf("RECORD is missing %q:\n%s", line, record)
+		}
+	}
+	if strings.Contains(string(record), "stale") {
+		t.Errorf("RECORD from the wheel was copied:\n%s", record)
+	}
+
+	other := writeWheel(t, dir, "other-2.0-cp38-cp38-win_amd64.whl", map[string]string{
+		"demo_pkg/__init__.py":      "",
+		"other-2.0.dist-info/WHEEL": "Wheel-Version: 1.0\n",
+	})
+	if _, err := Build([]string{wheel, other}, filepath.Join(dir, "conflict"), 1); err == nil {
+		t.Errorf("Build accepted two wheels installing the same file")
+	}
+
+	linux := writeWheel(t, dir, "native-1.0-cp38-cp38-manylinux1_x86_64.whl", map[string]string{
+		"native-1.0.dist-info/WHEEL": "Wheel-Version: 1.0\n",
+	})
+	if _, err := Build([]string{linux}, filepath.Join(dir, "linux"), 1); err == nil {
+		t.Errorf("Build accepted a manylinux wheel")
+	}
+}
+
+func TestCompileBytecode(t *testing.T) {
+	python, err := FindPython38("")
+	if err != nil {
+		t.Skip(err)
+	}
+	dir := t.TempDir()
+	wheel := writeWheel(t, dir, "demo-1.0-py3-none-any.whl", map[string]string{
+		"demo/__init__.py":         "VALUE = 1\n",
+		"demo/legacy.py":           "print 'python 2'\n",
+		"demo-1.0.dist-info/WHEEL": "Wheel-Version: 1.0\n",
+	})
+	root := filepath.Join(dir, "payload")
+	dists, err := Expand([]string{wheel}, root, 1)
+	if err != nil {
+		t.Fatal(err)
+	}
+	n, err := CompileBytecode(python, dists, root, "C:/app/python38-embed", 1)
+	if err != nil || n != 1 {
+		t.Fatalf("CompileBytecode = %d, %v, expected 1 module", n, err)
+	}
+	if err := WriteRecords(dists, root); err != nil {
+		t.Fatal(err)
+	}
+
+	pyc, err := os.ReadFile(filepath.Join(root, "Lib/site-packages/demo/__pycache__/__init__.cpython-38.pyc"))
+	if err != nil {
+		t.Fatal(err)
+	}
+	// PEP 552 flags: hash-based (bit 0) without source checking (bit 1)
+	if flags := binary.LittleEndian.Uint32(pyc[4:8]); flags != 1 {
+		t.Errorf("pyc flags = %d, expected unchecked-hash", flags)
+	}
+	// The source path recorded in the code object is the client's, not the build directory's
+	out, err := exec.Command(python, "-c", "import marshal, sys; f = open(sys.argv[1], 'rb'); f.seek(16); print(marshal.load(f).co_filename)",
+		filepath.Join(root, "Lib/site-packages/demo/__pycache__/__init__.cpython-38.pyc")).Output()
+	if err != nil {
+		t.Fatal(err)
+	}
+	if filename := strings.TrimSpace(string(out)); filename != "C:/app/python38-embed/Lib/site-packages/demo/__init__.py" {
+		t.Errorf("co_filename = %q, expected the client path", filename)
+	}
+	record, _ := os.ReadFile(filepath.Join(root, "Lib/site-packages/demo-1.0.dist-info/RECORD"))
+	if !strings.Contains(string(record), "demo/__pycache__/__init__.cpython-38.pyc,sha256=") {
+		t.Errorf("RECORD is missing the pyc:\n%s", record)
+	}
+}
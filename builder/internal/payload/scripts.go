@@ -0,0 +1,101 @@
+package payload
+
+import (
+	"archive/zip"
+	"bufio"
+	"fmt"
+	"strings"
+)
+
+// entryPoint is a console_scripts or gui_scripts entry.
+type entryPoint struct {
+	Name   string
+	Module string
+	Attr   string
+	GUI    bool
+}
+
+// readEntryPoints parses the script sections of entry_points.txt.
+func readEntryPoints(f *zip.File) ([]entryPoint, error) {
+	rc, err := f.Open()
+	if err != nil {
+		return nil, err
+	}
+	defer rc.Close()
+
+	var scripts []entryPoint
+	section := ""
+	scanner := bufio.NewScanner(rc)
+	for scanner.Scan() {
+		line := strings.TrimSpace(scanner.Text())
+		if line == "" || strings.HasPrefix(line, "#") || strings.HasPrefix(line, ";") {
+			continue
+		}
+		if strings.HasPrefix(line, "[") && strings.HasSuffix(line, "]") {
+			section = strings.TrimSpace(line[1 : len(line)-1])
+			continue
+		}
+		if section != "console_scripts" && section != "gui_scripts" {
+			continue
+		}
+		name, value, ok := strings.Cut(line, "=")
+		if !ok {
+			continue
+		}
+		// "module:attr [extra]"; extras only matter to the resolver
+		if i := strings.Index(value, "["); i >= 0 {
+			value = value[:i]
+		}
+		module, attr, ok := strings.Cut(strings.TrimSpace(value), ":")
+		if !ok {
+			continue
+		}
+		scripts = append(scripts, entryPoint{
+			Name:   strings.TrimSpace(name),
+			Module: strings.TrimSpace(module),
+			Attr:   strings.TrimSpace(attr),
+			GUI:    section == "gui_scripts",
+		})
+	}
+	return scripts, scanner.Err()
+}
+
+const scriptTemplate = `# -*- coding: utf-8 -*-
+import re
+import sys
+from %s import %s
+if __name__ == "__main__":
+    sys.argv[0] = re.sub(r"(-script\.pyw?|\.cmd)$", "", sys.argv[0])
+    sys.exit(%s())
+`
+
+// writeLaunchers writes Scripts/<name>-script.py and a Scripts/<name>.cmd
+// that runs it with the interpreter one directory up. pip's .exe launchers
+// embed the absolute interpreter path, which is unknown until install time.
+func writeLaunchers(root string, ep entryPoint, owners *fileOwners, wheel string) ([]RecordEntry, error) {
+	importName, _, _ := strings.Cut(ep.Attr, ".")
+	script := fmt.Sprintf(scriptTemplate, ep.Module, importName, ep.Attr)
+
+	python, ext, launch := "python.exe", ".py", "@"
+	if ep.GUI {
+		python, ext, launch = "pythonw.exe", ".pyw", `@start "" `
+	}
+	scriptName := ep.Name + "-script" + ext
+	cmd := fmt.Sprintf("%s\"%%~dp0..\\%s\" \"%%~dp0%s\" %%*\r\n", launch, python, scriptName)
+
+	var entries []RecordEntry
+	for _, f := range []struct{ name, data string }{
+		{ScriptsDir + "/" + scriptName, script},
+		{ScriptsDir + "/" + ep.Name + ".cmd", cmd},
+	} {
+		if err := owners.claim(f.name, wheel); err != nil {
+			return nil, err
+		}
+		entry, err := writeFile(root, f.name, []byte(f.data))
+		if err != nil {
+			return nil, err
+		}
+		entries = append(entries, entry)
+	}
+	return entries, nil
+}
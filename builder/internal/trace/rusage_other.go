@@ -0,0 +1,10 @@
+//go:build !linux && !darwin
+
+package trace
+
+import "os"
+
+// maxRSSKB is not available on this platform.
+func maxRSSKB(state *os.ProcessState) int64 {
+	return 0
+}
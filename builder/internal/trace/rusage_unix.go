@@ -0,0 +1,21 @@
+//go:build linux || darwin
+
+package trace
+
+import (
+	"os"
+	"runtime"
+	"syscall"
+)
+
+// maxRSSKB returns the peak resident set size of a finished child in KiB.
+func maxRSSKB(state *os.ProcessState) int64 {
+	ru, ok := state.SysUsage().(*syscall.Rusage)
+	if !ok {
+		return 0
+	}
+	if runtime.GOOS == "darwin" {
+		return int64(ru.Maxrss) / 1024 // bytes on macOS
+	}
+	return int64(ru.Maxrss)
+}
@@ -0,0 +1,293 @@
+// Package trace records timed spans for the stages of a builder run, with
+// bytes transferred, files written and the peak RSS of child processes, and
+// writes them as JSON lines or as a Chrome trace (chrome://tracing, Perfetto).
+//
+// Spans are always recorded; they are cheap, and only written out when a
+// trace file was requested.
+package trace
+
+import (
+	"encoding/json"
+	"os"
+	"os/exec"
+	"sort"
+	"sync"
+	"sync/atomic"
+	"time"
+)
+
+// Span is one timed stage. All methods are safe for concurrent use and
+// no-ops on a nil span.
+type Span struct {
+	ID     int64
+	Parent int64
+	Name   string
+	Start  time.Time
+
+	end      time.Time
+	lane     int
+	bytes    atomic.Int64
+	files    atomic.Int64
+	maxRSSKB atomic.Int64
+
+	mu    sync.Mutex
+	attrs map[string]string
+}
+
+var (
+	mu     sync.Mutex
+	spans  []*Span
+	nextID int64
+	// lanes[i] is true while a span occupies Chrome trace thread i, so that
+	// concurrent spans are drawn on separate rows
+	lanes []bool
+)
+
+// Start begins a top-level span.
+func Start(name string) *Span {
+	return start(name, 0)
+}
+
+// Child begins a child span of s.
+func (s *Span) Child(name string) *Span {
+	if s == nil {
+		return Start(name)
+	}
+	return start(name, s.ID)
+}
+
+func start(name string, parent int64) *Span {
+	mu.Lock()
+	defer mu.Unlock()
+	nextID++
+	lane := 0
+	for lane < len(lanes) && lanes[lane] {
+		lane++
+	}
+	if lane == len(lanes) {
+		lanes = append(lanes, false)
+	}
+	lanes[lane] = true
+	s := &Span{ID: nextID, Parent: parent, Name: name, Start: time.Now(), lane: lane}
+	spans = append(spans, s)
+	return s
+}
+
+// Reset discards the recorded spans, so that a long-running process can
+// trace each unit of work on its own.
+func Reset() {
+	mu.Lock()
+	defer mu.Unlock()
+	spans = nil
+	// Spans left open by an aborted command never free their lanes
+	lanes = nil
+}
+
+// End finishes the span. Ending a span twice keeps the first end time.
+func (s *Span) End() {
+	if s == nil {
+		return
+	}
+	mu.Lock()
+	defer mu.Unlock()
+	if s.end.IsZero() {
+		s.end = time.Now()
+		if s.lane < len(lanes) {
+			lanes[s.lane] = false
+		}
+	}
+}
+
+// AddBytes records n bytes transferred or written by the stage.
+func (s *Span) AddBytes(n int64) {
+	if s != nil {
+		s.bytes.Add(n)
+	}
+}
+
+// AddFiles records n files written by the stage.
+func (s *Span) AddFiles(n int) {
+	if s != nil {
+		s.files.Add(int64(n))
+	}
+}
+
+// SetAttr attaches a free-form attribute, e.g. a cache hit or a package name.
+func (s *Span) SetAttr(key, value string) {
+	if s == nil {
+		return
+	}
+	s.mu.Lock()
+	defer s.mu.Unlock()
+	if s.attrs == nil {
+		s.attrs = make(map[string]string)
+	}
+	s.attrs[key] = value
+}
+
+// Run runs cmd and records the peak RSS of the child process on the span.
+func (s *Span) Run(cmd *exec.Cmd) error {
+	err := cmd.Run()
+	if s != nil && cmd.ProcessState != nil {
+		if rss := maxRSSKB(cmd.ProcessState); rss > 0 {
+			for {
+				cur := s.maxRSSKB.Load()
+				if rss <= cur || s.maxRSSKB.CompareAndSwap(cur, rss) {
+					break
+				}
+			}
+		}
+	}
+	return err
+}
+
+// Record is the JSON form of a finished span, as written by WriteJSONLines.
+type Record struct {
+	ID         int64             `json:"id"`
+	Parent     int64             `json:"parent,omitempty"`
+	Name       string            `json:"name"`
+	Start      time.Time         `json:"start"`
+	DurationMS float64           `json:"duration_ms"`
+	Bytes      int64             `json:"bytes,omitempty"`
+	Files      int64             `json:"files,omitempty"`
+	MaxRSSKB   int64             `json:"child_max_rss_kb,omitempty"`
+	Attrs      map[string]string `json:"attrs,omitempty"`
+}
+
+// snapshot returns the spans in start order, closing any still open.
+func snapshot() []Record {
+	mu.Lock()
+	now := time.Now()
+	list := append([]*Span{}, spans...)
+	ends := make([]time.Time, len(list))
+	for i, s := range list {
+		ends[i] = s.end
+		if ends[i].IsZero() {
+			ends[i] = now
+		}
+	}
+	mu.Unlock()
+
+	records := make([]Record, len(list))
+	for i, s := range list {
+		s.mu.Lock()
+		var attrs map[string]string
+		if len(s.attrs) > 0 {
+			attrs = make(map[string]string, len(s.attrs))
+			for k, v := range s.attrs {
+				attrs[k] = v
+			}
+		}
+		s.mu.Unlock()
+		records[i] = Record{
+			ID:         s.ID,
+			Parent:     s.Parent,
+			Name:       s.Name,
+			Start:      s.Start,
+			DurationMS: float64(ends[i].Sub(s.Start).Microseconds()) / 1000,
+			Bytes:      s.bytes.Load(),
+			Files:      s.files.Load(),
+			MaxRSSKB:   s.maxRSSKB.Load(),
+			Attrs:      attrs,
+		}
+	}
+	sort.SliceStable(records, func(i, j int) bool { return records[i].Start.Before(records[j].Start) })
+	return records
+}
+
+// WriteJSONLines writes one JSON object per span to path.
+func WriteJSONLines(path string) error {
+	f, err := os.Create(path)
+	if err != nil {
+		return err
+	}
+	enc := json.NewEncoder(f)
+	for _, r := range snapshot() {
+		if err := enc.Encode(r); err != nil {
+			f.Close()
+			return err
+		}
+	}
+	return f.Close()
+}
+
+// ReadJSONLines reads the spans written by WriteJSONLines.
+func ReadJSONLines(path string) ([]Record, error) {
+	f, err := os.Open(path)
+	if err != nil {
+		return nil, err
+	}
+	defer f.Close()
+	var records []Record
+	dec := json.NewDecoder(f)
+	for dec.More() {
+		var r Record
+		if err := dec.Decode(&r); err != nil {
+			return nil, err
+		}
+		records = append(records, r)
+	}
+	return records, nil
+}
+
+// chromeEvent is a complete ("X") event of the Chrome trace event format.
+type chromeEvent struct {
+	Name string         `json:"name"`
+	Ph   string         `json:"ph"`
+	TS   int64          `json:"ts"`
+	Dur  int64          `json:"dur"`
+	PID  int            `json:"pid"`
+	TID  int            `json:"tid"`
+	Args map[string]any `json:"args,omitempty"`
+}
+
+// WriteChrome writes the spans as a Chrome trace to path.
+func WriteChrome(path string) error {
+	records := snapshot()
+	mu.Lock()
+	laneOf := make(map[int64]int, len(spans))
+	for _, s := range spans {
+		laneOf[s.ID] = s.lane
+	}
+	mu.Unlock()
+
+	var origin time.Time
+	if len(records) > 0 {
+		origin = records[0].Start
+	}
+	events := make([]chromeEvent, 0, len(records))
+	for _, r := range records {
+		args := make(map[string]any)
+		if r.Bytes > 0 {
+			args["bytes"] = r.Bytes
+		}
+		if r.Files > 0 {
+			args["files"] = r.Files
+		}
+		if r.MaxRSSKB > 0 {
+			args["child_max_rss_kb"] = r.MaxRSSKB
+		}
+		for k, v := range r.Attrs {
+			args[k] = v
+		}
+		events = append(events, chromeEvent{
+			Name: r.Name,
+			Ph:   "X",
+			TS:   r.Start.Sub(origin).Microseconds(),
+			Dur:  int64(r.DurationMS * 1000),
+			PID:  1,
+			TID:  laneOf[r.ID],
+			Args: args,
+		})
+	}
+
+	f, err := os.Create(path)
+	if err != nil {
+		return err
+	}
+	if err := json.NewEncoder(f).Encode(map[string]any{"traceEvents": events}); err != nil {
+		f.Close()
+		return err
+	}
+	return f.Close()
+}
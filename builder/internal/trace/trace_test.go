@@ -0,0 +1,79 @@
+package trace
+
+import (
+	"encoding/json"
+	"os"
+	"os/exec"
+	"path/filepath"
+	"testing"
+)
+
+func TestSpans(t *testing.T) {
+	root := Start("build")
+	a := root.Child("download")
+	b := root.Child("resolve")
+	a.AddBytes(100)
+	a.AddBytes(50)
+	a.AddFiles(2)
+	b.SetAttr("cache", "hit")
+	if sh, err := exec.LookPath("sh"); err == nil {
+		b.Run(exec.Command(sh, "-c", "true"))
+	}
+	a.End()
+	b.End()
+	root.End()
+
+	var nilSpan *Span
+	nilSpan.AddBytes(1)
+	nilSpan.End()
+
+	dir := t.TempDir()
+	jsonPath := filepath.Join(dir, "trace.jsonl")
+	if err := WriteJSONLines(jsonPath); err != nil {
+		t.Fatal(err)
+	}
+	records, err := ReadJSONLines(jsonPath)
+	if err != nil {
+		t.Fatal(err)
+	}
+	got := make(map[string]Record)
+	for _, r := range records {
+		got[r.Name] = r
+	}
+	if got["download"].Bytes != 150 || got["download"].Files != 2 || got["download"].Parent != got["build"].ID {
+		t.Errorf("unexpected download span %+v", got["download"])
+	}
+	if got["resolve"].Attrs["cache"] != "hit" {
+		t.Errorf("unexpected resolve span %+v", got["resolve"])
+	}
+
+	chromePath := filepath.Join(dir, "trace.json")
+	if err := WriteChrome(chromePath); err != nil {
+		t.Fatal(err)
+	}
+	var chrome struct {
+		TraceEvents []chromeEvent `json:"traceEvents"`
+	}
+	data, _ := os.ReadFile(chromePath)
+	if err := json.Unmarshal(data, &chrome); err != nil || len(chrome.TraceEvents) != 3 {
+		t.Fatalf("unexpected chrome trace (%v): %s", err, data)
+	}
+	// Concurrent siblings must not share a row
+	lanes := make(map[string]int)
+	for _, e := range chrome.TraceEvents {
+		lanes[e.Name] = e.TID
+	}
+	if lanes["download"] == lanes["resolve"] {
+		t.Errorf("overlapping spans drawn on the same row: %v", lanes)
+	}
+}
+
+func TestResetFreesLanes(t *testing.T) {
+	Start("aborted") // never ended, as after exit() in a serve job
+	Reset()
+	s := Start("next")
+	defer s.End()
+	if s.lane != 0 {
+		t.Errorf("span after Reset on lane %d, expected 0", s.lane)
+	}
+}
@@ -0,0 +1,167 @@
+package utils
+
+import (
+	"crypto/sha256"
+	"encoding/hex"
+	"fmt"
+	"io"
+	"net/http"
+	"os"
+	"strings"
+	"time"
+)
+
+// downloadAttempts is how often DownloadFile resumes a dropped transfer.
+const downloadAttempts = 5
+
+// DownloadFile downloads url to dest through dest+".part", resuming a partial
+// file left by an earlier attempt or run with an HTTP Range request. A
+// partial file is only resumed when the server's ETag or Last-Modified,
+// stored next to it, still matches (If-Range); otherwise the download starts
+// over, so a resource that changed in between is never spliced. When sha256
+// is set the finished file must match it. dest only appears once the
+// download is complete and verified. It returns the number of bytes
+// transferred by this call.
+func DownloadFile(client *http.Client, url, dest, sha256 string) (int64, error) {
+	part := dest + ".part"
+	validator := part + ".validator"
+	var transferred int64
+	var err error
+	for attempt := 1; attempt <= downloadAttempts; attempt++ {
+		var n int64
+		var done bool
+		n, done, err = fetchPart(client, url, part, sha256 != "")
+		transferred += n
+		if done {
+			break
+		}
+		if attempt < downloadAttempts {
+			fmt.Printf("Download of %s interrupted (%v), resuming...\n", url, err)
+			time.Sleep(time.Duration(attempt) * time.Second)
+		}
+	}
+	if err != nil {
+		return transferred, err
+	}
+
+	if sha256 != "" {
+		got, err := FileSHA256(part)
+		if err != nil {
+			return transferred, err
+		}
+		if !strings.EqualFold(got, sha256) {
+			// A corrupt partial file must not be resumed again
+			os.Remove(part)
+			os.Remove(validator)
+			return transferred, fmt.Errorf("sha256 mismatch for %s: expected %s, got %s", url, sha256, got)
+		}
+	}
+	if err := os.Rename(part, dest); err != nil {
+		return transferred, err
+	}
+	os.Remove(validator)
+	return transferred, nil
+}
+
+// fetchPart appends the rest of url to part. It reports done once the file
+// is complete; otherwise the error says why the transfer stopped. pinned
+// says the caller verifies the finished file against a sha256.
+func fetchPart(client *http.Client, url, part string, pinned bool) (int64, bool, error) {
+	validatorFile := part + ".validator"
+	var offset int64
+	var validator string
+	if info, err := os.Stat(part); err == nil {
+		offset = info.Size()
+	}
+	if data, err := os.ReadFile(validatorFile); err == nil {
+		validator = strings.TrimSpace(string(data))
+	}
+
+	req, err := http.NewRequest(http.MethodGet, url, nil)
+	if err != nil {
+		return 0, true, err
+	}
+	if offset > 0 && validator != "" {
+		// The server ignores the range, and sends the whole resource, if it
+		// changed since the partial file was started
+		req.Header.Set("Range", fmt.Sprintf("bytes=%d-", offset))
+		req.Header.Set("If-Range", validator)
+	}
+	resp, err := client.Do(req)
+	if err != nil {
+		return 0, false, err
+	}
+	defer resp.Body.Close()
+
+	flags := os.O_WRONLY | os.O_CREATE
+	switch {
+	case resp.StatusCode == http.StatusPartialContent && req.Header.Get("Range") != "":
+		flags |= os.O_APPEND
+	case resp.StatusCode == http.StatusOK:
+		// Nothing to resume, no range support or a changed resource: start
+		// over, remembering what this transfer can later be resumed against
+		flags |= os.O_TRUNC
+		if err := writeValidator(validatorFile, resp.Header); err != nil {
+			return 0, true, err
+		}
+	case resp.StatusCode == http.StatusRequestedRangeNotSatisfiable && req.Header.Get("Range") != "":
+		if pinned {
+			// The partial file may hold the whole resource; the sha256
+			// check decides
+			return 0, true, nil
+		}
+		// Nothing can confirm the partial file is complete
+		os.Remove(part)
+		os.Remove(validatorFile)
+		return fetchPart(client, url, part, pinned)
+	default:
+		return 0, true, fmt.Errorf("bad status: %s", resp.Status)
+	}
+
+	out, err := os.OpenFile(part, flags, 0644)
+	if err != nil {
+		return 0, true, err
+	}
+	n, err := io.Copy(out, resp.Body)
+	if cerr := out.Close(); err == nil {
+		err = cerr
+	}
+	if err != nil {
+		return n, false, err
+	}
+	if resp.ContentLength >= 0 && n != resp.ContentLength {
+		return n, false, fmt.Errorf("short read: got %d of %d bytes", n, resp.ContentLength)
+	}
+	return n, true, nil
+}
+
+// writeValidator stores the strong ETag, or else the Last-Modified date, of
+// a response for resuming it with If-Range; without either a partial file
+// is never resumed.
+func writeValidator(path string, header http.Header) error {
+	validator := header.Get("ETag")
+	if validator == "" || strings.HasPrefix(validator, "W/") {
+		validator = header.Get("Last-Modified")
+	}
+	if validator == "" {
+		if err := os.Remove(path); err != nil && !os.IsNotExist(err) {
+			return err
+		}
+		return nil
+	}
+	return os.WriteFile(path, []byte(validator+"\n"), 0644)
+}
+
+// FileSHA256 returns the hex sha256 of the file at path.
+func FileSHA256(path string) (string, error) {
+	f, err := os.Open(path)
+	if err != nil {
+		return "", err
+	}
+	defer f.Close()
+	h := sha256.New()
+	if _, err := io.Copy(h, f); err != nil {
+		return "", err
+	}
+	return hex.EncodeToString(h.Sum(nil)), nil
+}
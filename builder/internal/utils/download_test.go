@@ -0,0 +1,95 @@
+package utils
+
+import (
+	"bytes"
+	"crypto/sha256"
+	"encoding/hex"
+	"net/http"
+	"net/http/httptest"
+	"os"
+	"path/filepath"
+	"strings"
+	"testing"
+	"time"
+)
+
+func TestDownloadFile(t *testing.T) {
+	content := bytes.Repeat([]byte("0123456789abcdef"), 4096)
+	sum := sha256.Sum256(content)
+	want := hex.EncodeToString(sum[:])
+
+	var ranges []string
+	srv := httptest.NewServer(http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
+		ranges = append(ranges, r.Header.Get("Range"))
+		w.Header().Set("ETag", `"v2"`)
+		http.ServeContent(w, r, "res.bin", time.Time{}, bytes.NewReader(content))
+	}))
+	defer srv.Close()
+
+	dir := t.TempDir()
+	dest := filepath.Join(dir, "res.bin")
+	// A previous run left the first half behind
+	if err := os.WriteFile(dest+".part", content[:len(content)/2], 0644); err != nil {
+		t.Fatal(err)
+	}
+	if err := os.WriteFile(dest+".part.validator", []byte(`"v2"`+"\n"), 0644); err != nil {
+		t.Fatal(err)
+	}
+	n, err := DownloadFile(srv.Client(), srv.URL, dest, strings.ToUpper(want))
+	if err != nil {
+		t.Fatal(err)
+	}
+	if n != int64(len(content)/2) || len(ranges) != 1 || ranges[0] != "bytes=32768-" {
+		t.Errorf("expected a resumed transfer of the second half, got %d bytes with ranges %q", n, ranges)
+	}
+	got, _ := os.ReadFile(dest)
+	if !bytes.Equal(got, content) {
+		t.Error("downloaded content differs")
+	}
+	for _, p := range []string{dest + ".part", dest + ".part.validator"} {
+		if _, err := os.Stat(p); !os.IsNotExist(err) {
+			t.Errorf("%s left behind", filepath.Base(p))
+		}
+	}
+
+	// A partial file of an older version of the resource, or one without a
+	// validator, is never spliced with the current one
+	for _, validator := range []string{`"v1"`, ""} {
+		ranges = nil
+		changed := filepath.Join(dir, "changed.bin")
+		os.WriteFile(changed+".part", bytes.Repeat([]byte("x"), len(content)/2), 0644)
+		os.Remove(changed + ".part.validator")
+		if validator != "" {
+			os.WriteFile(changed+".part.validator", []byte(validator), 0644)
+		}
+		if _, err := DownloadFile(srv.Client(), srv.URL, changed, ""); err != nil {
+			t.Fatal(err)
+		}
+		if got, _ := os.ReadFile(changed); !bytes.Equal(got, content) {
+			t.Errorf("validator %q: stale partial file was resumed", validator)
+		}
+		os.Remove(changed)
+	}
+
+	// An unpinned partial file is not taken as complete on 416
+	full := filepath.Join(dir, "full.bin")
+	os.WriteFile(full+".part", append(append([]byte{}, content...), 'x'), 0644)
+	os.WriteFile(full+".part.validator", []byte(`"v2"`), 0644)
+	if _, err := DownloadFile(srv.Client(), srv.URL, full, ""); err != nil {
+		t.Fatal(err)
+	}
+	if got, _ := os.ReadFile(full); !bytes.Equal(got, content) {
+		t.Error("oversized partial file was accepted on 416")
+	}
+
+	// A mismatching pin never produces the destination file
+	bad := filepath.Join(dir, "bad.bin")
+	if _, err := DownloadFile(srv.Client(), srv.URL, bad, strings.Repeat("0", 64)); err == nil {
+		t.Error("expected a sha256 mismatch")
+	}
+	for _, p := range []string{bad, bad + ".part"} {
+		if _, err := os.Stat(p); !os.IsNotExist(err) {
+			t.Errorf("%s exists after a failed download", filepath.Base(p))
+		}
+	}
+}
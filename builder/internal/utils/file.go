@@ -0,0 +1,42 @@
+package utils
+
+import (
+	"io"
+	"os"
+	"path/filepath"
+)
+
+// LinkOrCopy hardlinks src to dst, falling back to a copy when the two paths
+// are on different filesystems, links are not supported or dst exists. The
+// copy is written to a uniquely named temporary file next to dst and renamed
+// into place, so concurrent builders sharing a cache never see a partial
+// file or clobber each other's copy.
+func LinkOrCopy(src, dst string) error {
+	if err := os.Link(src, dst); err == nil {
+		return nil
+	}
+	in, err := os.Open(src)
+	if err != nil {
+		return err
+	}
+	defer in.Close()
+	out, err := os.CreateTemp(filepath.Dir(dst), "."+filepath.Base(dst)+".tmp-")
+	if err != nil {
+		return err
+	}
+	_, err = io.Copy(out, in)
+	if err == nil {
+		// CreateTemp makes the file private to the current user
+		err = out.Chmod(0644)
+	}
+	if cerr := out.Close(); err == nil {
+		err = cerr
+	}
+	if err == nil {
+		err = os.Rename(out.Name(), dst)
+	}
+	if err != nil {
+		os.Remove(out.Name())
+	}
+	return err
+}
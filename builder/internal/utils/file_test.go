@@ -0,0 +1,42 @@
+package utils
+
+import (
+	"os"
+	"path/filepath"
+	"testing"
+)
+
+func TestLinkOrCopy(t *testing.T) {
+	dir := t.TempDir()
+	src := filepath.Join(dir, "src.whl")
+	if err := os.WriteFile(src, []byte("new"), 0644); err != nil {
+		t.Fatal(err)
+	}
+
+	dst := filepath.Join(dir, "linked.whl")
+	if err := LinkOrCopy(src, dst); err != nil {
+		t.Fatal(err)
+	}
+	if data, _ := os.ReadFile(dst); string(data) != "new" {
+		t.Errorf("linked content = %q", data)
+	}
+
+	// An existing destination is replaced through a temporary copy
+	stale := filepath.Join(dir, "stale.whl")
+	if err := os.WriteFile(stale, []byte("old"), 0644); err != nil {
+		t.Fatal(err)
+	}
+	if err := LinkOrCopy(src, stale); err != nil {
+		t.Fatal(err)
+	}
+	if data, _ := os.ReadFile(stale); string(data) != "new" {
+		t.Errorf("replaced content = %q", data)
+	}
+	entries, err := os.ReadDir(dir)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if len(entries) != 3 {
+		t.Errorf("temporary files left behind: %v", entries)
+	}
+}
@@ -29,3 +29,24 @@ func TestValidateVersion(t *testing.T) {
 		}
 	}
 }
+
+func TestCompareVersions(t *testing.T) {
+	tests := []struct {
+		a, b     string
+		expected int
+	}{
+		{"20", "21", -1},
+		{"1.9", "20", -1},
+		{"21", "21", 0},
+		{"21", "21.0", 0},
+		{"21.1", "21", 1},
+		{"9", "10", -1},
+		{"1.0-beta", "1.0-rc", -1},
+	}
+
+	for _, tt := range tests {
+		if got := CompareVersions(tt.a, tt.b); got != tt.expected {
+			t.Errorf("CompareVersions(%q, %q) = %d, expected %d", tt.a, tt.b, got, tt.expected)
+		}
+	}
+}
@@ -0,0 +1,46 @@
+package utils
+
+import (
+	"strconv"
+	"strings"
+)
+
+// CompareVersions orders product version strings such as "1.9", "20" and
+// "21.1". Dot-separated segments are compared numerically when both are
+// numbers and lexically otherwise. It returns -1, 0 or 1.
+func CompareVersions(a, b string) int {
+	as := strings.Split(a, ".")
+	bs := strings.Split(b, ".")
+	for i := 0; i < len(as) || i < len(bs); i++ {
+		var x, y string
+		if i < len(as) {
+			x = as[i]
+		}
+		if i < len(bs) {
+			y = bs[i]
+		}
+		xn, xerr := strconv.Atoi(x)
+		yn, yerr := strconv.Atoi(y)
+		if x == "" {
+			xn, xerr = 0, nil
+		}
+		if y == "" {
+			yn, yerr = 0, nil
+		}
+		switch {
+		case xerr == nil && yerr == nil:
+			if xn != yn {
+				if xn < yn {
+					return -1
+				}
+				return 1
+			}
+		case x != y:
+			if x < y {
+				return -1
+			}
+			return 1
+		}
+	}
+	return 0
+}
@@ -0,0 +1,271 @@
+package main
+
+import (
+	"archive/zip"
+	"bytes"
+	"crypto/sha256"
+	"encoding/base64"
+	"encoding/hex"
+	"encoding/json"
+	"fmt"
+	"hash/fnv"
+	"html"
+	"math/rand"
+	"net"
+	"net/http"
+	"os"
+	"path/filepath"
+	"sort"
+	"strings"
+	"sync"
+	"time"
+
+	"builder/internal/deps"
+)
+
+// wheelTime is the timestamp of every synthetic wheel member, so the wheels
+// and their hashes are identical from run to run.
+var wheelTime = time.Date(2020, 1, 1, 0, 0, 0, 0, time.UTC)
+
+// indexFile is a wheel served by the fake index.
+type indexFile struct {
+	Filename string
+	SHA256   string
+	Size     int64
+}
+
+// fakeIndex is a PEP 503 / PEP 691 simple index serving synthetic wheels
+// from a directory.
+type fakeIndex struct {
+	dir      string
+	latency  time.Duration
+	projects map[string][]indexFile // keyed by normalized name
+
+	listener net.Listener
+	server   *http.Server
+}
+
+// newFakeIndex writes a py3-none-any wheel for every name==version in pins to
+// dir. Wheel sizes vary around meanSize, seeded by the filename.
+func newFakeIndex(dir string, pins map[string][]string, meanSize int64, latency time.Duration) (*fakeIndex, error) {
+	if err := os.MkdirAll(dir, 0755); err != nil {
+		return nil, err
+	}
+	type job struct{ name, version string }
+	var jobs []job
+	for name, versions := range pins {
+		for _, v := range versions {
+			jobs = append(jobs, job{name, v})
+		}
+	}
+
+	idx := &fakeIndex{dir: dir, latency: latency, projects: make(map[string][]indexFile)}
+	var mu sync.Mutex
+	errs := make(chan error, len(jobs))
+	sem := make(chan struct{}, 8)
+	var wg sync.WaitGroup
+	for _, j := range jobs {
+		wg.Add(1)
+		go func(j job) {
+			defer wg.Done()
+			sem <- struct{}{}
+			defer func() { <-sem }()
+			f, err := writeSyntheticWheel(dir, j.name, j.version, meanSize)
+			if err != nil {
+				errs <- err
+				return
+			}
+			mu.Lock()
+			key := deps.NormalizeName(j.name)
+			idx.projects[key] = append(idx.projects[key], f)
+			mu.Unlock()
+		}(j)
+	}
+	wg.Wait()
+	close(errs)
+	if err := <-errs; err != nil {
+		return nil, err
+	}
+	for _, files := range idx.projects {
+		sort.Slice(files, func(i, j int) bool { return files[i].Filename < files[j].Filename })
+	}
+	return idx, nil
+}
+
+// writeSyntheticWheel writes a wheel shaped like a real one: a package of
+// compressible Python modules plus an incompressible binary extension.
+func writeSyntheticWheel(dir, name, version string, meanSize int64) (indexFile, error) {
+	project := strings.ReplaceAll(deps.NormalizeName(name), "-", "_")
+	filename := fmt.Sprintf("%s-%s-py3-none-any.whl", project, version)
+	distInfo := fmt.Sprintf("%s-%s.dist-info", project, version)
+
+	h := fnv.New64a()
+	h.Write([]byte(filename))
+	rng := rand.New(rand.NewSource(int64(h.Sum64())))
+	// Between a quarter of and twice the mean
+	size := meanSize/4 + rng.Int63n(meanSize*7/4+1)
+
+	var members []struct {
+		name string
+		data []byte
+	}
+	add := func(name string, data []byte) {
+		members = append(members, struct {
+			name string
+			data []byte
+		}{name, data})
+	}
+
+	textSize := size * 6 / 10
+	for i := 0; textSize > 0; i++ {
+		n := int64(8 << 10)
+		if textSize < n {
+			n = textSize
+		}
+		add(fmt.Sprintf("%s/module_%03d.py", project, i), syntheticSource(rng, n))
+		textSize -= n
+	}
+	add(project+"/__init__.py", []byte(fmt.Sprintf("__version__ = %q\n", version)))
+	blob := make([]byte, size*4/10)
+	rng.Read(blob)
+	add(project+"/_speedups.pyd", blob)
+	add(distInfo+"/METADATA", []byte(fmt.Sprintf("Metadata-Version: 2.1\nName: %s\nVersion: %s\n", name, version)))
+	add(distInfo+"/WHEEL", []byte("Wheel-Version: 1.0\nGenerator: phis-bench\nRoot-Is-Purelib: true\nTag: py3-none-any\n"))
+
+	var record strings.Builder
+	for _, m := range members {
+		sum := sha256.Sum256(m.data)
+		fmt.Fprintf(&record, "%s,sha256=%s,%d\n", m.name, base64.RawURLEncoding.EncodeToString(sum[:]), len(m.data))
+	}
+	fmt.Fprintf(&record, "%s/RECORD,,\n", distInfo)
+	add(distInfo+"/RECORD", []byte(record.String()))
+
+	var buf bytes.Buffer
+	zw := zip.NewWriter(&buf)
+	for _, m := range members {
+		w, err := zw.CreateHeader(&zip.FileHeader{Name: m.name, Method: zip.Deflate, Modified: wheelTime})
+		if err != nil {
+			return indexFile{}, err
+		}
+		if _, err := w.Write(m.data); err != nil {
+			return indexFile{}, err
+		}
+	}
+	if err := zw.Close(); err != nil {
+		return indexFile{}, err
+	}
+	if err := os.WriteFile(filepath.Join(dir, filename), buf.Bytes(), 0644); err != nil {
+		return indexFile{}, err
+	}
+	sum := sha256.Sum256(buf.Bytes())
+	return indexFile{Filename: filename, SHA256: hex.EncodeToString(sum[:]), Size: int64(buf.Len())}, nil
+}
+
+var sourceWords = strings.Fields("def class return self import from for in if else elif while try except with as yield lambda None True False value result items data config name path")
+
+// syntheticSource returns n bytes of Python-like text.
+func syntheticSource(rng *rand.Rand, n int64) []byte {
+	var b bytes.Buffer
+	for int64(b.Len()) < n {
+		b.WriteString("    ")
+		for i := 0; i < 8; i++ {
+			b.WriteString(sourceWords[rng.Intn(len(sourceWords))])
+			b.WriteByte(' ')
+		}
+		b.WriteByte('\n')
+	}
+	return b.Bytes()[:n]
+}
+
+// start serves the index on a free local port and returns its simple URL.
+func (idx *fakeIndex) start() (string, error) {
+	l, err := net.Listen("tcp", "127.0.0.1:0")
+	if err != nil {
+		return "", err
+	}
+	idx.listener = l
+	idx.server = &http.Server{Handler: idx}
+	go idx.server.Serve(l)
+	return fmt.Sprintf("http://%s/simple", l.Addr()), nil
+}
+
+func (idx *fakeIndex) close() {
+	if idx.server != nil {
+		idx.server.Close()
+	}
+}
+
+func (idx *fakeIndex) ServeHTTP(w http.ResponseWriter, r *http.Request) {
+	if idx.latency > 0 {
+		time.Sleep(idx.latency)
+	}
+	switch {
+	case strings.HasPrefix(r.URL.Path, "/files/"):
+		name := filepath.Base(r.URL.Path)
+		// ServeFile answers Range requests, as real mirrors do
+		http.ServeFile(w, r, filepath.Join(idx.dir, name))
+	case r.URL.Path == "/simple/" || r.URL.Path == "/simple":
+		idx.serveRoot(w)
+	case strings.HasPrefix(r.URL.Path, "/simple/"):
+		project := deps.NormalizeName(strings.Trim(strings.TrimPrefix(r.URL.Path, "/simple/"), "/"))
+		files, ok := idx.projects[project]
+		if !ok {
+			http.NotFound(w, r)
+			return
+		}
+		if strings.Contains(r.Header.Get("Accept"), "application/vnd.pypi.simple.v1+json") {
+			idx.serveJSON(w, project, files)
+		} else {
+			idx.serveHTML(w, project, files)
+		}
+	default:
+		http.NotFound(w, r)
+	}
+}
+
+func (idx *fakeIndex) serveRoot(w http.ResponseWriter) {
+	names := make([]string, 0, len(idx.projects))
+	for name := range idx.projects {
+		names = append(names, name)
+	}
+	sort.Strings(names)
+	w.Header().Set("Content-Type", "text/html")
+	fmt.Fprintln(w, "<!DOCTYPE html><html><body>")
+	for _, name := range names {
+		fmt.Fprintf(w, "<a href=\"%s/\">%s</a>\n", name, name)
+	}
+	fmt.Fprintln(w, "</body></html>")
+}
+
+func (idx *fakeIndex) serveHTML(w http.ResponseWriter, project string, files []indexFile) {
+	w.Header().Set("Content-Type", "application/vnd.pypi.simple.v1+html")
+	fmt.Fprintf(w, "<!DOCTYPE html><html><body><h1>%s</h1>\n", html.EscapeString(project))
+	for _, f := range files {
+		fmt.Fprintf(w, "<a href=\"../../files/%s#sha256=%s\">%s</a>\n", f.Filename, f.SHA256, html.EscapeString(f.Filename))
+	}
+	fmt.Fprintln(w, "</body></html>")
+}
+
+func (idx *fakeIndex) serveJSON(w http.ResponseWriter, project string, files []indexFile) {
+	type file struct {
+		Filename string            `json:"filename"`
+		URL      string            `json:"url"`
+		Hashes   map[string]string `json:"hashes"`
+		Size     int64             `json:"size"`
+	}
+	page := struct {
+		Meta  map[string]string `json:"meta"`
+		Name  string            `json:"name"`
+		Files []file            `json:"files"`
+	}{Meta: map[string]string{"api-version": "1.1"}, Name: project}
+	for _, f := range files {
+		page.Files = append(page.Files, file{
+			Filename: f.Filename,
+			URL:      "../../files/" + f.Filename,
+			Hashes:   map[string]string{"sha256": f.SHA256},
+			Size:     f.Size,
+		})
+	}
+	w.Header().Set("Content-Type", "application/vnd.pypi.simple.v1+json")
+	json.NewEncoder(w).Encode(page)
+}
@@ -0,0 +1,45 @@
+package main
+
+import (
+	"path/filepath"
+	"testing"
+
+	"builder/internal/deps"
+	"builder/internal/payload"
+)
+
+func TestFakeIndex(t *testing.T) {
+	dir := t.TempDir()
+	pins := map[string][]string{"typing-extensions": {"4.12.2", "4.13.0"}}
+	index, err := newFakeIndex(filepath.Join(dir, "index"), pins, 64<<10, 0)
+	if err != nil {
+		t.Fatal(err)
+	}
+	url, err := index.start()
+	if err != nil {
+		t.Fatal(err)
+	}
+	defer index.close()
+
+	client := deps.NewIndexClient([]string{url}, 1)
+	files, err := client.ProjectFiles("Typing_Extensions")
+	if err != nil {
+		t.Fatal(err)
+	}
+	if len(files) != 2 || files[0].Hashes["sha256"] == "" {
+		t.Fatalf("unexpected project files %+v", files)
+	}
+
+	// The synthetic wheels download with a verified hash and install cleanly
+	wheelDir := t.TempDir()
+	if err := client.Download(files[0], wheelDir); err != nil {
+		t.Fatal(err)
+	}
+	dists, err := payload.Build([]string{filepath.Join(wheelDir, files[0].Filename)}, filepath.Join(dir, "site"), 1)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if dists[0].Name != "typing-extensions" || dists[0].Version != "4.12.2" {
+		t.Errorf("unexpected dist %s %s", dists[0].Name, dists[0].Version)
+	}
+}
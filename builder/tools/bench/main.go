@@ -0,0 +1,374 @@
+// Command phis-bench runs build-installer and build-upgrade end to end against
+// a local fake package index, with cold and warm caches, and reports the
+// per-stage timings recorded by --trace-json.
+//
+// The index serves synthetic py3-none-any wheels for every pin of two
+// snapshots, and makensis is replaced by a stub that only writes a
+// placeholder installer, so runs are offline and reproducible. Run it from
+// builder/:
+//
+//	go run ./tools/bench -runs 3 -json bench.json
+package main
+
+import (
+	"archive/zip"
+	"flag"
+	"fmt"
+	"io"
+	"math/rand"
+	"os"
+	"os/exec"
+	"path/filepath"
+	"runtime"
+	"sort"
+	"strings"
+	"time"
+
+	"builder/internal/deps"
+	"builder/internal/trace"
+)
+
+// makensisStub stands in for makensis: it answers the version query used
+// for the compile cache key and writes a placeholder installer.
+const makensisStub = `#!/bin/sh
+out=""
+for arg in "$@"; do
+	case "$arg" in
+	-VERSION|/VERSION) echo "v3.10-phis-bench"; exit 0 ;;
+	-DINSTALLER_OUTPUT=*) out="${arg#-DINSTALLER_OUTPUT=}" ;;
+	/DINSTALLER_OUTPUT=*) out="${arg#/DINSTALLER_OUTPUT=}" ;;
+	esac
+done
+[ -n "$out" ] && echo "phis-bench placeholder installer" > "$out"
+exit 0
+`
+
+// pipTools are served alongside the snapshot pins for the pip tools download.
+var pipTools = map[string]string{"pip": "24.0", "setuptools": "69.5.1", "wheel": "0.43.0"}
+
+type scenario struct {
+	name string
+	cold bool
+	args []string
+}
+
+func main() {
+	builder := flag.String("builder", "", "builder binary to benchmark (default: build the current module)")
+	resources := flag.String("resources", "../resources", "resources directory providing the NSIS scripts and snapshots")
+	toSnapshot := flag.String("to", "../resources/versions/requirements_24.txt", "snapshot the installer is built from")
+	fromSnapshot := flag.String("from", "../resources/versions/requirements_23.txt", "older snapshot build-upgrade starts from")
+	runs := flag.Int("runs", 1, "runs per scenario; the median is reported")
+	wheelKB := flag.Int64("wheel-kb", 512, "mean size of the synthetic wheels in KB")
+	latency := flag.Duration("latency", 0, "delay added to every index response, to model a remote mirror")
+	makensis := flag.String("makensis", "", "use this makensis instead of the stub")
+	installerArgs := flag.String("installer-args", "", "extra build-installer arguments, e.g. \"--payload --pyc=false\"")
+	work := flag.String("work", "", "workspace directory, kept after the run (default: a temporary directory)")
+	jsonOut := flag.String("json", "", "also write the report to this file as JSON")
+	flag.Parse()
+
+	if runtime.GOOS == "windows" {
+		fmt.Println("Error: phis-bench needs a POSIX shell for the makensis stub")
+		os.Exit(1)
+	}
+
+	ws := *work
+	temporary := ws == ""
+	if temporary {
+		dir, err := os.MkdirTemp("", "phis-bench-")
+		if err != nil {
+			fmt.Println("Error creating workspace:", err)
+			os.Exit(1)
+		}
+		ws = dir
+	}
+	ws, err := filepath.Abs(ws)
+	if err != nil {
+		fmt.Println("Error:", err)
+		os.Exit(1)
+	}
+
+	err = run(ws, *builder, *resources, *fromSnapshot, *toSnapshot, *runs, *wheelKB<<10, *latency, *makensis, *installerArgs, *jsonOut)
+	if err != nil {
+		// Keep the logs and traces of the failed run
+		fmt.Println("Error:", err)
+		fmt.Println("Workspace kept at", ws)
+		os.Exit(1)
+	}
+	if temporary {
+		os.RemoveAll(ws)
+	}
+}
+
+func run(ws, builder, resources, fromSnapshot, toSnapshot string, runs int, wheelSize int64, latency time.Duration, makensis, installerArgs, jsonOut string) error {
+	fromVer, err := snapshotVersion(fromSnapshot)
+	if err != nil {
+		return err
+	}
+	toVer, err := snapshotVersion(toSnapshot)
+	if err != nil {
+		return err
+	}
+
+	if builder == "" {
+		builder = filepath.Join(ws, "phis-builder")
+		fmt.Println("Building", builder)
+		build := exec.Command("go", "build", "-o", builder, ".")
+		build.Stdout = os.Stdout
+		build.Stderr = os.Stderr
+		if err := build.Run(); err != nil {
+			return fmt.Errorf("building the builder (run from builder/ or pass -builder): %w", err)
+		}
+	} else if builder, err = filepath.Abs(builder); err != nil {
+		return err
+	}
+
+	pins := make(map[string][]string)
+	for _, snapshot := range []string{fromSnapshot, toSnapshot} {
+		reqs, err := deps.ParseRequirements(snapshot)
+		if err != nil {
+			return err
+		}
+		for _, r := range reqs {
+			if r.Name != "" && r.Version != "" && !contains(pins[r.Name], r.Version) {
+				pins[r.Name] = append(pins[r.Name], r.Version)
+			}
+		}
+	}
+	for name, version := range pipTools {
+		if len(pins[name]) == 0 {
+			pins[name] = []string{version}
+		}
+	}
+
+	start := time.Now()
+	index, err := newFakeIndex(filepath.Join(ws, "index"), pins, wheelSize, latency)
+	if err != nil {
+		return fmt.Errorf("generating wheels: %w", err)
+	}
+	indexURL, err := index.start()
+	if err != nil {
+		return err
+	}
+	defer index.close()
+	fmt.Printf("Serving %d projects at %s (generated in %s)\n", len(pins), indexURL, time.Since(start).Round(time.Millisecond))
+
+	binDir := filepath.Join(ws, "bin")
+	if err := setupWorkspace(ws, binDir, resources, fromSnapshot, toSnapshot, fromVer, toVer, indexURL, makensis); err != nil {
+		return err
+	}
+
+	installer := append([]string{"build-installer"}, strings.Fields(installerArgs)...)
+	upgrade := []string{"build-upgrade", "--from-ver", fromVer, "--to-ver", toVer}
+	scenarios := []scenario{
+		{"installer-cold", true, installer},
+		{"installer-warm", false, installer},
+		{"upgrade-cold", true, upgrade},
+		{"upgrade-warm", false, upgrade},
+	}
+
+	var reports []scenarioReport
+	for _, sc := range scenarios {
+		var walls []time.Duration
+		var traces [][]trace.Record
+		for i := 0; i < runs; i++ {
+			if sc.cold {
+				// The caches live under build/ as well
+				if err := os.RemoveAll(filepath.Join(ws, "build")); err != nil {
+					return err
+				}
+			}
+			fmt.Printf("Running %s (%d/%d)...\n", sc.name, i+1, runs)
+			wall, records, err := runBuilder(ws, binDir, builder, fmt.Sprintf("%s-%d", sc.name, i+1), sc.args)
+			if err != nil {
+				return fmt.Errorf("%s: %w", sc.name, err)
+			}
+			walls = append(walls, wall)
+			traces = append(traces, records)
+		}
+		reports = append(reports, summarize(sc.name, walls, traces))
+	}
+
+	printReport(os.Stdout, reports)
+	if jsonOut != "" {
+		return writeReportJSON(jsonOut, reports)
+	}
+	return nil
+}
+
+// snapshotVersion returns the version of a versions/requirements_<ver>.txt file.
+func snapshotVersion(path string) (string, error) {
+	base := filepath.Base(path)
+	if !strings.HasPrefix(base, "requirements_") || !strings.HasSuffix(base, ".txt") {
+		return "", fmt.Errorf("%s is not named requirements_<version>.txt", path)
+	}
+	return strings.TrimSuffix(strings.TrimPrefix(base, "requirements_"), ".txt"), nil
+}
+
+// setupWorkspace lays out ws like a checkout: resources/ with the scripts,
+// snapshots, config and a synthetic embeddable Python, and bin/ with makensis.
+func setupWorkspace(ws, binDir, resources, fromSnapshot, toSnapshot, fromVer, toVer, indexURL, makensis string) error {
+	resDir := filepath.Join(ws, "resources")
+	for _, dir := range []string{filepath.Join(resDir, "versions"), binDir} {
+		if err := os.MkdirAll(dir, 0755); err != nil {
+			return err
+		}
+	}
+
+	entries, err := os.ReadDir(resources)
+	if err != nil {
+		return err
+	}
+	for _, e := range entries {
+		name := e.Name()
+		if !e.Type().IsRegular() || strings.HasSuffix(name, ".toml") || name == "python-3.8.10-embed-amd64.zip" {
+			continue
+		}
+		if err := copyFile(filepath.Join(resources, name), filepath.Join(resDir, name)); err != nil {
+			return err
+		}
+	}
+	copies := [][2]string{
+		{fromSnapshot, filepath.Join(resDir, "versions", "requirements_"+fromVer+".txt")},
+		{toSnapshot, filepath.Join(resDir, "versions", "requirements_"+toVer+".txt")},
+		{toSnapshot, filepath.Join(resDir, "requirements.txt")},
+	}
+	for _, c := range copies {
+		if err := copyFile(c[0], c[1]); err != nil {
+			return err
+		}
+	}
+	if err := writeEmbedZip(filepath.Join(resDir, "python-3.8.10-embed-amd64.zip")); err != nil {
+		return err
+	}
+
+	config := fmt.Sprintf(`version = %q
+product_name = "phis-bench"
+company_name = "phis-bench"
+nsis_script = "installer.nsi"
+requirements_file = "requirements.txt"
+index_url = %q
+downloader = "native"
+`, toVer, indexURL)
+	if err := os.WriteFile(filepath.Join(resDir, "config.toml"), []byte(config), 0644); err != nil {
+		return err
+	}
+
+	stub := filepath.Join(binDir, "makensis")
+	os.Remove(stub)
+	if makensis != "" {
+		abs, err := filepath.Abs(makensis)
+		if err != nil {
+			return err
+		}
+		return os.Symlink(abs, stub)
+	}
+	return os.WriteFile(stub, []byte(makensisStub), 0755)
+}
+
+// writeEmbedZip writes a stand-in for the embeddable Python distribution
+// with about the same size and file count.
+func writeEmbedZip(path string) error {
+	f, err := os.Create(path)
+	if err != nil {
+		return err
+	}
+	rng := rand.New(rand.NewSource(38))
+	zw := zip.NewWriter(f)
+	members := map[string]int{
+		"python.exe":       100 << 10,
+		"pythonw.exe":      100 << 10,
+		"python38.dll":     4 << 20,
+		"python38.zip":     2500 << 10,
+		"python38._pth":    80,
+		"vcruntime140.dll": 90 << 10,
+	}
+	for _, ext := range []string{"_asyncio", "_bz2", "_ctypes", "_decimal", "_elementtree", "_hashlib", "_lzma", "_msi", "_multiprocessing", "_overlapped", "_queue", "_socket", "_sqlite3", "_ssl", "pyexpat", "select", "unicodedata", "winsound"} {
+		members[ext+".pyd"] = 60 << 10
+	}
+	for _, name := range sortedKeys(members) {
+		data := make([]byte, members[name])
+		rng.Read(data)
+		w, err := zw.CreateHeader(&zip.FileHeader{Name: name, Method: zip.Deflate, Modified: wheelTime})
+		if err == nil {
+			_, err = w.Write(data)
+		}
+		if err != nil {
+			f.Close()
+			return err
+		}
+	}
+	if err := zw.Close(); err != nil {
+		f.Close()
+		return err
+	}
+	return f.Close()
+}
+
+// runBuilder runs one builder command in ws and returns its wall time and spans.
+func runBuilder(ws, binDir, builder, label string, args []string) (time.Duration, []trace.Record, error) {
+	logDir := filepath.Join(ws, "logs")
+	if err := os.MkdirAll(logDir, 0755); err != nil {
+		return 0, nil, err
+	}
+	tracePath := filepath.Join(logDir, label+".jsonl")
+	logPath := filepath.Join(logDir, label+".log")
+	logFile, err := os.Create(logPath)
+	if err != nil {
+		return 0, nil, err
+	}
+	defer logFile.Close()
+
+	cmdArgs := append([]string{"--config", filepath.Join(ws, "resources", "config.toml"), "--trace-json", tracePath}, args...)
+	cmd := exec.Command(builder, cmdArgs...)
+	cmd.Dir = ws
+	cmd.Env = append(os.Environ(), "PATH="+binDir+string(os.PathListSeparator)+os.Getenv("PATH"))
+	cmd.Stdout = logFile
+	cmd.Stderr = logFile
+
+	start := time.Now()
+	err = cmd.Run()
+	wall := time.Since(start)
+	if err != nil {
+		return 0, nil, fmt.Errorf("%w, see %s", err, logPath)
+	}
+	records, err := trace.ReadJSONLines(tracePath)
+	if err != nil {
+		return 0, nil, err
+	}
+	return wall, records, nil
+}
+
+func copyFile(src, dst string) error {
+	in, err := os.Open(src)
+	if err != nil {
+		return err
+	}
+	defer in.Close()
+	out, err := os.Create(dst)
+	if err != nil {
+		return err
+	}
+	if _, err := io.Copy(out, in); err != nil {
+		out.Close()
+		return err
+	}
+	return out.Close()
+}
+
+func contains(list []string, s string) bool {
+	for _, v := range list {
+		if v == s {
+			return true
+		}
+	}
+	return false
+}
+
+func sortedKeys(m map[string]int) []string {
+	keys := make([]string, 0, len(m))
+	for k := range m {
+		keys = append(keys, k)
+	}
+	sort.Strings(keys)
+	return keys
+}
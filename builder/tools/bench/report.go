@@ -0,0 +1,162 @@
+package main
+
+import (
+	"encoding/json"
+	"fmt"
+	"io"
+	"os"
+	"sort"
+	"strings"
+	"text/tabwriter"
+	"time"
+
+	"builder/internal/trace"
+)
+
+// stageStats is one stage of a scenario: the spans of the same name in a run
+// are summed, then the median over all runs is reported.
+type stageStats struct {
+	Name       string  `json:"name"`
+	Depth      int     `json:"depth"`
+	Spans      int     `json:"spans"`
+	DurationMS float64 `json:"duration_ms"`
+	Bytes      int64   `json:"bytes,omitempty"`
+	Files      int64   `json:"files,omitempty"`
+	MaxRSSKB   int64   `json:"child_max_rss_kb,omitempty"`
+}
+
+// scenarioReport summarizes all runs of one scenario.
+type scenarioReport struct {
+	Scenario string       `json:"scenario"`
+	Runs     int          `json:"runs"`
+	WallMS   float64      `json:"wall_ms"` // median wall time of the builder process
+	Stages   []stageStats `json:"stages"`
+}
+
+// summarize aggregates the traces of every run of a scenario.
+func summarize(name string, walls []time.Duration, runs [][]trace.Record) scenarioReport {
+	report := scenarioReport{Scenario: name, Runs: len(runs)}
+	wallMS := make([]float64, len(walls))
+	for i, w := range walls {
+		wallMS[i] = float64(w.Microseconds()) / 1000
+	}
+	report.WallMS = median(wallMS)
+
+	var order []string
+	depth := make(map[string]int)
+	perRun := make([]map[string]*stageStats, len(runs))
+	for i, records := range runs {
+		byID := make(map[int64]trace.Record, len(records))
+		for _, r := range records {
+			byID[r.ID] = r
+		}
+		perRun[i] = make(map[string]*stageStats)
+		for _, r := range records {
+			s, ok := perRun[i][r.Name]
+			if !ok {
+				s = &stageStats{Name: r.Name}
+				perRun[i][r.Name] = s
+			}
+			s.Spans++
+			s.DurationMS += r.DurationMS
+			s.Bytes += r.Bytes
+			s.Files += r.Files
+			if r.MaxRSSKB > s.MaxRSSKB {
+				s.MaxRSSKB = r.MaxRSSKB
+			}
+			if _, seen := depth[r.Name]; !seen {
+				d := 0
+				for p := r.Parent; p != 0; p = byID[p].Parent {
+					d++
+				}
+				depth[r.Name] = d
+				order = append(order, r.Name)
+			}
+		}
+	}
+
+	for _, stage := range order {
+		var durations []float64
+		agg := stageStats{Name: stage, Depth: depth[stage]}
+		for _, run := range perRun {
+			s, ok := run[stage]
+			if !ok {
+				continue
+			}
+			durations = append(durations, s.DurationMS)
+			// Counters are deterministic for a scenario; keep the largest
+			if s.Spans > agg.Spans {
+				agg.Spans = s.Spans
+			}
+			if s.Bytes > agg.Bytes {
+				agg.Bytes = s.Bytes
+			}
+			if s.Files > agg.Files {
+				agg.Files = s.Files
+			}
+			if s.MaxRSSKB > agg.MaxRSSKB {
+				agg.MaxRSSKB = s.MaxRSSKB
+			}
+		}
+		agg.DurationMS = median(durations)
+		report.Stages = append(report.Stages, agg)
+	}
+	return report
+}
+
+func median(values []float64) float64 {
+	if len(values) == 0 {
+		return 0
+	}
+	sorted := append([]float64{}, values...)
+	sort.Float64s(sorted)
+	mid := len(sorted) / 2
+	if len(sorted)%2 == 1 {
+		return sorted[mid]
+	}
+	return (sorted[mid-1] + sorted[mid]) / 2
+}
+
+func printReport(out io.Writer, reports []scenarioReport) {
+	for _, r := range reports {
+		fmt.Fprintf(out, "\n%s: %d runs, median wall time %s\n", r.Scenario, r.Runs, formatMS(r.WallMS))
+		tw := tabwriter.NewWriter(out, 0, 0, 2, ' ', 0)
+		fmt.Fprintln(tw, "stage\tspans\ttime\tbytes\tfiles\tchild rss\t")
+		for _, s := range r.Stages {
+			fmt.Fprintf(tw, "%s\t%d\t%s\t%s\t%s\t%s\t\n",
+				strings.Repeat("  ", s.Depth)+s.Name, s.Spans, formatMS(s.DurationMS),
+				formatBytes(s.Bytes), formatCount(s.Files), formatBytes(s.MaxRSSKB*1024))
+		}
+		tw.Flush()
+	}
+}
+
+func writeReportJSON(path string, reports []scenarioReport) error {
+	data, err := json.MarshalIndent(reports, "", "  ")
+	if err != nil {
+		return err
+	}
+	return os.WriteFile(path, append(data, '\n'), 0644)
+}
+
+func formatMS(ms float64) string {
+	return time.Duration(ms * float64(time.Millisecond)).Round(time.Millisecond).String()
+}
+
+func formatBytes(n int64) string {
+	switch {
+	case n == 0:
+		return "-"
+	case n < 1<<20:
+		return fmt.Sprintf("%.1f KB", float64(n)/(1<<10))
+	default:
+		return fmt.Sprintf("%.1f MB", float64(n)/(1<<20))
+	}
+}
+
+func formatCount(n int64) string {
+	if n == 0 {
+		return "-"
+	}
+	return fmt.Sprint(n)
+}
@@ -0,0 +1,35 @@
+// Command phis-unpack extracts an archive built by the builder's --archive
+// mode on the client. It is cross-compiled for windows/amd64 and bundled
+// into the installer.
+package main
+
+import (
+	"flag"
+	"fmt"
+	"os"
+	"runtime"
+	"time"
+
+	"builder/internal/archive"
+)
+
+func main() {
+	workers := flag.Int("j", runtime.NumCPU(), "number of frames decompressed concurrently")
+	flag.Usage = func() {
+		fmt.Fprintln(os.Stderr, "Usage: phis-unpack [-j N] <archive> <dest>")
+		flag.PrintDefaults()
+	}
+	flag.Parse()
+	if flag.NArg() != 2 {
+		flag.Usage()
+		os.Exit(2)
+	}
+
+	start := time.Now()
+	index, err := archive.Extract(flag.Arg(0), flag.Arg(1), *workers)
+	if err != nil {
+		fmt.Println("Error extracting archive:", err)
+		os.Exit(1)
+	}
+	fmt.Printf("Extracted %d files from %d frames in %s\n", len(index.Files), len(index.Frames), time.Since(start).Round(time.Millisecond))
+}
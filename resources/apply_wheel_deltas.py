@@ -0,0 +1,109 @@
+"""Rebuild upgraded wheels from binary deltas (see builder/internal/delta).
+
+Usage: python apply_wheel_deltas.py <delta_dir> <wheel_cache_dir> <out_dir>
+
+Every <delta_dir>/*.delta is applied to the old wheel it names, taken from the
+client wheel cache. Both the old wheel and the rebuilt wheel are verified by
+sha256 before the result is written to <out_dir>. Exits non-zero if any wheel
+cannot be rebuilt, so the installer can stop before running pip.
+"""
+import hashlib
+import json
+import os
+import sys
+import zlib
+
+MAGIC = b"PHISDLT1"
+
+
+class DeltaError(Exception):
+    pass
+
+
+class Reader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def read(self, n):
+        if self.pos + n > len(self.data):
+            raise DeltaError("truncated delta")
+        chunk = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return chunk
+
+    def uvarint(self):
+        result = 0
+        shift = 0
+        while True:
+            b = self.read(1)[0]
+            result |= (b & 0x7F) << shift
+            if b < 0x80:
+                return result
+            shift += 7
+
+
+def apply_delta(delta_path, cache_dir, out_dir):
+    with open(delta_path, "rb") as f:
+        raw = f.read()
+
+    reader = Reader(raw)
+    if reader.read(len(MAGIC)) != MAGIC:
+        raise DeltaError("not a delta file")
+    header = json.loads(reader.read(reader.uvarint()).decode("utf-8"))
+
+    old_path = os.path.join(cache_dir, header["old_filename"])
+    if not os.path.isfile(old_path):
+        raise DeltaError("old wheel %s is not in the wheel cache" % header["old_filename"])
+    with open(old_path, "rb") as f:
+        old = f.read()
+    if hashlib.sha256(old).hexdigest() != header["old_sha256"]:
+        raise DeltaError("cached %s does not match the delta" % header["old_filename"])
+
+    ops = Reader(zlib.decompress(raw[reader.pos:]))
+    out = bytearray()
+    while True:
+        op = ops.read(1)
+        if op == b"C":
+            offset = ops.uvarint()
+            length = ops.uvarint()
+            if offset + length > len(old):
+                raise DeltaError("invalid copy operation")
+            out += old[offset:offset + length]
+        elif op == b"I":
+            out += ops.read(ops.uvarint())
+        elif op == b"E":
+            break
+        else:
+            raise DeltaError("unknown operation %r" % op)
+
+    if hashlib.sha256(out).hexdigest() != header["new_sha256"]:
+        raise DeltaError("rebuilt %s failed sha256 verification" % header["new_filename"])
+
+    new_path = os.path.join(out_dir, header["new_filename"])
+    with open(new_path + ".part", "wb") as f:
+        f.write(out)
+    os.replace(new_path + ".part", new_path)
+    return header["new_filename"]
+
+
+def main(argv):
+    if len(argv) != 4:
+        print(__doc__)
+        return 2
+    delta_dir, cache_dir, out_dir = argv[1:]
+
+    failed = 0
+    for name in sorted(os.listdir(delta_dir)):
+        if not name.endswith(".delta"):
+            continue
+        try:
+            print("Rebuilt %s" % apply_delta(os.path.join(delta_dir, name), cache_dir, out_dir))
+        except (DeltaError, OSError, ValueError, zlib.error) as e:
+            print("Failed to apply %s: %s" % (name, e))
+            failed += 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))